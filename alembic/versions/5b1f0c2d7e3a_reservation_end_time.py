@@ -0,0 +1,98 @@
+"""reservation end_time and overlap indexes
+
+Revision ID: 5b1f0c2d7e3a
+Revises: cee5bd0fa609
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b1f0c2d7e3a'
+down_revision: Union[str, None] = 'cee5bd0fa609'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _check_no_missing_end_time() -> None:
+    """Fail with the ids of reservations without a start, their end can not be computed."""
+    ids = op.get_bind().execute(sa.text(
+        "SELECT id FROM reservations WHERE end_time IS NULL ORDER BY id LIMIT 21"
+    )).scalars().all()
+    if ids:
+        listed = ", ".join(str(id) for id in ids[:20]) + (", ..." if len(ids) > 20 else "")
+        raise RuntimeError(
+            "Reservations without reservation_time have no end_time, set their time or delete them "
+            f"and run the migration again: {listed}"
+        )
+
+
+def _check_no_overlaps(limit: int = 20) -> None:
+    """Fail with a report of the overlapping reservations the exclusion constraint would reject."""
+    overlaps = op.get_bind().execute(sa.text(
+        "SELECT a.table_id, a.id, a.reservation_time, a.end_time, b.id, b.reservation_time, b.end_time "
+        "FROM reservations a JOIN reservations b "
+        "ON a.table_id = b.table_id AND a.id < b.id "
+        "AND a.reservation_time < b.end_time AND b.reservation_time < a.end_time "
+        "ORDER BY a.table_id, a.id, b.id LIMIT :limit"
+    ), {"limit": limit + 1}).all()
+    if not overlaps:
+        return
+    lines = [
+        f"  table {table_id}: reservation {a_id} [{a_start}, {a_end}) overlaps reservation {b_id} [{b_start}, {b_end})"
+        for table_id, a_id, a_start, a_end, b_id, b_start, b_end in overlaps[:limit]
+    ]
+    if len(overlaps) > limit:
+        lines.append(f"  ... and more, only the first {limit} pairs are listed")
+    raise RuntimeError(
+        "Existing reservations overlap, the exclusion constraint "
+        "ex_reservations_table_id_time_overlap can not be added. Move or delete one reservation "
+        "of each pair and run the migration again:\n" + "\n".join(lines)
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('reservations', sa.Column('end_time', sa.DateTime(timezone=True), nullable=True))
+
+    # backfill end_time for existing reservations
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(
+            "UPDATE reservations "
+            "SET end_time = reservation_time + make_interval(mins => duration_minutes)"
+        )
+    else:
+        op.execute(
+            "UPDATE reservations "
+            "SET end_time = datetime(reservation_time, '+' || duration_minutes || ' minutes')"
+        )
+
+    # overlap checks and the exclusion constraint rely on every row having an end
+    _check_no_missing_end_time()
+    with op.batch_alter_table('reservations') as batch_op:
+        batch_op.alter_column('end_time', existing_type=sa.DateTime(timezone=True), nullable=False)
+
+    op.create_index('ix_reservations_table_id_reservation_time', 'reservations', ['table_id', 'reservation_time'], unique=False)
+    op.create_index('ix_reservations_table_id_end_time', 'reservations', ['table_id', 'end_time'], unique=False)
+
+    # On Postgres the database itself refuses overlapping reservations of one table
+    if op.get_bind().dialect.name == 'postgresql':
+        _check_no_overlaps()
+        op.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+        op.execute(
+            "ALTER TABLE reservations ADD CONSTRAINT ex_reservations_table_id_time_overlap "
+            "EXCLUDE USING gist (table_id WITH =, tstzrange(reservation_time, end_time, '[)') WITH &&)"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("ALTER TABLE reservations DROP CONSTRAINT IF EXISTS ex_reservations_table_id_time_overlap")
+    op.drop_index('ix_reservations_table_id_end_time', table_name='reservations')
+    op.drop_index('ix_reservations_table_id_reservation_time', table_name='reservations')
+    op.drop_column('reservations', 'end_time')
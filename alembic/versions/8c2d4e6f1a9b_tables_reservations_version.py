@@ -0,0 +1,28 @@
+"""tables reservations_version
+
+Revision ID: 8c2d4e6f1a9b
+Revises: 5b1f0c2d7e3a
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c2d4e6f1a9b'
+down_revision: Union[str, None] = '5b1f0c2d7e3a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('tables', sa.Column('reservations_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('tables', 'reservations_version')
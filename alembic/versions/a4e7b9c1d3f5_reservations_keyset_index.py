@@ -0,0 +1,28 @@
+"""reservations keyset index
+
+Revision ID: a4e7b9c1d3f5
+Revises: 8c2d4e6f1a9b
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4e7b9c1d3f5'
+down_revision: Union[str, None] = '8c2d4e6f1a9b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_reservations_reservation_time_id', 'reservations', ['reservation_time', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_reservations_reservation_time_id', table_name='reservations')
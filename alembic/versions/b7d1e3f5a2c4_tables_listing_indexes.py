@@ -0,0 +1,30 @@
+"""tables listing indexes
+
+Revision ID: b7d1e3f5a2c4
+Revises: a4e7b9c1d3f5
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d1e3f5a2c4'
+down_revision: Union[str, None] = 'a4e7b9c1d3f5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_tables_location_id', 'tables', ['location', 'id'], unique=False)
+    op.create_index('ix_tables_seats', 'tables', ['seats'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_tables_seats', table_name='tables')
+    op.drop_index('ix_tables_location_id', table_name='tables')
@@ -0,0 +1,111 @@
+import gzip
+import json
+from collections import OrderedDict
+from hashlib import blake2b
+from fastapi import Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Awaitable, Callable
+from app.core.cache import CacheBackend, cache as default_cache, cache_namespace, cache_tags
+from app.core import settings
+from app.database.replicas import track_replica_reads
+
+
+def _accepts_gzip(request: Request) -> bool:
+    for part in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = part.partition(";")
+        if name.strip().lower() == "gzip":
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+# gzipped bodies by ETag, popular bodies are compressed once per process
+_gzipped: OrderedDict[str, bytes] = OrderedDict()
+
+
+def _gzip(etag: str, body: bytes) -> bytes:
+    compressed = _gzipped.get(etag)
+    if compressed is not None:
+        _gzipped.move_to_end(etag)
+        return compressed
+    compressed = _gzipped[etag] = gzip.compress(body, compresslevel=6)
+    if len(_gzipped) > 64:
+        _gzipped.popitem(last=False)
+    return compressed
+
+
+def _matches(if_none_match: str | None, *etags: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or any(etag in tags for etag in etags)
+
+
+async def conditional_json(
+    request: Request,
+    db_session: AsyncSession,
+    collections: tuple[str, ...],
+    render: Callable[[], Awaitable[tuple[bytes, dict[str, str]]]],
+    cache: CacheBackend | None = default_cache,
+) -> Response:
+    """
+    Answer a GET with a JSON body that only depends on `collections`.
+
+    The body rendered for the same path and query is kept in the cache,
+    tagged with the collections of the session's database, and reused until a commit touching one of
+    them invalidates it, so repeated polls reach neither the database nor the
+    serializer. With a shared backend the invalidation reaches every worker.
+    Bodies read from a replica are kept at most REPLICA_MAX_LAG seconds.
+
+    The strong ETag is a digest of the body, taken once when it is rendered
+    and cached with it: clients sending a matching If-None-Match get 304 Not
+    Modified, clients accepting gzip get the compressed body under its own tag.
+    Unlike the tag versions, the digest stays valid across restarts and for
+    bodies read from a lagging replica.
+
+    Args:
+        request: Incoming request
+        db_session: Session of the primary database, its URL namespaces the cache key and tags
+        collections: Names of the database tables the body is read from
+        render: Coroutine function returning the body and extra response headers
+        cache: Backend keeping rendered bodies, None renders every time
+
+    Returns:
+        Response: 200 with the body or 304 without it
+    """
+    engine = db_session.get_bind().engine
+    key = f"http:{cache_namespace(engine)}:{request.url.path}?{sorted(request.query_params.multi_items())}"
+    tags = cache_tags(engine, *collections)
+    raw, stamp = await cache.get_stamped(key, tags) if cache is not None else (None, None)
+    if raw is not None:
+        header, _, body = raw.partition(b"\n")
+        headers = json.loads(header)
+    else:
+        # the stamp was taken before rendering, a concurrent commit can only make the entry stale
+        with track_replica_reads() as replica_reads:
+            body, headers = await render()
+        headers = {**headers, "ETag": f'"{blake2b(body, digest_size=16).hexdigest()}"'}
+        ttl = settings.RESPONSE_CACHE_TTL
+        if replica_reads:
+            # a replica may miss commits made before the stamp, keep its body no longer than it may lag
+            ttl = min(ttl, settings.REPLICA_MAX_LAG) if ttl else settings.REPLICA_MAX_LAG
+        if cache is not None:
+            await cache.set(
+                key, json.dumps(headers).encode() + b"\n" + body,
+                stamp=stamp, tags=tags, ttl=ttl,
+            )
+
+    etag = headers["ETag"]
+    gzip_etag = f'{etag[:-1]}-gzip"'
+    use_gzip = len(body) >= settings.GZIP_MIN_SIZE and _accepts_gzip(request)
+    headers = {
+        **headers,
+        "ETag": gzip_etag if use_gzip else etag,
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    if _matches(request.headers.get("if-none-match"), etag, gzip_etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=_gzip(etag, body), media_type="application/json", headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -1,15 +1,26 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+import logging
+from fastapi import FastAPI, Depends, HTTPException, status, Query, Response, Request
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.utils.patterns import UnitOfWork
 from app.schema import TableCreate, TableUpdate, TableGet, TableResponse, ReservationCreate, ReservationResponse, ReservationGet
 from app.models import Tables, Reservations
-from app.services import TableNotFound, TableAlreadyReserv
-from app.services import ReservTableService, TableService
-from typing import List
+from app.services import TableNotFound, TableAlreadyReserv, BatchTooLarge
+from app.services import ReservTableService, TableService, reservation_index
+from typing import List, Optional, Literal, AsyncIterator
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import async_sessionmaker
+import csv
+import io
+import json
+from datetime import datetime
 from fastapi import APIRouter
-from app.database.db import get_async_session
-from app.core import logger
+from app.database.db import get_async_session, get_async_session_maker
+from app.core.metrics import BOOKINGS
+from .conditional import conditional_json
+from app.core.tracing import traced
+
+logger = logging.getLogger(__name__)
 
 
 
@@ -18,6 +29,7 @@ reservations_router = APIRouter(prefix="/api/v1/reservations", tags=["Reservatio
 
 
 @reservations_router.post("/", response_model=ReservationResponse, status_code=status.HTTP_201_CREATED)
+@traced()
 async def create_reservation(reservation_data: ReservationCreate, db_session: AsyncSession = Depends(get_async_session)):
     """
     Create a new table reservation.
@@ -39,52 +51,190 @@ async def create_reservation(reservation_data: ReservationCreate, db_session: As
         HTTPException: 500 for other unexpected errors.
     """
 
-    logger.info(f" Creating reservation with data: {reservation_data}")
-    service = ReservTableService(UnitOfWork(db_session))
+    logger.info(" Creating reservation with data: %s", reservation_data)
+    service = ReservTableService(UnitOfWork(db_session), index=reservation_index)
     try:
         result =  await service.add_reserv_for_table(reservation_data)
-        logger.info(f" Reservation created successfully: {result}")
+        logger.info(" Reservation created successfully: %s", result)
+        BOOKINGS.inc(kind="single", outcome="created")
         return result
     except TableNotFound:
-        logger.error(f" Table not found for reservation: {reservation_data.table_id}")
+        logger.error(" Table not found for reservation: %s", reservation_data.table_id)
+        BOOKINGS.inc(kind="single", outcome="not_found")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Table not found")
     except TableAlreadyReserv:
-        logger.error(f" Conflict: Table already reserved at {reservation_data.reservation_time}")
+        logger.error(" Conflict: Table already reserved at %s", reservation_data.reservation_time)
+        BOOKINGS.inc(kind="single", outcome="conflict")
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Conflict: Table to Date already reserved")
     except Exception as e:
-        logger.error(f" Error creating reservation: {str(e)}")
+        logger.error(" Error creating reservation: %s", e)
+        BOOKINGS.inc(kind="single", outcome="error")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=e)
 
 
+@reservations_router.post("/bulk", response_model=List[ReservationResponse], status_code=status.HTTP_201_CREATED)
+@traced()
+async def create_reservations_bulk(reservations_data: List[ReservationCreate], db_session: AsyncSession = Depends(get_async_session)):
+    """
+    Create several reservations in one transaction.
+
+    The batch is validated together: either every reservation is created or none.
+
+    Args:
+        reservations_data (List[ReservationCreate]): Reservations to be created.
+        db_session (AsyncSession, optional): Database session for transaction. Defaults to dependency injection.
+
+    Returns:
+        List[ReservationResponse]: The created reservations in request order.
+
+    Raises:
+        HTTPException: 404 if a table is not found,
+        HTTPException: 409 if reservations conflict with each other or with existing ones,
+        HTTPException: 413 if the batch is too large.
+        HTTPException: 500 for other unexpected errors.
+    """
+    logger.info(" Creating %s reservations in bulk", len(reservations_data))
+    service = ReservTableService(UnitOfWork(db_session), index=reservation_index)
+    try:
+        result = await service.add_reservs_bulk(reservations_data)
+        logger.info(" %s reservations created successfully", len(result))
+        BOOKINGS.inc(kind="bulk", outcome="created")
+        return result
+    except TableNotFound as e:
+        logger.error(" Tables not found for bulk reservation: %s", e)
+        BOOKINGS.inc(kind="bulk", outcome="not_found")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except TableAlreadyReserv as e:
+        logger.error(" Conflict in bulk reservation: %s", e)
+        BOOKINGS.inc(kind="bulk", outcome="conflict")
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except BatchTooLarge as e:
+        BOOKINGS.inc(kind="bulk", outcome="error")
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    except Exception as e:
+        logger.error(" Error creating reservations in bulk: %s", e)
+        BOOKINGS.inc(kind="bulk", outcome="error")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
 @reservations_router.get("/", response_model=List[ReservationResponse])
-async def get_all_reservations(db_session: AsyncSession = Depends(get_async_session)):
+@traced()
+async def get_all_reservations(
+    request: Request,
+    table_id: Optional[int] = None,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, gt=0),
+    db_session: AsyncSession = Depends(get_async_session),
+):
     """
-    Retrieve all table reservations.
+    Retrieve table reservations page by page.
+
+    Reservations are ordered by reservation time. When more reservations are
+    available the `X-Next-Cursor` response header holds the cursor of the next page.
 
-    Fetches a list of all existing reservations from the database.
+    Responses carry a strong ETag: a request with a matching If-None-Match
+    gets 304 Not Modified. Until reservations change, the body is served
+    from the cache without touching the database.
 
     Args:
+        table_id (int, optional): Only reservations of this table.
+        start (datetime, optional): Only reservations starting at or after this time.
+        end (datetime, optional): Only reservations starting before this time.
+        cursor (str, optional): Cursor returned with the previous page.
+        limit (int, optional): Page size, capped by the configured maximum.
         db_session (AsyncSession, optional): Database session for transaction. Defaults to dependency injection.
 
     Returns:
-        List[ReservationResponse]: A list of all current reservations.
+        List[ReservationResponse]: One page of reservations.
 
     Raises:
+        HTTPException: 400 if the cursor is invalid.
         HTTPException: 500 for other unexpected errors.
     """
-    logger.info(" Retrieving all reservations")
-    service = ReservTableService(UnitOfWork(db_session))
+    logger.info(" Retrieving reservations")
+    service = ReservTableService(UnitOfWork(db_session), index=reservation_index)
+
+    async def render() -> tuple[bytes, dict[str, str]]:
+        # rows are serialized by the service, skip response_model re-validation
+        body, next_cursor = await service.get_reserv_page_json(table_id=table_id, start=start, end=end, cursor=cursor, limit=limit)
+        return body, {"X-Next-Cursor": next_cursor} if next_cursor is not None else {}
+
     try:
-        reservs = await service.get_all_reserv()
-        logger.info(f" Retrieved {len(reservs)} reservations.")
-        return reservs
+        return await conditional_json(request, db_session, (Reservations.__tablename__,), render)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
-        logger.error(f" Error retrieving reservations: {str(e)}")
+        logger.error(" Error retrieving reservations: %s", e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 
 
+EXPORT_COLUMNS = ["id", "table_id", "customer_name", "reservation_time", "duration_minutes"]
+
+
+async def _encode_export(batches: AsyncIterator[list[dict]], format: str) -> AsyncIterator[str]:
+    """Encode batches of reservation rows as NDJSON lines or CSV records"""
+    if format == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+        writer.writeheader()
+        async for rows in batches:
+            writer.writerows({k: v.isoformat() if isinstance(v, datetime) else v for k, v in row.items()} for row in rows)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    else:
+        async for rows in batches:
+            yield "".join(json.dumps(row, default=datetime.isoformat) + "\n" for row in rows)
+
+
+@reservations_router.get("/export")
+@traced()
+async def export_reservations(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    table_id: Optional[int] = None,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    session_maker: async_sessionmaker = Depends(get_async_session_maker),
+):
+    """
+    Export reservations as a stream.
+
+    Rows are read through a server-side cursor and written to the response
+    as they arrive, so memory use does not depend on the number of reservations.
+
+    Args:
+        format (str): `ndjson` (default) or `csv`.
+        table_id (int, optional): Only reservations of this table.
+        start (datetime, optional): Only reservations starting at or after this time.
+        end (datetime, optional): Only reservations starting before this time.
+        session_maker (async_sessionmaker, optional): Session maker, the stream uses its own session
+            because it outlives the request scoped one.
+
+    Returns:
+        StreamingResponse: Reservations ordered by reservation time.
+    """
+    logger.info(" Exporting reservations as %s", format)
+
+    async def batches() -> AsyncIterator[list[dict]]:
+        async with session_maker() as session:
+            service = ReservTableService(UnitOfWork(session))
+            async for rows in service.export_reserv(table_id=table_id, start=start, end=end):
+                yield rows
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        _encode_export(batches(), format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="reservations.{format}"'},
+    )
+
+
 #@reservations_router.delete("/delete_all", status_code=status.HTTP_200_OK)
+@traced()
 async def delete_all_table(db_session: AsyncSession = Depends(get_async_session)):
     """
     Delete all table reservations.
@@ -101,17 +251,60 @@ async def delete_all_table(db_session: AsyncSession = Depends(get_async_session)
         HTTPException: 500 if  an error occurs during deletion.
     """
     logger.info(" Deleting all reservations")
-    service = ReservTableService(UnitOfWork(db_session))
+    service = ReservTableService(UnitOfWork(db_session), index=reservation_index)
     try:
         await service.delete_all_reserv()
         logger.info(" All reservations deleted successfully.")
         return {"message": f"All Reservation deleted successfully"}
     except Exception as e:
-        logger.error(f" Error deleting all reservations: {str(e)}")
+        logger.error(" Error deleting all reservations: %s", e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=e)
 
 
+@reservations_router.delete("/", status_code=status.HTTP_200_OK)
+@traced()
+async def delete_reservations(
+    table_id: Optional[int] = None,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    before: Optional[datetime] = None,
+    all: bool = False,
+    db_session: AsyncSession = Depends(get_async_session),
+):
+    """
+    Delete reservations in bulk with a single statement.
+
+    At least one filter is required, or `all=true` to delete every reservation.
+
+    Args:
+        table_id (int, optional): Only reservations of this table.
+        start (datetime, optional): Only reservations starting at or after this time.
+        end (datetime, optional): Only reservations starting before this time.
+        before (datetime, optional): Only reservations ending at or before this cutoff.
+        all (bool, optional): Delete every reservation when no filter is given.
+        db_session (AsyncSession, optional): Database session for transaction. Defaults to dependency injection.
+
+    Returns:
+        dict: A message and the number of deleted reservations.
+
+    Raises:
+        HTTPException: 400 if neither a filter nor all=true is given.
+        HTTPException: 500 for unexpected errors during deletion.
+    """
+    logger.info(" Deleting reservations: table_id=%s, from=%s, to=%s, before=%s, all=%s", table_id, start, end, before, all)
+    if table_id is None and start is None and end is None and before is None and not all:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Give a filter or all=true")
+    service = ReservTableService(UnitOfWork(db_session), index=reservation_index)
+    try:
+        ids = await service.delete_reservs(table_id=table_id, start=start, end=end, ended_before=before)
+        return {"message": f"{len(ids)} reservations deleted successfully", "deleted": len(ids)}
+    except Exception as e:
+        logger.error(" Error deleting reservations: %s", e)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
 @reservations_router.delete("/{id}", response_model=ReservationResponse)
+@traced()
 async def delete_reservation(id: int, db_session: AsyncSession = Depends(get_async_session)):
     """
     Delete a specific table reservation by its ID.
@@ -126,15 +319,15 @@ async def delete_reservation(id: int, db_session: AsyncSession = Depends(get_asy
     Raises:
         HTTPException: 500 for unexpected errors during reservation deletion.
     """
-    logger.info(f" Deleting reservation with ID {id}")
-    service = ReservTableService(UnitOfWork(db_session))
+    logger.info(" Deleting reservation with ID %s", id)
+    service = ReservTableService(UnitOfWork(db_session), index=reservation_index)
     reservation_delete = ReservationGet(id=id)
     try:
         result = await service.delete_reserv(reservation_delete)
-        logger.info(f" Reservation with ID {id} deleted successfully.")
+        logger.info(" Reservation with ID %s deleted successfully.", id)
         return result
     except Exception as e:
-        logger.error(f" Error deleting reservation with ID {id}: {str(e)}")
+        logger.error(" Error deleting reservation with ID %s: %s", id, e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=e)
 
 
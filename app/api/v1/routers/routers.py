@@ -1,7 +1,9 @@
+import logging
 from fastapi import APIRouter
 from .reservations import reservations_router
 from .tables import tables_router
-from app.core import logger
+
+logger = logging.getLogger(__name__)
 
 
 
@@ -1,15 +1,23 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+import logging
+from fastapi import FastAPI, Depends, HTTPException, status, Query, Response, Request
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.utils.patterns import UnitOfWork
-from app.schema import TableCreate, TableUpdate, TableGet, TableResponse, ReservationCreate, ReservationResponse, ReservationGet
+from app.schema import TableCreate, TableUpdate, TablePatch, TableGet, TableResponse, ReservationCreate, ReservationResponse, ReservationGet, FreeSlot
 from app.models import Tables, Reservations
 from app.services import TableNotFound, TableAlreadyReserv
-from app.services import ReservTableService, TableService
-from typing import List
+from app.services import ReservTableService, TableService, reservation_index
+from typing import List, Optional, Literal, AsyncIterator
+from starlette.datastructures import UploadFile
+from datetime import datetime
 from fastapi import APIRouter
 from app.database.db import get_async_session
-from app.core import logger
+from app.utils.records import iter_json_array, iter_csv
+from .conditional import conditional_json
+from app.core import settings
+from app.core.tracing import traced
+
+logger = logging.getLogger(__name__)
 
 
 
@@ -17,6 +25,7 @@ tables_router = APIRouter(prefix="/api/v1/tables", tags=["Tables"])
 
 
 @tables_router.post("/", response_model=TableResponse, status_code=status.HTTP_201_CREATED)
+@traced()
 async def create_table(table_data: TableCreate, db_session: AsyncSession = Depends(get_async_session)):
     """
     Create a new table in the database.
@@ -32,7 +41,7 @@ async def create_table(table_data: TableCreate, db_session: AsyncSession = Depen
         HTTPException: 404 Not Found if the table is not found
         HTTPException: 500 Internal Server Error if an unexpected error occurs
     """
-    logger.info(f" Creating new table with data: {table_data}")
+    logger.info(" Creating new table with data: %s", table_data)
     service = TableService(UnitOfWork(db_session))
     try:
        return await service.create_table(table_data)
@@ -40,32 +49,277 @@ async def create_table(table_data: TableCreate, db_session: AsyncSession = Depen
        logger.error(" Table not found")
        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
     except Exception as e:
-       logger.error(f" Error creating table: {str(e)}")
+       logger.error(" Error creating table: %s", e)
        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,detail=str(e))
 
 
 
+async def _upload_chunks(upload: UploadFile, size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    while chunk := await upload.read(size):
+        yield chunk
+
+
+@tables_router.post("/import", status_code=status.HTTP_201_CREATED)
+@traced()
+async def import_tables(request: Request, db_session: AsyncSession = Depends(get_async_session)):
+    """
+    Create many tables at once from a JSON array or a CSV file.
+
+    The body is either a JSON array of tables (application/json), a CSV file
+    with a `name,seats,location` header (text/csv), or a multipart form with
+    one of them in the `file` field. Rows are parsed and validated while the
+    body is received and written in multi-row chunks, COPY on PostgreSQL.
+    Either every table is created or none.
+
+    Args:
+        request: Incoming request with the tables in its body
+        db_session: Database session dependency
+
+    Returns:
+        A message and the number of created tables
+
+    Raises:
+        HTTPException: 400 Bad Request if the form has no file
+        HTTPException: 415 Unsupported Media Type if the body is neither JSON nor CSV
+        HTTPException: 422 Unprocessable Entity if the body or one of the rows is invalid
+        HTTPException: 500 Internal Server Error if an unexpected error occurs
+    """
+    content_type = request.headers.get("content-type", "").partition(";")[0].strip().lower()
+    logger.info(" Importing tables from %s", content_type)
+    form = None
+    if content_type == "multipart/form-data":
+        form = await request.form()
+        upload = form.get("file")
+        if not isinstance(upload, UploadFile):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Send the tables in the 'file' field")
+        chunks = _upload_chunks(upload)
+        is_json = (upload.content_type or "").startswith("application/json") or (upload.filename or "").lower().endswith(".json")
+        content_type = "application/json" if is_json else "text/csv"
+    else:
+        chunks = request.stream()
+    if content_type == "application/json":
+        rows = iter_json_array(chunks)
+    elif content_type in ("text/csv", "application/csv"):
+        rows = iter_csv(chunks)
+    else:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Send a JSON array or a CSV file")
+
+    service = TableService(UnitOfWork(db_session))
+    try:
+        imported = await service.import_tables(rows)
+        return {"message": f"{imported} tables imported successfully", "imported": imported}
+    except ValueError as e:
+        logger.error(" Invalid table import: %s", e)
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    except Exception as e:
+        logger.error(" Error importing tables: %s", e)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+    finally:
+        if form is not None:
+            await form.close()
+
+
 @tables_router.get("/", response_model=List[TableResponse])
-async def get_all_tables(db_session: AsyncSession = Depends(get_async_session)):
+@traced()
+async def get_all_tables(
+    request: Request,
+    location: Optional[str] = None,
+    min_seats: Optional[int] = Query(None, ge=0),
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, gt=0),
+    include: Optional[Literal["reservations"]] = None,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    ids: Optional[str] = None,
+    db_session: AsyncSession = Depends(get_async_session),
+):
     """
-    Retrieve all tables from the database.
+    Retrieve tables page by page, or several tables by id.
+
+    Tables are ordered by id. When more tables are available the
+    `X-Next-Cursor` response header holds the cursor of the next page.
+
+    With `ids` the listed tables are returned, in that order, with one query;
+    ids of missing tables are left out and the paging filters are ignored.
+
+    Responses carry a strong ETag: a request with a matching If-None-Match
+    gets 304 Not Modified. Until tables (and, with `include`, reservations)
+    change, the body is served from the cache without touching the database.
+
+    Args:
+        location: Only tables at this location
+        min_seats: Only tables with at least this many seats
+        cursor: Cursor returned with the previous page
+        limit: Page size, capped by the configured maximum
+        include: `reservations` to fill reserved_tables of every table
+        start: Only include reservations ending after this time
+        end: Only include reservations starting before this time
+        ids: Comma separated table ids, at most the configured maximum page size
 
     Returns:
-        A list of all table responses
+        A list of table responses
 
     Raises:
+        HTTPException: 400 Bad Request if the cursor or the ids are invalid
         HTTPException: 404 Not Found if an error occurs during table retrieval
     """
     logger.info(" Retrieving all tables")
     service = TableService(UnitOfWork(db_session))
+    id_list = None
+    if ids is not None:
+        try:
+            id_list = [int(id) for id in ids.split(",") if id.strip()]
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="ids must be comma separated integers")
+        if len(id_list) > settings.MAX_PAGE_SIZE:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"At most {settings.MAX_PAGE_SIZE} ids")
+
+    async def render() -> tuple[bytes, dict[str, str]]:
+        # rows are serialized by the service, skip response_model re-validation
+        if id_list is not None:
+            body = await service.get_tables_json(id_list, include_reservations=include == "reservations", start=start, end=end)
+            return body, {}
+        body, next_cursor = await service.get_table_page_json(
+            location=location, min_seats=min_seats, cursor=cursor, limit=limit,
+            include_reservations=include == "reservations", start=start, end=end,
+        )
+        return body, {"X-Next-Cursor": next_cursor} if next_cursor is not None else {}
+
+    collections = (Tables.__tablename__,)
+    if include == "reservations":
+        collections += (Reservations.__tablename__,)
     try:
-        return await service.get_all_tables()
+        return await conditional_json(request, db_session, collections, render)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
-        logger.error(f" Error retrieving tables: {str(e)}")
+        logger.error(" Error retrieving tables: %s", e)
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=e)
 
 
+@tables_router.get("/{id}", response_model=TableResponse)
+@traced()
+async def get_table(
+    request: Request,
+    id: int,
+    include: Optional[Literal["reservations"]] = None,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    db_session: AsyncSession = Depends(get_async_session),
+):
+    """
+    Retrieve a specific table by its ID.
+
+    Args:
+        id: The unique identifier of the table
+        include: `reservations` to fill reserved_tables
+        start: Only include reservations ending after this time
+        end: Only include reservations starting before this time
+        db_session: Database session dependency
+
+    Returns:
+        The table response, cached and answered with ETags like the list
+
+    Raises:
+        HTTPException: 404 Not Found if the table doesn't exist
+        HTTPException: 500 Internal Server Error if an unexpected error occurs
+    """
+    logger.info(" Retrieving table with ID %s", id)
+    service = TableService(UnitOfWork(db_session))
+
+    async def render() -> tuple[bytes, dict[str, str]]:
+        body = await service.get_table_json(TableGet(id=id), include_reservations=include == "reservations", start=start, end=end)
+        return body, {}
+
+    collections = (Tables.__tablename__,)
+    if include == "reservations":
+        collections += (Reservations.__tablename__,)
+    try:
+        return await conditional_json(request, db_session, collections, render)
+    except TableNotFound as e:
+        logger.error(" Table not found")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except Exception as e:
+        logger.error(" Error retrieving table with ID %s: %s", id, e)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
+@tables_router.get("/{id}/availability", response_model=List[FreeSlot])
+@traced()
+async def get_table_availability(
+    id: int,
+    start: datetime = Query(..., alias="from"),
+    end: datetime = Query(..., alias="to"),
+    duration: Optional[int] = Query(None, gt=0),
+    db_session: AsyncSession = Depends(get_async_session),
+):
+    """
+    Retrieve free windows of a table.
+
+    Args:
+        id: The unique identifier of the table
+        start: Beginning of the searched window
+        end: End of the searched window
+        duration: Minimal length of returned windows in minutes
+        db_session: Database session dependency
+
+    Returns:
+        A list of free windows ordered by start
+
+    Raises:
+        HTTPException: 404 Not Found if the table doesn't exist
+        HTTPException: 422 Unprocessable Entity if the window is empty
+        HTTPException: 500 Internal Server Error if an unexpected error occurs
+    """
+    logger.info(" Retrieving availability of table %s from %s to %s", id, start, end)
+    service = ReservTableService(UnitOfWork(db_session))
+    try:
+        return await service.get_free_slots(TableGet(id=id), start, end, duration)
+    except TableNotFound as e:
+        logger.error(" Table not found")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    except Exception as e:
+        logger.error(" Error retrieving availability of table %s: %s", id, e)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
+@tables_router.patch("/{id}", response_model=TableResponse)
+@traced()
+async def patch_table(id: int, table_data: TablePatch, db_session: AsyncSession = Depends(get_async_session)):
+    """
+    Update the given fields of a table.
+
+    The table is updated with a single UPDATE ... RETURNING statement,
+    its reservations are not loaded.
+
+    Args:
+        id: The unique identifier of the table
+        table_data: Fields to change, fields left out keep their values
+        db_session: Database session dependency
+
+    Returns:
+        The updated table
+
+    Raises:
+        HTTPException: 404 Not Found if the table doesn't exist
+        HTTPException: 500 Internal Server Error if an unexpected error occurs
+    """
+    logger.info(" Updating table with ID %s: %s", id, table_data)
+    service = TableService(UnitOfWork(db_session))
+    try:
+        return await service.patch_table(id, table_data)
+    except TableNotFound as e:
+        logger.error(" Table not found")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except Exception as e:
+        logger.error(" Error updating table with ID %s: %s", id, e)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
 #@tables_router.delete("/delete_all", status_code=status.HTTP_200_OK)
+@traced()
 async def delete_all_table(db_session: AsyncSession = Depends(get_async_session)):
     """
     Delete all tables from the database.
@@ -80,17 +334,54 @@ async def delete_all_table(db_session: AsyncSession = Depends(get_async_session)
         HTTPException: 404 Not Found if an error occurs during table deletion
     """
     logger.info(" Deleting all tables")
-    service = TableService(UnitOfWork(db_session))
+    service = TableService(UnitOfWork(db_session), index=reservation_index)
     try:
         await service.delete_all_tables()
         logger.info(" All reservations deleted successfully.")
         return {"message": f"All Tables deleted successfully"}
     except Exception as e:
-        logger.error(f" Error deleting all tables: {str(e)}")
+        logger.error(" Error deleting all tables: %s", e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=e)
 
 
+@tables_router.delete("/", status_code=status.HTTP_200_OK)
+@traced()
+async def delete_tables(
+    location: Optional[str] = None,
+    all: bool = False,
+    db_session: AsyncSession = Depends(get_async_session),
+):
+    """
+    Delete tables, with their reservations, in bulk with a single statement.
+
+    A filter is required, or `all=true` to delete every table.
+
+    Args:
+        location: Only tables at this location
+        all: Delete every table when no filter is given
+        db_session: Database session dependency
+
+    Returns:
+        A message and the number of deleted tables
+
+    Raises:
+        HTTPException: 400 Bad Request if neither a filter nor all=true is given
+        HTTPException: 500 Internal Server Error if an unexpected error occurs
+    """
+    logger.info(" Deleting tables: location=%s, all=%s", location, all)
+    if location is None and not all:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Give a filter or all=true")
+    service = TableService(UnitOfWork(db_session), index=reservation_index)
+    try:
+        ids = await service.delete_tables(location=location)
+        return {"message": f"{len(ids)} tables deleted successfully", "deleted": len(ids)}
+    except Exception as e:
+        logger.error(" Error deleting tables: %s", e)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
 @tables_router.delete("/{id}", status_code=status.HTTP_200_OK)
+@traced()
 async def delete_table(id: int, db_session: AsyncSession = Depends(get_async_session)):
     """
     Delete a specific table by its ID.
@@ -105,18 +396,18 @@ async def delete_table(id: int, db_session: AsyncSession = Depends(get_async_ses
     Raises:
         HTTPException: 404 Not Found if the table doesn't exist or other errors occur
     """
-    logger.info(f" Deleting table with ID {id}")
-    service = TableService(UnitOfWork(db_session))
+    logger.info(" Deleting table with ID %s", id)
+    service = TableService(UnitOfWork(db_session), index=reservation_index)
     table_delete = TableGet(id=id)
     try:
         await service.delete_table(table_delete)
-        logger.info(f" Table with ID {id} deleted successfully.")
+        logger.info(" Table with ID %s deleted successfully.", id)
         return {"message": f"Table id = {id} deleted successfully"}
     except TableNotFound as e:
        logger.error(" Table not found")
        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
     except Exception as e:
-        logger.error(f" Error deleting table with ID {id}: {str(e)}")
+        logger.error(" Error deleting table with ID %s: %s", id, e)
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=e)
 
 
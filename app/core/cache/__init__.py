@@ -0,0 +1,83 @@
+__all__ = [
+    "CacheBackend",
+    "CacheError",
+    "MemoryCache",
+    "RedisCache",
+    "create_cache",
+    "cache_namespace",
+    "cache_tags",
+    "cache",
+]
+
+
+import logging
+from hashlib import blake2b
+from typing import Any
+from urllib.parse import urlsplit, unquote
+from uuid import uuid4
+from weakref import WeakKeyDictionary
+from .base import CacheBackend, CacheError
+from .memory import MemoryCache
+from .redis import RedisCache
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# cache namespaces per database engine
+_namespaces: WeakKeyDictionary = WeakKeyDictionary()
+
+
+def create_cache(url: str, size: int = 4096, workers: int = 1) -> CacheBackend | None:
+    """
+    Build a cache backend from a URL.
+
+    The memory backend only sees the invalidations of its own process, so
+    with several workers it is disabled instead of serving stale entries.
+
+    Args:
+        url (str): `memory://`, `redis://[:password@]host[:port][/db]` or `none` to disable caching.
+        size (int): Maximum number of entries of the memory backend.
+        workers (int): Number of worker processes sharing the database.
+
+    Returns:
+        CacheBackend | None: The backend, None when caching is disabled.
+    """
+    parts = urlsplit(url)
+    if parts.scheme in ("", "none"):
+        return None
+    if parts.scheme == "memory":
+        if workers > 1:
+            logger.warning("CACHE_URL is memory:// with %s workers, caching disabled; use a redis:// cache", workers)
+            return None
+        return MemoryCache(size)
+    if parts.scheme == "redis":
+        return RedisCache(
+            host=parts.hostname or "127.0.0.1",
+            port=parts.port or 6379,
+            db=int(parts.path.lstrip("/") or 0),
+            password=unquote(parts.password) if parts.password else None,
+        )
+    raise ValueError(f"Unsupported cache URL {url!r}")
+
+
+def cache_namespace(engine: Any) -> str:
+    """Namespace shared by every process using the same database; private for in-memory ones"""
+    namespace = _namespaces.get(engine)
+    if namespace is None:
+        url = engine.url
+        if url.database in (None, "", ":memory:"):
+            namespace = uuid4().hex[:12]
+        else:
+            namespace = blake2b(url.render_as_string(hide_password=True).encode(), digest_size=6).hexdigest()
+        _namespaces[engine] = namespace
+    return namespace
+
+
+def cache_tags(engine: Any, *collections: str) -> tuple[str, ...]:
+    """Cache tags of database tables, namespaced like the keys so databases sharing a backend do not collide"""
+    namespace = cache_namespace(engine)
+    return tuple(f"{namespace}:{collection}" for collection in collections)
+
+
+# process-wide backend of repository point reads and GET responses
+cache = create_cache(settings.CACHE_URL, settings.CACHE_SIZE, settings.WEB_CONCURRENCY)
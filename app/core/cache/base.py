@@ -0,0 +1,123 @@
+import logging
+from abc import ABC, abstractmethod
+from typing import Iterable, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class CacheError(Exception):
+    """Cache backend failed to answer, e.g. the server is unreachable"""
+
+
+class CacheBackend(ABC):
+    """
+    Async cache of byte strings with tag based invalidation.
+
+    Every tag has a version, bumped by `invalidate_tags`. An entry is stored
+    together with the versions of its tags (its stamp) and only returned while
+    they are all current. Readers take the stamp with `get_stamped` *before*
+    reading the source, so an entry computed from data that was changed in the
+    meantime is stored with an outdated stamp and never served.
+
+    Backend failures never reach the caller: reads miss, writes are dropped
+    and the error is logged.
+
+    Attributes:
+        hits (int): Number of reads answered from the cache.
+        misses (int): Number of reads that found nothing valid.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    async def get_stamped(self, key: str, tags: Sequence[str] = ()) -> tuple[bytes | None, tuple | None]:
+        """
+        Read an entry and the current stamp of `tags`.
+
+        Args:
+            key (str): Entry key.
+            tags (Sequence[str]): Tags the entry is stored with.
+
+        Returns:
+            tuple[bytes | None, tuple | None]: The value, None on a miss, and the stamp
+            to store a freshly computed value with, None if the backend is unavailable.
+        """
+        try:
+            value, stamp = await self._get_stamped(key, tuple(tags))
+        except CacheError as e:
+            logger.warning("Cache read of %s failed: %s", key, e)
+            value, stamp = None, None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value, stamp
+
+    async def get(self, key: str, tags: Sequence[str] = ()) -> bytes | None:
+        return (await self.get_stamped(key, tags))[0]
+
+    async def set(
+        self,
+        key: str,
+        value: bytes,
+        *,
+        stamp: tuple | None,
+        tags: Sequence[str] = (),
+        ttl: float | None = None,
+    ) -> None:
+        """
+        Store an entry.
+
+        Args:
+            key (str): Entry key.
+            value (bytes): Entry value.
+            stamp (tuple | None): Stamp returned by `get_stamped` for the same tags, None stores nothing.
+            tags (Sequence[str]): Tags invalidating the entry.
+            ttl (float | None): Seconds the entry lives, None or 0 for no limit.
+        """
+        if stamp is None:
+            return
+        try:
+            await self._set(key, value, tuple(tags), stamp, ttl or None)
+        except CacheError as e:
+            logger.warning("Cache write of %s failed: %s", key, e)
+
+    async def delete(self, *keys: str) -> None:
+        if not keys:
+            return
+        try:
+            await self._delete(keys)
+        except CacheError as e:
+            logger.error("Cache delete of %s failed: %s", keys, e)
+
+    async def invalidate_tags(self, *tags: str) -> None:
+        """Make every entry stored with any of `tags` stale"""
+        if not tags:
+            return
+        try:
+            await self._invalidate_tags(tuple(tags))
+        except CacheError as e:
+            logger.error("Cache invalidation of %s failed: %s", tags, e)
+
+    async def close(self) -> None:
+        """Release connections of the backend"""
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+    @abstractmethod
+    async def _get_stamped(self, key: str, tags: tuple[str, ...]) -> tuple[bytes | None, tuple]:
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def _set(self, key: str, value: bytes, tags: tuple[str, ...], stamp: tuple, ttl: float | None) -> None:
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def _delete(self, keys: Iterable[str]) -> None:
+        raise NotImplementedError()
+
+    @abstractmethod
+    async def _invalidate_tags(self, tags: tuple[str, ...]) -> None:
+        raise NotImplementedError()
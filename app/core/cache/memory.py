@@ -0,0 +1,64 @@
+from collections import OrderedDict
+from time import monotonic
+from typing import Iterable
+from app.core.cache.base import CacheBackend
+
+
+class MemoryCache(CacheBackend):
+    """
+    In-process cache backend, evicting the least recently used entry.
+
+    Entries and tag versions live in this process only, so several workers
+    each keep and invalidate their own copy.
+
+    Attributes:
+        size (int): Maximum number of entries.
+    """
+
+    def __init__(self, size: int = 4096):
+        super().__init__()
+        self.size = size
+        # key -> (expires_at or None, stamp, value)
+        self._entries: OrderedDict[str, tuple[float | None, tuple, bytes]] = OrderedDict()
+        self._tags: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def _stamp(self, tags: tuple[str, ...]) -> tuple:
+        return tuple(self._tags.get(tag, 0) for tag in tags)
+
+    async def _get_stamped(self, key: str, tags: tuple[str, ...]) -> tuple[bytes | None, tuple]:
+        stamp = self._stamp(tags)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, stamp
+        expires_at, entry_stamp, value = entry
+        if entry_stamp != stamp or (expires_at is not None and monotonic() > expires_at):
+            del self._entries[key]
+            return None, stamp
+        self._entries.move_to_end(key)
+        return value, stamp
+
+    async def _set(self, key: str, value: bytes, tags: tuple[str, ...], stamp: tuple, ttl: float | None) -> None:
+        if self.size <= 0 or stamp != self._stamp(tags):
+            # invalidated since the stamp was taken, the value may be outdated
+            return
+        self._entries[key] = (monotonic() + ttl if ttl else None, stamp, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    async def _delete(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+
+    async def _invalidate_tags(self, tags: tuple[str, ...]) -> None:
+        for tag in tags:
+            self._tags[tag] = self._tags.get(tag, 0) + 1
+
+    def stats(self) -> dict[str, int]:
+        return {**super().stats(), "size": len(self._entries)}
@@ -0,0 +1,219 @@
+import logging
+import asyncio
+import json
+from dataclasses import dataclass, field
+from typing import Any, Iterable
+from weakref import WeakKeyDictionary
+from app.core.cache.base import CacheBackend, CacheError
+
+logger = logging.getLogger(__name__)
+
+
+class RedisProtocolError(CacheError):
+    """Server answered with an error reply or with something that is not RESP"""
+
+
+def encode_command(*args: Any) -> bytes:
+    """Encode a command as a RESP array of bulk strings"""
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode()
+        elif not isinstance(arg, (bytes, bytearray)):
+            arg = str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader) -> Any:
+    """Read one RESP reply; error replies are returned as RedisProtocolError instances"""
+    line = await reader.readline()
+    if not line.endswith(b"\r\n"):
+        raise CacheError("Connection closed")
+    kind, rest = line[:1], line[1:-2]
+    if kind == b"+":
+        return rest.decode()
+    if kind == b"-":
+        return RedisProtocolError(rest.decode())
+    if kind == b":":
+        return int(rest)
+    if kind == b"$":
+        length = int(rest)
+        if length < 0:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if kind == b"*":
+        length = int(rest)
+        if length < 0:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    raise RedisProtocolError(f"Unexpected reply {line!r}")
+
+
+class RedisConnection:
+    """One connection speaking RESP, commands of a call are pipelined"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._reader = reader
+        self._writer = writer
+
+    @classmethod
+    async def open(cls, host: str, port: int, db: int = 0, password: str | None = None) -> "RedisConnection":
+        reader, writer = await asyncio.open_connection(host, port)
+        conn = cls(reader, writer)
+        setup = []
+        if password:
+            setup.append(("AUTH", password))
+        if db:
+            setup.append(("SELECT", db))
+        if setup:
+            for reply in await conn.execute(*setup):
+                if isinstance(reply, Exception):
+                    conn.close()
+                    raise reply
+        return conn
+
+    async def execute(self, *commands: tuple) -> list[Any]:
+        """Send all commands at once and read their replies in order"""
+        self._writer.write(b"".join(encode_command(*command) for command in commands))
+        await self._writer.drain()
+        return [await read_reply(self._reader) for _ in commands]
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+@dataclass
+class _Pool:
+    """Connections of one event loop"""
+    idle: asyncio.Queue = field(default_factory=asyncio.Queue)
+    conns: set = field(default_factory=set)
+    opening: int = 0
+
+
+class RedisCache(CacheBackend):
+    """
+    Cache backend shared by all workers through a Redis-protocol server.
+
+    Tag versions are server side counters (INCR), so an invalidation made by
+    one worker is seen by all of them. An entry is stored as its stamp (JSON)
+    and the value separated by a newline; reads fetch the entry and the
+    current tag versions in one round trip.
+
+    Connections are opened lazily, per event loop, up to `pool_size`.
+
+    Attributes:
+        host (str): Server host.
+        port (int): Server port.
+        db (int): Database number.
+        prefix (str): Prefix of every key written by this backend.
+        timeout (float): Seconds a command may take before the call fails.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 6379,
+        db: int = 0,
+        password: str | None = None,
+        prefix: str = "reserv:",
+        pool_size: int = 4,
+        timeout: float = 1.0,
+    ):
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.db = db
+        self.prefix = prefix
+        self.timeout = timeout
+        self._password = password
+        self._pool_size = pool_size
+        self._pools: WeakKeyDictionary[asyncio.AbstractEventLoop, _Pool] = WeakKeyDictionary()
+
+    def _pool(self) -> _Pool:
+        loop = asyncio.get_running_loop()
+        pool = self._pools.get(loop)
+        if pool is None:
+            pool = self._pools[loop] = _Pool()
+        return pool
+
+    async def _acquire(self) -> RedisConnection:
+        pool = self._pool()
+        if pool.idle.empty() and pool.opening + len(pool.conns) < self._pool_size:
+            pool.opening += 1
+            try:
+                conn = await RedisConnection.open(self.host, self.port, self.db, self._password)
+            finally:
+                pool.opening -= 1
+            pool.conns.add(conn)
+            return conn
+        return await pool.idle.get()
+
+    def _release(self, conn: RedisConnection, broken: bool = False) -> None:
+        pool = self._pool()
+        if broken:
+            conn.close()
+            pool.conns.discard(conn)
+            return
+        pool.idle.put_nowait(conn)
+
+    async def execute(self, *commands: tuple) -> list[Any]:
+        """Run pipelined commands, raising CacheError on any failure"""
+        try:
+            conn = await asyncio.wait_for(self._acquire(), self.timeout)
+        except (OSError, asyncio.TimeoutError, CacheError) as e:
+            raise CacheError(f"Can not connect to {self.host}:{self.port}: {e!r}") from e
+        try:
+            replies = await asyncio.wait_for(conn.execute(*commands), self.timeout)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, CacheError) as e:
+            self._release(conn, broken=True)
+            raise CacheError(f"Command to {self.host}:{self.port} failed: {e!r}") from e
+        except BaseException:
+            # e.g. cancelled in the middle of a reply, the stream is out of sync
+            self._release(conn, broken=True)
+            raise
+        self._release(conn)
+        for reply in replies:
+            if isinstance(reply, Exception):
+                raise reply
+        return replies
+
+    def _tag_keys(self, tags: Iterable[str]) -> list[str]:
+        return [f"{self.prefix}tag:{tag}" for tag in tags]
+
+    async def _get_stamped(self, key: str, tags: tuple[str, ...]) -> tuple[bytes | None, tuple]:
+        commands = [("GET", self.prefix + key)]
+        if tags:
+            commands.append(("MGET", *self._tag_keys(tags)))
+        replies = await self.execute(*commands)
+        stamp = tuple(int(v) if v is not None else 0 for v in replies[1]) if tags else ()
+        raw = replies[0]
+        if raw is None:
+            return None, stamp
+        header, _, value = raw.partition(b"\n")
+        if tuple(json.loads(header)) != stamp:
+            return None, stamp
+        return value, stamp
+
+    async def _set(self, key: str, value: bytes, tags: tuple[str, ...], stamp: tuple, ttl: float | None) -> None:
+        payload = json.dumps(stamp).encode() + b"\n" + value
+        command = ("SET", self.prefix + key, payload)
+        if ttl:
+            command += ("PX", max(1, int(ttl * 1000)))
+        await self.execute(command)
+
+    async def _delete(self, keys: Iterable[str]) -> None:
+        await self.execute(("DEL", *(self.prefix + key for key in keys)))
+
+    async def _invalidate_tags(self, tags: tuple[str, ...]) -> None:
+        logger.debug("Invalidating cache tags %s", tags)
+        await self.execute(*(("INCR", tag_key) for tag_key in self._tag_keys(tags)))
+
+    async def close(self) -> None:
+        for pool in list(self._pools.values()):
+            for conn in pool.conns:
+                conn.close()
+            pool.conns.clear()
+            while not pool.idle.empty():
+                pool.idle.get_nowait()
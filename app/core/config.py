@@ -20,6 +20,48 @@ class Settings:
         DB_URL: Constructed database connection URL
         BD_URL_TEST: Test database connection URL (SQLite)
         BD_NAME_TEST: Test database filename
+        PAGE_SIZE: Default number of items returned by list endpoints (default: 100)
+        MAX_PAGE_SIZE: Maximum number of items a list request may ask for (default: 1000)
+        BULK_MAX_SIZE: Maximum number of reservations accepted by one bulk request (default: 10000)
+        IMPORT_CHUNK_SIZE: Number of rows written by one statement of a table import (default: 1000)
+        LOCK_STRIPES: Number of in-process locks serializing bookings per table on SQLite (default: 64)
+        RESERVATION_INDEX: Enable the in-process reservation interval index (default: False)
+        RESERVATION_INDEX_TTL: Seconds a validated index entry may reject bookings without the database (default: 2.0)
+        RESERVATION_INDEX_PRUNE_INTERVAL: Seconds between moves of the index horizon to the current time,
+            dropping finished reservations from the index, 0 to never move it (default: 300)
+        CACHE_URL: Cache backend of point reads and list responses: 'memory://',
+            'redis://[:password@]host:port/db' to share it between workers, or 'none' (default: 'memory://');
+            the memory backend is disabled when WEB_CONCURRENCY is above 1
+        CACHE_SIZE: Maximum number of entries of the memory backend (default: 4096)
+        RESPONSE_CACHE_TTL: Maximum age in seconds of a rendered list body, 0 for no limit (default: 30)
+        GZIP_MIN_SIZE: Smallest cached body in bytes sent gzip-compressed (default: 1024)
+        IDENTITY_CACHE_TTL: Seconds a row stays in the point read cache, 0 for no limit (default: 300)
+        LOG_LEVEL: Level of the root logger (default: 'INFO')
+        LOG_LEVELS: Levels of single loggers as `name=LEVEL` pairs separated by commas,
+            e.g. 'app.utils=WARNING,sqlalchemy.engine=WARNING' (default: '')
+        LOG_FORMAT: 'json' for one JSON object per line or 'text' (default: 'json')
+        LOG_FILE: Rotating log file, empty to disable it (default: 'logs/app.log')
+        LOG_STDOUT: Also write logs to stdout (default: True)
+        LOG_SAMPLE_RATE: Share of requests whose info and debug lines are kept (default: 1.0)
+        QUERY_BUDGET_COUNT: SQL statements a request may run before it is logged, 0 for no limit (default: 30)
+        QUERY_BUDGET_MS: Milliseconds a request may spend in the database before it is logged, 0 for no limit (default: 500)
+        QUERY_REPEAT_LIMIT: Runs of one statement a request may make before it is logged as N+1, 0 for no limit (default: 5)
+        QUERY_BUDGET_STRICT: Fail requests going over the budget instead of logging them, for tests (default: False)
+        TRACE_EXPORTER: Where spans go: 'none', 'memory', 'file' or 'otel' to delegate to OpenTelemetry (default: 'none')
+        TRACE_FILE: JSON lines file of the 'file' trace exporter (default: 'logs/traces.jsonl')
+        WEB_CONCURRENCY: Number of worker processes sharing the database, as read by uvicorn (default: 1)
+        DB_MAX_CONNECTIONS: Connections all workers together may open, split evenly between them (default: 100)
+        DB_POOL_SIZE: Connections kept open by one worker, derived from the budget if unset
+        DB_MAX_OVERFLOW: Extra connections one worker may open under load, derived from the budget if unset
+        DB_POOL_TIMEOUT: Seconds to wait for a free connection before failing (default: 30)
+        DB_POOL_RECYCLE: Seconds after which a connection is replaced, -1 to keep it (default: 1800)
+        DB_POOL_PRE_PING: Check connections before handing them out (default: True)
+        DB_PGBOUNCER: The database is reached through PgBouncer in transaction pooling mode,
+            prepared statement caches are disabled (default: False)
+        DB_NULL_POOL: Open a connection per session instead of pooling, e.g. behind PgBouncer (default: False)
+        DB_REPLICA_URLS: Comma separated URLs of read replicas, read-only queries are spread over them (default: '')
+        REPLICA_MAX_LAG: Seconds a replica may lag the primary and still serve reads (default: 1.0)
+        REPLICA_CHECK_INTERVAL: Seconds between replication lag checks of a replica (default: 5.0)
     """
 
     MODE: str = os.environ.get('MODE', 'DEV')  # Значение по умолчанию
@@ -33,6 +75,44 @@ class Settings:
     DB_URL: str = f'{DB}://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
     BD_URL_TEST: str = f'sqlite+aiosqlite:///:./testdb.sqlite'
     BD_NAME_TEST:str = "testdb.sqlite"
+
+    PAGE_SIZE: int = int(os.environ.get('PAGE_SIZE', 100))
+    MAX_PAGE_SIZE: int = int(os.environ.get('MAX_PAGE_SIZE', 1000))
+    BULK_MAX_SIZE: int = int(os.environ.get('BULK_MAX_SIZE', 10000))
+    IMPORT_CHUNK_SIZE: int = int(os.environ.get('IMPORT_CHUNK_SIZE', 1000))
+    LOCK_STRIPES: int = int(os.environ.get('LOCK_STRIPES', 64))
+    RESERVATION_INDEX: bool = os.environ.get('RESERVATION_INDEX', 'false').lower() == 'true'
+    RESERVATION_INDEX_TTL: float = float(os.environ.get('RESERVATION_INDEX_TTL', 2.0))
+    RESERVATION_INDEX_PRUNE_INTERVAL: float = float(os.environ.get('RESERVATION_INDEX_PRUNE_INTERVAL', 300))
+    CACHE_URL: str = os.environ.get('CACHE_URL', 'memory://')
+    CACHE_SIZE: int = int(os.environ.get('CACHE_SIZE', 4096))
+    RESPONSE_CACHE_TTL: float = float(os.environ.get('RESPONSE_CACHE_TTL', 30))
+    GZIP_MIN_SIZE: int = int(os.environ.get('GZIP_MIN_SIZE', 1024))
+    IDENTITY_CACHE_TTL: float = float(os.environ.get('IDENTITY_CACHE_TTL', 300))
+    LOG_LEVEL: str = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_LEVELS: str = os.environ.get('LOG_LEVELS', '')
+    LOG_FORMAT: str = os.environ.get('LOG_FORMAT', 'json')
+    LOG_FILE: str = os.environ.get('LOG_FILE', 'logs/app.log')
+    LOG_STDOUT: bool = os.environ.get('LOG_STDOUT', 'true').lower() == 'true'
+    LOG_SAMPLE_RATE: float = float(os.environ.get('LOG_SAMPLE_RATE', 1.0))
+    QUERY_BUDGET_COUNT: int = int(os.environ.get('QUERY_BUDGET_COUNT', 30))
+    QUERY_BUDGET_MS: float = float(os.environ.get('QUERY_BUDGET_MS', 500))
+    QUERY_REPEAT_LIMIT: int = int(os.environ.get('QUERY_REPEAT_LIMIT', 5))
+    QUERY_BUDGET_STRICT: bool = os.environ.get('QUERY_BUDGET_STRICT', 'false').lower() == 'true'
+    TRACE_EXPORTER: str = os.environ.get('TRACE_EXPORTER', 'none')
+    TRACE_FILE: str = os.environ.get('TRACE_FILE', 'logs/traces.jsonl')
+    WEB_CONCURRENCY: int = int(os.environ.get('WEB_CONCURRENCY', 1))
+    DB_MAX_CONNECTIONS: int = int(os.environ.get('DB_MAX_CONNECTIONS', 100))
+    DB_POOL_SIZE: int | None = int(os.environ['DB_POOL_SIZE']) if os.environ.get('DB_POOL_SIZE') else None
+    DB_MAX_OVERFLOW: int | None = int(os.environ['DB_MAX_OVERFLOW']) if os.environ.get('DB_MAX_OVERFLOW') else None
+    DB_POOL_TIMEOUT: float = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE: int = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING: bool = os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    DB_PGBOUNCER: bool = os.environ.get('DB_PGBOUNCER', 'false').lower() == 'true'
+    DB_NULL_POOL: bool = os.environ.get('DB_NULL_POOL', 'false').lower() == 'true'
+    DB_REPLICA_URLS: list[str] = [url.strip() for url in os.environ.get('DB_REPLICA_URLS', '').split(',') if url.strip()]
+    REPLICA_MAX_LAG: float = float(os.environ.get('REPLICA_MAX_LAG', 1.0))
+    REPLICA_CHECK_INTERVAL: float = float(os.environ.get('REPLICA_CHECK_INTERVAL', 5.0))
     
 settings = Settings()
 
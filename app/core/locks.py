@@ -0,0 +1,51 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from weakref import WeakKeyDictionary
+from app.core.config import settings
+
+
+class LockStripes:
+    """
+    Fixed set of asyncio locks shared by keys hashing to the same stripe.
+
+    Used to serialize writers of the same table inside one process when the
+    database can not lock single rows (SQLite). Writers of tables that fall on
+    different stripes never wait for each other.
+
+    Locks are created per event loop, so the same instance can be used from
+    several loops (e.g. one per test).
+
+    Attributes:
+        size (int): Number of stripes.
+    """
+
+    def __init__(self, size: int = 64):
+        self.size = size
+        self._locks: WeakKeyDictionary[asyncio.AbstractEventLoop, list[asyncio.Lock]] = WeakKeyDictionary()
+
+    def _stripes(self) -> list[asyncio.Lock]:
+        loop = asyncio.get_running_loop()
+        locks = self._locks.get(loop)
+        if locks is None:
+            locks = self._locks[loop] = [asyncio.Lock() for _ in range(self.size)]
+        return locks
+
+    @asynccontextmanager
+    async def hold(self, *keys: int) -> AsyncIterator[None]:
+        """Hold the stripes of all keys, acquired in a fixed order to avoid deadlocks"""
+        locks = self._stripes()
+        indexes = sorted({hash(key) % self.size for key in keys})
+        acquired: list[asyncio.Lock] = []
+        try:
+            for i in indexes:
+                await locks[i].acquire()
+                acquired.append(locks[i])
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
+
+
+# stripes guarding reservation writes per table
+table_locks = LockStripes(settings.LOCK_STRIPES)
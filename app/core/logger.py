@@ -1,25 +1,169 @@
+import asyncio
+import atexit
+import copy
+import json
 import logging
+import queue
+import random
 import sys
-from logging.handlers import RotatingFileHandler
+from datetime import datetime, UTC
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
+from weakref import WeakKeyDictionary
+from app.core.config import settings
 
-LOG_DIR = Path("logs")
-LOG_DIR.mkdir(exist_ok=True)
 
-LOG_FILE = LOG_DIR / "app.log"
+# attributes every LogRecord has, anything else was passed with `extra`
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
 
 
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line, `extra` fields included"""
 
-# setting logs
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
-    handlers=[
-        logging.FileHandler("app.log",encoding='utf-8'),  # Лог в файл
-        logging.StreamHandler(sys.stdout),          # Лог в консоль
-        RotatingFileHandler(LOG_FILE, maxBytes=5_000_000, backupCount=3, encoding="utf-8"),
-    ]
-)
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, UTC).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage().strip(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep a share of the records at or below a level, e.g. per-request info lines.
+
+    The decision is made once per asyncio task, so the lines of one request
+    are kept or dropped together. Records above the level always pass.
+
+    Attributes:
+        rate (float): Share of the records to keep, between 0 and 1.
+        level (int): Highest level that is sampled.
+    """
+
+    def __init__(self, rate: float, level: int = logging.INFO):
+        super().__init__()
+        self.rate = rate
+        self.level = level
+        self._decisions: WeakKeyDictionary = WeakKeyDictionary()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.level or self.rate >= 1:
+            return True
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        if task is None:
+            return random.random() < self.rate
+        keep = self._decisions.get(task)
+        if keep is None:
+            keep = self._decisions[task] = random.random() < self.rate
+        return keep
+
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # arguments may change once the call returns, so they are merged into the
+        # message here; formatting is left to the writer thread
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        return record
+
+
+def parse_levels(spec: str) -> dict[str, str]:
+    """Parse `logger=LEVEL` pairs separated by commas"""
+    levels = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, sep, level = item.partition("=")
+        if not sep or not level.strip():
+            raise ValueError(f"Invalid log level {item!r}, expected logger=LEVEL")
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(
+    level: str = settings.LOG_LEVEL,
+    levels: str = settings.LOG_LEVELS,
+    fmt: str = settings.LOG_FORMAT,
+    file: str = settings.LOG_FILE,
+    stdout: bool = settings.LOG_STDOUT,
+    sample_rate: float = settings.LOG_SAMPLE_RATE,
+) -> QueueListener:
+    """
+    Route every record through a queue to a single background writer thread.
+
+    Loggers only put records on an in-memory queue, so no file or console
+    I/O happens on the event loop. The writer formats them (JSON or text) and
+    writes them to stdout and a rotating file.
+
+    Args:
+        level: Root level.
+        levels: `logger=LEVEL` pairs separated by commas, e.g. `app.services=WARNING`.
+        fmt: `json` or `text`.
+        file: Path of the rotating log file, empty to disable it.
+        stdout: Also write to stdout.
+        sample_rate: Share of requests whose info lines are kept.
+
+    Returns:
+        QueueListener: The started writer, stopped at exit.
+    """
+    global _listener
+    if fmt == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(name)s - %(message)s")
+    handlers = []
+    if stdout:
+        handlers.append(logging.StreamHandler(sys.stdout))
+    if file:
+        Path(file).parent.mkdir(parents=True, exist_ok=True)
+        handlers.append(RotatingFileHandler(file, maxBytes=5_000_000, backupCount=3, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(records)
+    if sample_rate < 1:
+        queue_handler.addFilter(SamplingFilter(sample_rate))
+
+    root = logging.getLogger()
+    stop_logging()
+    for handler in [h for h in root.handlers if isinstance(h, _QueueHandler)]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+    for name, module_level in parse_levels(levels).items():
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener = QueueListener(records, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging() -> None:
+    """Write the queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+_listener: QueueListener | None = None
+setup_logging()
+atexit.register(stop_logging)
 
 
 #logger
@@ -0,0 +1,422 @@
+import atexit
+import enum
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Iterator, Sequence
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class StatusCode(enum.Enum):
+    UNSET = 0
+    OK = 1
+    ERROR = 2
+
+
+class Span:
+    """
+    Timed operation of a trace, nested under the span current when it started.
+
+    Mirrors the recording part of the OpenTelemetry span API, so code using
+    it keeps working when tracing is delegated to OpenTelemetry.
+
+    Attributes:
+        name (str): Operation name, e.g. `UnitOfWork.commit`.
+        trace_id (str): Id shared by all spans of a trace, 32 hex digits.
+        span_id (str): Id of the span, 16 hex digits.
+        parent_id (str | None): Id of the enclosing span, None for a root span.
+        attributes (dict): Attributes set on the span.
+        events (list[dict]): Events added to the span, e.g. exceptions.
+        start_time (int): Start in nanoseconds since the epoch.
+        end_time (int | None): End in nanoseconds since the epoch, None while running.
+    """
+
+    def __init__(self, name: str, provider: "TracerProvider", parent: "Span | None" = None, attributes: dict | None = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = dict(attributes or {})
+        self.events: list[dict] = []
+        self.status = StatusCode.UNSET
+        self.status_description: str | None = None
+        self.start_time = time.time_ns()
+        self.end_time: int | None = None
+        self._provider = provider
+
+    def is_recording(self) -> bool:
+        return self.end_time is None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: dict) -> None:
+        self.attributes.update(attributes)
+
+    def add_event(self, name: str, attributes: dict | None = None) -> None:
+        self.events.append({"name": name, "time": time.time_ns(), "attributes": dict(attributes or {})})
+
+    def record_exception(self, exception: BaseException, attributes: dict | None = None) -> None:
+        self.add_event("exception", {
+            "exception.type": type(exception).__name__,
+            "exception.message": str(exception),
+            **(attributes or {}),
+        })
+
+    def set_status(self, status: StatusCode, description: str | None = None) -> None:
+        self.status = status
+        self.status_description = description
+
+    def end(self) -> None:
+        if self.end_time is None:
+            self.end_time = time.time_ns()
+            self._provider.on_end(self)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_time or time.time_ns()) - self.start_time) / 1e6
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status.name,
+            "status_description": self.status_description,
+            "attributes": self.attributes,
+            "events": self.events,
+        }
+
+
+class _NonRecordingSpan:
+    """Span handed out while tracing is disabled, every call is a no-op"""
+
+    def is_recording(self) -> bool:
+        return False
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, attributes: dict) -> None:
+        pass
+
+    def add_event(self, name: str, attributes: dict | None = None) -> None:
+        pass
+
+    def record_exception(self, exception: BaseException, attributes: dict | None = None) -> None:
+        pass
+
+    def set_status(self, status: StatusCode, description: str | None = None) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+
+INVALID_SPAN = _NonRecordingSpan()
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def get_current_span() -> Span | _NonRecordingSpan:
+    """Span of the running operation, a no-op span outside of any"""
+    if isinstance(_provider, _OtelTracerProvider):
+        return _provider.trace.get_current_span()
+    return _current_span.get() or INVALID_SPAN
+
+
+class Tracer:
+    """Creates spans of one instrumented module"""
+
+    def __init__(self, name: str, provider: "TracerProvider"):
+        self.name = name
+        self._provider = provider
+
+    def start_span(self, name: str, attributes: dict | None = None) -> Span | _NonRecordingSpan:
+        """Start a span under the current one without making it current; end it with `end()`"""
+        if not self._provider.exporters:
+            return INVALID_SPAN
+        return Span(name, self._provider, _current_span.get(), attributes)
+
+    @contextmanager
+    def start_as_current_span(
+        self,
+        name: str,
+        attributes: dict | None = None,
+        record_exception: bool = True,
+        set_status_on_exception: bool = True,
+    ) -> Iterator[Span | _NonRecordingSpan]:
+        """
+        Run the block in a new span, current for the spans started inside it.
+
+        Args:
+            name: Operation name.
+            attributes: Initial attributes.
+            record_exception: Add an exception raised by the block as an event.
+            set_status_on_exception: Set the ERROR status if the block raises.
+
+        Yields:
+            Span: The started span, ended when the block exits.
+        """
+        span = self.start_span(name, attributes)
+        if span is INVALID_SPAN:
+            yield span
+            return
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            if record_exception:
+                span.record_exception(e)
+            if set_status_on_exception:
+                span.set_status(StatusCode.ERROR, f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                # an async generator closed from another context
+                _current_span.set(None)
+            span.end()
+
+
+class SpanExporter:
+    """Receives every finished span"""
+
+    def export(self, spans: Sequence[Span]) -> None:
+        raise NotImplementedError
+
+    def shutdown(self) -> None:
+        pass
+
+
+class InMemorySpanExporter(SpanExporter):
+    """Keep finished spans in memory, for tests and ad-hoc profiling"""
+
+    def __init__(self):
+        self._spans: list[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[Span]) -> None:
+        with self._lock:
+            self._spans.extend(spans)
+
+    def get_finished_spans(self) -> list[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+
+
+class JsonFileSpanExporter(SpanExporter):
+    """
+    Append finished spans to a file as one JSON object per line.
+
+    Spans are written by a background thread, so no file I/O happens on
+    the event loop.
+    """
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._write, name="span-writer", daemon=True)
+        self._thread.start()
+
+    def export(self, spans: Sequence[Span]) -> None:
+        for span in spans:
+            self._queue.put(span.to_dict())
+
+    def _write(self) -> None:
+        with open(self.path, "a", encoding="utf-8") as file:
+            while True:
+                entry = self._queue.get()
+                if entry is None:
+                    return
+                file.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+                if self._queue.empty():
+                    file.flush()
+
+    def shutdown(self) -> None:
+        """Write the queued spans and stop the writer thread"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+
+class TracerProvider:
+    """
+    Hands out tracers and passes finished spans to the exporters.
+
+    Without exporters no spans are created at all.
+    """
+
+    def __init__(self, exporters: Sequence[SpanExporter] = ()):
+        self.exporters = list(exporters)
+
+    def get_tracer(self, name: str) -> Tracer:
+        return Tracer(name, self)
+
+    def on_end(self, span: Span) -> None:
+        for exporter in self.exporters:
+            exporter.export([span])
+
+    def shutdown(self) -> None:
+        for exporter in self.exporters:
+            exporter.shutdown()
+
+
+class _OtelTracerProvider:
+    """Delegates to the OpenTelemetry API and whatever SDK the deployment configures"""
+
+    exporters = ()
+
+    def __init__(self):
+        from opentelemetry import trace
+        self.trace = trace
+
+    def get_tracer(self, name: str):
+        return self.trace.get_tracer(name)
+
+    def shutdown(self) -> None:
+        pass
+
+
+class _ProxyTracer:
+    """Tracer of the provider set when a span starts, so module level tracers follow setup_tracing"""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def start_span(self, name: str, attributes: dict | None = None):
+        return _provider.get_tracer(self.name).start_span(name, attributes=attributes)
+
+    def start_as_current_span(self, name: str, attributes: dict | None = None, **kwargs):
+        return _provider.get_tracer(self.name).start_as_current_span(name, attributes=attributes, **kwargs)
+
+
+def get_tracer(name: str) -> _ProxyTracer:
+    """Tracer of an instrumented module, e.g. `get_tracer(__name__)`"""
+    return _ProxyTracer(name)
+
+
+def tracing_enabled() -> bool:
+    return isinstance(_provider, _OtelTracerProvider) or bool(_provider.exporters)
+
+
+def traced(name: str | None = None, **attributes: Any) -> Callable:
+    """
+    Run every call of the decorated function in its own span.
+
+    Works on coroutine functions, async generator functions (the span lasts
+    until the generator is exhausted or closed) and plain functions. While
+    tracing is disabled the function is called directly.
+
+    Args:
+        name: Span name, by default the qualified name of a method (`TableService.get_table`)
+            or the module and name of a function (`tables.get_table`).
+        **attributes: Attributes set on every span.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+        if name is None and "." not in span_name:
+            span_name = f"{func.__module__.rsplit('.', 1)[-1]}.{span_name}"
+        tracer = get_tracer(func.__module__)
+
+        if inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                if not tracing_enabled():
+                    async for item in func(*args, **kwargs):
+                        yield item
+                    return
+                with tracer.start_as_current_span(span_name, attributes=attributes):
+                    async for item in func(*args, **kwargs):
+                        yield item
+        elif inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                if not tracing_enabled():
+                    return await func(*args, **kwargs)
+                with tracer.start_as_current_span(span_name, attributes=attributes):
+                    return await func(*args, **kwargs)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not tracing_enabled():
+                    return func(*args, **kwargs)
+                with tracer.start_as_current_span(span_name, attributes=attributes):
+                    return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def setup_tracing(exporter: str = settings.TRACE_EXPORTER, file: str = settings.TRACE_FILE) -> TracerProvider | _OtelTracerProvider:
+    """
+    Choose where spans go.
+
+    Args:
+        exporter: `none` to disable tracing, `memory` to keep spans in
+            memory, `file` to append them to a JSON lines file, or `otel` to
+            delegate to OpenTelemetry (falls back to `none` if it is not installed).
+        file: Path of the JSON lines file of the `file` exporter.
+
+    Returns:
+        The new provider, its exporters are shut down at exit.
+    """
+    global _provider
+    shutdown_tracing()
+    exporter = exporter.lower()
+    if exporter == "otel":
+        try:
+            _provider = _OtelTracerProvider()
+            return _provider
+        except ImportError:
+            logger.warning("TRACE_EXPORTER is otel but opentelemetry is not installed, tracing disabled")
+            exporter = "none"
+    if exporter == "memory":
+        _provider = TracerProvider([InMemorySpanExporter()])
+    elif exporter == "file":
+        _provider = TracerProvider([JsonFileSpanExporter(file)])
+    elif exporter == "none":
+        _provider = TracerProvider()
+    else:
+        raise ValueError(f"Unknown trace exporter {exporter!r}, expected none, memory, file or otel")
+    return _provider
+
+
+def set_tracer_provider(provider: TracerProvider) -> None:
+    """Use a provider with custom exporters, e.g. an InMemorySpanExporter in tests"""
+    global _provider
+    _provider = provider
+
+
+def get_tracer_provider() -> TracerProvider | _OtelTracerProvider:
+    return _provider
+
+
+def shutdown_tracing() -> None:
+    """Export the pending spans and close the exporters"""
+    _provider.shutdown()
+
+
+_provider: TracerProvider | _OtelTracerProvider = TracerProvider()
+setup_tracing()
+atexit.register(shutdown_tracing)
@@ -0,0 +1,238 @@
+import collections
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Iterator
+from weakref import WeakValueDictionary
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from app.core.config import settings
+from app.core.metrics import SQL_DURATION, POOL_CHECKOUT_WAIT, POOL_CONNECTIONS
+
+logger = logging.getLogger(__name__)
+
+
+_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "BEGIN", "COMMIT", "ROLLBACK", "PRAGMA", "SAVEPOINT", "RELEASE"}
+
+
+def statement_operation(statement: str) -> str:
+    """First keyword of a statement, OTHER for uncommon ones to bound label values"""
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    return operation if operation in _OPERATIONS else "OTHER"
+
+
+class MeasuredQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool recording how long each checkout waits for a connection"""
+
+    def _do_get(self):
+        start = perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_CHECKOUT_WAIT.observe(perf_counter() - start)
+
+
+class QueryBudgetExceeded(Exception):
+    """Statements of a request or block went over the budget, raised in strict mode"""
+
+
+@dataclass
+class QueryStats:
+    """
+    Statements run while tracking is active, e.g. during one request.
+
+    Attributes:
+        count (int): Number of statements.
+        duration (float): Seconds spent in the database.
+        statements (list[tuple[str, float]]): First statements and their durations.
+        repeats (collections.Counter): Number of runs of each statement text.
+    """
+
+    MAX_KEPT = 100
+
+    count: int = 0
+    duration: float = 0.0
+    statements: list[tuple[str, float]] = field(default_factory=list)
+    repeats: collections.Counter = field(default_factory=collections.Counter)
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.duration += seconds
+        self.repeats[statement] += 1
+        if len(self.statements) < self.MAX_KEPT:
+            self.statements.append((statement, seconds))
+
+    def violations(self, max_count: int, max_ms: float, max_repeats: int) -> list[str]:
+        """Reasons the statements go over the budget, empty if within it; 0 disables a limit"""
+        reasons = []
+        if max_count and self.count > max_count:
+            reasons.append(f"{self.count} statements, budget {max_count}")
+        if max_ms and self.duration * 1000 > max_ms:
+            reasons.append(f"{self.duration * 1000:.1f} ms in the database, budget {max_ms} ms")
+        if max_repeats:
+            for statement, runs in self.repeats.items():
+                if runs > max_repeats:
+                    reasons.append(f"{runs} runs of the same statement (N+1?): {statement}")
+        return reasons
+
+    def server_timing(self) -> str:
+        """Server-Timing header value"""
+        return f'db;dur={self.duration * 1000:.1f};desc="{self.count} queries"'
+
+
+_query_stats: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+
+def start_query_tracking() -> tuple[QueryStats, Token]:
+    """Count the statements of the current context from now on"""
+    stats = QueryStats()
+    return stats, _query_stats.set(stats)
+
+
+def stop_query_tracking(token: Token) -> None:
+    _query_stats.reset(token)
+
+
+def check_query_budget(
+    stats: QueryStats,
+    label: str,
+    max_count: int | None = None,
+    max_ms: float | None = None,
+    max_repeats: int | None = None,
+    strict: bool | None = None,
+) -> list[str]:
+    """
+    Log statements going over the budget, with the slowest ones.
+
+    Args:
+        stats: Statements to check.
+        label: What ran them, e.g. the request method and path.
+        max_count: Maximum number of statements, 0 for no limit.
+        max_ms: Maximum milliseconds in the database, 0 for no limit.
+        max_repeats: Maximum runs of one statement text, 0 for no limit.
+        strict: Raise instead of only logging.
+
+    Limits left as None take the configured values.
+
+    Returns:
+        list[str]: Reasons the budget is exceeded, empty if it is not.
+
+    Raises:
+        QueryBudgetExceeded: In strict mode, if the budget is exceeded.
+    """
+    reasons = stats.violations(
+        settings.QUERY_BUDGET_COUNT if max_count is None else max_count,
+        settings.QUERY_BUDGET_MS if max_ms is None else max_ms,
+        settings.QUERY_REPEAT_LIMIT if max_repeats is None else max_repeats,
+    )
+    strict = settings.QUERY_BUDGET_STRICT if strict is None else strict
+    if reasons:
+        slowest = sorted(stats.statements, key=lambda item: item[1], reverse=True)[:5]
+        logger.warning(
+            "Query budget exceeded by %s: %s; slowest statements: %s",
+            label, "; ".join(reasons), " | ".join(f"{seconds * 1000:.1f} ms {statement}" for statement, seconds in slowest),
+            extra={"queries": stats.count, "db_ms": round(stats.duration * 1000, 1)},
+        )
+        if strict:
+            raise QueryBudgetExceeded(f"{label}: {'; '.join(reasons)}")
+    return reasons
+
+
+@contextmanager
+def track_queries(label: str = "block", **budget) -> Iterator[QueryStats]:
+    """
+    Count the statements run inside the block and check them against the budget.
+
+    Meant for tests, e.g. `with track_queries(max_count=2, strict=True)`; the
+    budget defaults to the configured one.
+
+    Yields:
+        QueryStats: Statements of the block so far.
+    """
+    stats, token = start_query_tracking()
+    try:
+        yield stats
+    finally:
+        stop_query_tracking(token)
+    check_query_budget(stats, label, **budget)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = perf_counter() - conn.info["query_start"].pop()
+    SQL_DURATION.observe(elapsed, operation=statement_operation(statement))
+    stats = _query_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+
+
+def _handle_error(context):
+    starts = context.connection.info.get("query_start") if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+
+# engines whose pools are reported, by pool label
+_pools: WeakValueDictionary = WeakValueDictionary()
+
+
+def _pool_connections() -> dict[tuple, float]:
+    values = {}
+    for name, engine in list(_pools.items()):
+        stats = pool_stats(engine)
+        values.update({(name, state): stats[state] for state in ("size", "in_use", "idle", "overflow") if state in stats})
+    return values
+
+
+POOL_CONNECTIONS.callback = _pool_connections
+
+
+def instrument_engine(engine: AsyncEngine, pool: str = "primary") -> None:
+    """
+    Record SQL statement durations of the engine and expose its pool state.
+
+    Statements are also counted for the request (or `track_queries` block)
+    running them. Instrumenting an engine twice has no effect.
+
+    The pool gauges read the current pool when scraped, so a recreated
+    pool (e.g. after dispose) is reported as well.
+
+    Args:
+        engine (AsyncEngine): Engine to instrument, once.
+        pool (str): `pool` label of its connection gauges, e.g. `primary` or `replica0`.
+    """
+    sync_engine = engine.sync_engine
+    if event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+    _pools[pool] = engine
+
+
+def pool_stats(engine: AsyncEngine) -> dict:
+    """
+    Live state of the engine's connection pool.
+
+    Returns:
+        dict: Pool class and, for queue pools, its size, connections in use,
+        idle and overflow ones, the overflow limit and the checkout timeout.
+    """
+    pool = engine.sync_engine.pool
+    stats = {"class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            in_use=pool.checkedout(),
+            idle=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+            timeout=pool.timeout(),
+        )
+    return stats
@@ -0,0 +1,133 @@
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Iterator, Sequence
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+logger = logging.getLogger(__name__)
+
+
+# replay lag of a streaming standby; a standby that replayed everything it
+# received is current even if the primary has been idle for a while
+_PG_LAG = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+async def replication_lag(session: AsyncSession) -> float:
+    """Seconds the database behind the session lags its primary, 0 for databases without replication"""
+    if session.get_bind().dialect.name != "postgresql":
+        return 0.0
+    lag = (await session.execute(_PG_LAG)).scalar()
+    return float(lag or 0)
+
+
+def _replica_name(session_maker: async_sessionmaker, position: int) -> str:
+    bind = session_maker.kw.get("bind")
+    return str(bind.url) if bind is not None else f"replica{position}"
+
+
+@dataclass
+class Replica:
+    """
+    Read replica with its last lag check.
+
+    Attributes:
+        name (str): Name used in logs, e.g. the host.
+        session_maker (async_sessionmaker): Sessions of the replica.
+        healthy (bool): Result of the last check.
+        checked_at (float): Monotonic time of the last check, 0 before the first.
+    """
+
+    name: str
+    session_maker: async_sessionmaker
+    healthy: bool = True
+    checked_at: float = field(default=0.0)
+
+
+class ReplicaSet:
+    """
+    Read replicas picked round-robin, skipping lagging or unreachable ones.
+
+    Each replica's lag is checked at most once per `check_interval`; a
+    replica lagging more than `max_lag` seconds or failing the check is
+    skipped until its next check. When no replica qualifies reads go to the
+    primary.
+
+    Attributes:
+        replicas (list[Replica]): The replicas.
+        max_lag (float): Largest acceptable replication lag in seconds.
+        check_interval (float): Seconds between lag checks of a replica.
+    """
+
+    def __init__(
+        self,
+        session_makers: Sequence[async_sessionmaker],
+        max_lag: float = 1.0,
+        check_interval: float = 5.0,
+        lag_probe: Callable[[AsyncSession], Awaitable[float]] = replication_lag,
+        names: Sequence[str] | None = None,
+    ):
+        names = names or [_replica_name(maker, i) for i, maker in enumerate(session_makers)]
+        self.replicas = [Replica(name, maker) for name, maker in zip(names, session_makers)]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._lag_probe = lag_probe
+        self._counter = itertools.count()
+
+    async def _check(self, replica: Replica) -> bool:
+        now = time.monotonic()
+        if now - replica.checked_at < self.check_interval:
+            return replica.healthy
+        # concurrent reads keep the previous result instead of probing as well
+        replica.checked_at = now
+        try:
+            async with replica.session_maker() as session:
+                lag = await self._lag_probe(session)
+        except Exception as e:
+            logger.warning("Replica %s is unavailable: %s", replica.name, e)
+            replica.healthy = False
+            return False
+        replica.healthy = lag <= self.max_lag
+        if not replica.healthy:
+            logger.warning("Replica %s lags %.1f s behind the primary, skipping it", replica.name, lag)
+        return replica.healthy
+
+    async def pick(self) -> Replica | None:
+        """Next replica fit for reads, None to read from the primary"""
+        start = next(self._counter)
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            if await self._check(replica):
+                return replica
+        return None
+
+
+_replica_reads: ContextVar[list[str] | None] = ContextVar("replica_reads", default=None)
+
+
+def note_replica_read(replica: Replica) -> None:
+    reads = _replica_reads.get()
+    if reads is not None:
+        reads.append(replica.name)
+
+
+@contextmanager
+def track_replica_reads() -> Iterator[list[str]]:
+    """
+    Collect the replicas read from inside the block.
+
+    Yields:
+        list[str]: Names of the replicas, in order, empty if only the primary was read.
+    """
+    reads: list[str] = []
+    token = _replica_reads.set(reads)
+    try:
+        yield reads
+    finally:
+        _replica_reads.reset(token)
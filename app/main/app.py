@@ -1,12 +1,22 @@
-from fastapi import FastAPI,HTTPException,Depends
+import logging
+from fastapi import FastAPI,HTTPException,Depends,Response
 from pydantic import ValidationError
 from fastapi.exceptions import RequestValidationError
 from app.api.v1.routers.routers import routers
-from app.database.db import create_tables
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from app.database.db import create_tables, async_session_maker, get_engine
+from app.database.instrumentation import pool_stats
+from app.services import reservation_index
+from app.core.cache import cache
+from app.core.metrics import registry
+from app.main.middleware import MetricsMiddleware, QueryBudgetMiddleware
+from app.utils.patterns import UnitOfWork
 from contextlib import asynccontextmanager
 #add CORS
 from fastapi.middleware.cors import CORSMiddleware
-from app.core.logger import logger
+
+logger = logging.getLogger(__name__)
 
 
 origins = [
@@ -19,9 +29,18 @@ origins = [
 #    await create_tables()
 #    yield
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if reservation_index is not None:
+        async with async_session_maker() as session:
+            await reservation_index.warm(UnitOfWork(session))
+    yield
+    if cache is not None:
+        await cache.close()
+
 #db_created = create_tables()
 # app: FastAPI
-app = FastAPI(title="Service API",)#on_startup=[create_tables])
+app = FastAPI(title="Service API",lifespan=lifespan)#on_startup=[create_tables])
 
 logger.info("Init CORS")
 #add CORS
@@ -34,6 +53,9 @@ app.add_middleware(
     
 )
 
+app.add_middleware(QueryBudgetMiddleware)
+app.add_middleware(MetricsMiddleware)
+
 logger.info("Include routers")
 app.include_router(routers)
 
@@ -50,6 +72,41 @@ async def root():
     return {"message": "Service API created by NNikitaB"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Metrics of this process in the Prometheus text format.
+
+    Returns:
+        Response: Request latencies per route, booking outcomes, SQL statement timings and pool state.
+    """
+    return Response(content=registry.render(), media_type=registry.CONTENT_TYPE)
+
+
+@app.get("/health")
+async def health(response: Response, engine: AsyncEngine = Depends(get_engine)):
+    """
+    Liveness of the service and its database, with live connection pool stats.
+
+    Returns:
+        dict: Overall status, database status and pool state (class, size, in use,
+        idle and overflow connections); 503 if the database can not be reached.
+    """
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        database = "ok"
+    except Exception as e:
+        logger.error(" Health check failed to reach the database: %s", e)
+        database = "unavailable"
+        response.status_code = 503
+    return {
+        "status": "ok" if database == "ok" else "degraded",
+        "database": database,
+        "pool": pool_stats(engine),
+    }
+
+
 logger.info("App started")
 
 #if __name__ == "__main__":
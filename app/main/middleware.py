@@ -0,0 +1,82 @@
+from time import perf_counter
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.config import settings
+from app.core.metrics import REQUEST_DURATION
+from app.database.instrumentation import check_query_budget, start_query_tracking, stop_query_tracking
+
+
+class MetricsMiddleware:
+    """
+    Record the duration of every HTTP request by method, route template and status.
+
+    Requests that match no route share the `unmatched` route label, so
+    arbitrary paths can not create new series.
+    """
+
+    def __init__(self, app: ASGIApp, exclude: tuple[str, ...] = ("/metrics",)):
+        self.app = app
+        self.exclude = exclude
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in self.exclude:
+            await self.app(scope, receive, send)
+            return
+        start = perf_counter()
+        status = 500
+
+        async def send_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            route = scope.get("route")
+            REQUEST_DURATION.observe(
+                perf_counter() - start,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=str(status),
+            )
+
+
+class QueryBudgetMiddleware:
+    """
+    Count the SQL statements and database time of every HTTP request.
+
+    The totals so far are sent in a `Server-Timing: db` header. Requests going
+    over the query budget are logged with their slowest statements; in strict
+    mode (QUERY_BUDGET_STRICT, for tests) such a request fails instead, as
+    long as its response has not started.
+    """
+
+    def __init__(self, app: ASGIApp, exclude: tuple[str, ...] = ("/metrics",)):
+        self.app = app
+        self.exclude = exclude
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in self.exclude:
+            await self.app(scope, receive, send)
+            return
+        stats, token = start_query_tracking()
+        label = f"{scope['method']} {scope['path']}"
+        checked = False
+
+        async def send_timing(message: Message) -> None:
+            nonlocal checked
+            if message["type"] == "http.response.start":
+                if settings.QUERY_BUDGET_STRICT:
+                    checked = True
+                    check_query_budget(stats, label)
+                MutableHeaders(scope=message).append("Server-Timing", stats.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timing)
+        finally:
+            stop_query_tracking(token)
+        if not checked:
+            check_query_budget(stats, label, strict=False)
@@ -1,7 +1,23 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, Enum
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean, Enum, Index
 from .Base import Base
-from sqlalchemy.orm import relationship, Mapped, mapped_column
-from datetime import datetime, UTC
+from sqlalchemy.orm import relationship, Mapped, mapped_column, validates
+from datetime import datetime, timedelta, UTC
+
+# Name of the Postgres-only exclusion constraint created by migration 5b1f0c2d7e3a
+OVERLAP_CONSTRAINT = "ex_reservations_table_id_time_overlap"
+
+
+def reservation_end(start: datetime | None, duration_minutes: int | None) -> datetime | None:
+    """End of a reservation starting at `start`, the duration defaults to 60 minutes like the column."""
+    if start is None:
+        return None
+    return start + timedelta(minutes=duration_minutes or 60)
+
+
+def _end_time_default(context) -> datetime | None:
+    """Compute the reservation end time from the insert parameters."""
+    params = context.get_current_parameters()
+    return reservation_end(params.get("reservation_time"), params.get("duration_minutes"))
 
 
 class Reservations(Base):
@@ -14,19 +30,38 @@ class Reservations(Base):
         table_id (int): Foreign key referencing the reserved table.
         reservation_time (datetime): Timestamp of the reservation, defaults to current UTC time.
         duration_minutes (int): Length of the reservation in minutes, defaults to 60.
+        end_time (datetime): Stored end of the reservation (reservation_time + duration_minutes),
+            used by the indexed overlap query. Recomputed whenever either column is set on an
+            instance; ReservationRepository.update_returning does the same for bulk updates.
         table (relationship): Relationship to the Tables model, allowing bidirectional access.
     """
         
     __tablename__ = "reservations"
+    __table_args__ = (
+        Index("ix_reservations_table_id_reservation_time", "table_id", "reservation_time"),
+        Index("ix_reservations_table_id_end_time", "table_id", "end_time"),
+        Index("ix_reservations_reservation_time_id", "reservation_time", "id"),
+    )
     #basic fields
     id: Mapped[int] = mapped_column(primary_key=True)
     customer_name: Mapped[str] = mapped_column(nullable=False)
     table_id: Mapped[int] = mapped_column(ForeignKey("tables.id",ondelete="CASCADE"), nullable=False)
     reservation_time = mapped_column(DateTime(timezone=True), default=datetime.now(UTC))
     duration_minutes: Mapped[int] = mapped_column(Integer, default=60)
+    end_time = mapped_column(DateTime(timezone=True), nullable=False, default=_end_time_default)
     #relationships
     table = relationship("Tables", back_populates="reserved_tables")
 
+    @validates("reservation_time", "duration_minutes")
+    def _sync_end_time(self, key: str, value):
+        """Keep end_time in step with the columns it is derived from."""
+        # only loaded values are used, reading an expired attribute would hit the database
+        start = value if key == "reservation_time" else self.__dict__.get("reservation_time")
+        duration = value if key == "duration_minutes" else self.__dict__.get("duration_minutes")
+        if start is not None:
+            self.end_time = reservation_end(start, duration)
+        return value
+
 
     def to_dict(self,exclude_relate=True) -> dict:
         """
@@ -41,4 +76,3 @@ class Reservations(Base):
             "duration_minutes": self.duration_minutes,
         }
 
-
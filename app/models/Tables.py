@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, DateTime,Enum
+from sqlalchemy import Column, Integer, String, ForeignKey, Boolean, DateTime,Enum, Index
 from .Base import Base
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 
@@ -15,17 +15,25 @@ class Tables(Base):
         name (str): Name of the table (required)
         seats (int): Number of seats at the table (required)
         location (str): Location of the table (required)
-        reserved_tables: Relationship to reservations associated with the table
+        reservations_version (int): Counter bumped on every reservation change of the table,
+            used to validate in-process interval indexes
+        reserved_tables: Relationship to reservations associated with the table, loaded only on request
     """
 
     __tablename__ = 'tables'
+    __table_args__ = (
+        Index("ix_tables_location_id", "location", "id"),
+        Index("ix_tables_seats", "seats"),
+    )
     #basic fields 
     id: Mapped[int] = mapped_column(primary_key=True,autoincrement=True)  
     name: Mapped[str] = mapped_column(nullable=False,default="Unknown")
     seats: Mapped[int] = mapped_column(nullable=False,default=1)
     location: Mapped[str] = mapped_column(nullable=False,default="Default")
+    # only read and written with column statements, never loaded into instances
+    reservations_version: Mapped[int] = mapped_column(nullable=False,default=0,server_default="0",deferred=True,deferred_raiseload=True)
     #relationships
-    reserved_tables = relationship("Reservations",back_populates="table",cascade="all, delete",passive_deletes=True, lazy="selectin")
+    reserved_tables = relationship("Reservations",back_populates="table",cascade="all, delete",passive_deletes=True, lazy="select")
 
     def to_dict(self,exclude_relate=True) -> dict:
         """
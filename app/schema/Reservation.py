@@ -1,5 +1,6 @@
-from pydantic import BaseModel, Field,field_validator
+from pydantic import BaseModel, Field,field_validator, TypeAdapter
 from typing import Optional, List
+from typing_extensions import TypedDict
 from datetime import datetime, UTC
 
 
@@ -44,4 +45,33 @@ class ReservationUpdate(ReservationCreate):
 
 
 class ReservationResponse(ReservationUpdate):
-    pass
\ No newline at end of file
+    pass
+
+
+class FreeSlot(BaseModel):
+    """
+    Free window of a table between existing reservations.
+
+    Attributes:
+        start (datetime): Beginning of the free window (UTC).
+        end (datetime): End of the free window (UTC), exclusive.
+    """
+    start: datetime
+    end: datetime
+
+
+class ReservationRow(TypedDict):
+    """
+    Reservation columns as read by the row level repository methods.
+
+    Trusted data coming straight from the database: dumped to JSON with
+    `reservation_rows` without building `ReservationResponse` models.
+    """
+    reservation_time: datetime
+    duration_minutes: int
+    table_id: int
+    customer_name: str
+    id: int
+
+
+reservation_rows = TypeAdapter(List[ReservationRow])
@@ -1,6 +1,7 @@
-from pydantic import BaseModel, EmailStr,Field
+from pydantic import BaseModel, EmailStr,Field, TypeAdapter
 from typing import Optional, List
-from app.schema import ReservationResponse
+from typing_extensions import TypedDict, NotRequired
+from app.schema import ReservationResponse, ReservationRow
 from datetime import datetime,UTC
 
 
@@ -41,5 +42,36 @@ class TableCreate(TableBase):
 class TableUpdate(TableCreate):
     id : int
 
+class TablePatch(BaseModel):
+    """
+    Partial update of a table, only the fields that are set are changed.
+
+    Attributes:
+        name (Optional[str]): New name of the table.
+        seats (Optional[int]): New number of seats, minimum of 0.
+        location (Optional[str]): New location of the table.
+    """
+    name: Optional[str] = None
+    seats: Optional[int] = Field(default=None, ge=0)
+    location: Optional[str] = None
+
 class TableResponse(TableUpdate):
     reserved_tables: Optional[List[ReservationResponse]] = None
+
+
+class TableRow(TypedDict):
+    """
+    Table columns as read by the row level repository methods.
+
+    Trusted data coming straight from the database: dumped to JSON with
+    `table_row` / `table_rows` without building `TableResponse` models.
+    """
+    name: str
+    seats: int
+    location: str
+    id: int
+    reserved_tables: NotRequired[Optional[List[ReservationRow]]]
+
+
+table_row = TypeAdapter(TableRow)
+table_rows = TypeAdapter(List[TableRow])
@@ -4,13 +4,20 @@ __all__ = [
     "ReservationUpdate",
     "ReservationResponse",
     "ReservationBase",
+    "FreeSlot",
+    "ReservationRow",
+    "reservation_rows",
     "TableBase",
     "TableGet",
     "TableResponse",
     "TableCreate",
     "TableUpdate",
+    "TablePatch",
+    "TableRow",
+    "table_row",
+    "table_rows",
 ]
 
 
-from .Reservation import ReservationGet, ReservationCreate, ReservationUpdate,ReservationResponse,ReservationBase
-from .Table import TableCreate, TableGet, TableResponse, TableUpdate,TableBase
+from .Reservation import ReservationGet, ReservationCreate, ReservationUpdate,ReservationResponse,ReservationBase,FreeSlot,ReservationRow,reservation_rows
+from .Table import TableCreate, TableGet, TableResponse, TableUpdate,TableBase,TablePatch,TableRow,table_row,table_rows
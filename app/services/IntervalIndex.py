@@ -0,0 +1,198 @@
+import logging
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from datetime import datetime, UTC
+from time import monotonic
+from app.utils.patterns import UnitOfWork
+from app.utils.dt import as_utc_naive as _key
+from app.core import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _TableIntervals:
+    """Reservation intervals of one table, sorted by start
+
+    Only the Postgres exclusion constraint keeps stored intervals from
+    overlapping, so the ends are not assumed sorted: `max_ends[i]` is the
+    latest end among the first i + 1 intervals.
+    """
+    version: int
+    validated_at: float
+    starts: list[datetime] = field(default_factory=list)
+    ends: list[datetime] = field(default_factory=list)
+    ids: list[int] = field(default_factory=list)
+    max_ends: list[datetime] = field(default_factory=list)
+
+    def overlaps(self, start: datetime, end: datetime) -> bool:
+        # intervals starting before `end` overlap if any of them ends after `start`
+        i = bisect_left(self.starts, end)
+        return i > 0 and self.max_ends[i - 1] > start
+
+    def _update_max_ends(self, i: int) -> None:
+        del self.max_ends[i:]
+        for end in self.ends[i:]:
+            self.max_ends.append(max(self.max_ends[-1], end) if self.max_ends else end)
+
+    def insert(self, id: int, start: datetime, end: datetime) -> None:
+        i = bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.ids.insert(i, id)
+        self._update_max_ends(i)
+
+    def remove(self, id: int) -> None:
+        if id in self.ids:
+            i = self.ids.index(id)
+            del self.starts[i], self.ends[i], self.ids[i]
+            self._update_max_ends(i)
+
+    def prune(self, horizon: datetime) -> None:
+        """Forget intervals ending at or before `horizon`"""
+        keep = [i for i, end in enumerate(self.ends) if end > horizon]
+        if len(keep) == len(self.ends):
+            return
+        self.starts = [self.starts[i] for i in keep]
+        self.ends = [self.ends[i] for i in keep]
+        self.ids = [self.ids[i] for i in keep]
+        self._update_max_ends(0)
+
+
+class ReservationIntervalIndex:
+    """In-process per-table index of reservation intervals
+
+    Every table entry is stamped with the `reservations_version` of the table it
+    was built from. Booking code reads that version inside its own transaction
+    and only trusts the entry when both match; otherwise the entry is reloaded
+    from the database, which stays the source of truth.
+
+    Only intervals ending after `horizon` are kept, checks for earlier slots
+    are left to the database. With a `prune_interval` the horizon follows the
+    current time and finished reservations are forgotten, so the index of a
+    long running worker does not grow with the booking history.
+
+    Attributes:
+        horizon (datetime): Lower bound of indexed intervals.
+        ttl (float): Seconds a validated entry may answer conflicts on its own,
+            without reading the table version from the database.
+        prune_interval (float): Seconds between moves of the horizon to the
+            current time, 0 keeps it where it was set.
+    """
+
+    def __init__(self, horizon: datetime | None = None, ttl: float = 0.0, prune_interval: float = 0.0):
+        self.horizon = _key(horizon or datetime.now(UTC))
+        self.ttl = ttl
+        self.prune_interval = prune_interval
+        self._pruned_at = monotonic()
+        self._tables: dict[int, _TableIntervals] = {}
+
+    def __contains__(self, table_id: int) -> bool:
+        return table_id in self._tables
+
+    def load_table(self, table_id: int, version: int, intervals: list[tuple]) -> None:
+        """Replace the entry of a table with intervals read at `version`"""
+        entry = _TableIntervals(version=version, validated_at=monotonic())
+        for id, _, start, end in sorted(intervals, key=lambda row: _key(row[2])):
+            entry.starts.append(_key(start))
+            entry.ends.append(_key(end))
+            entry.ids.append(id)
+        entry._update_max_ends(0)
+        self._tables[table_id] = entry
+        logger.debug("Interval index loaded table %s at version %s: %s intervals", table_id, version, len(entry.ids))
+
+    async def warm(self, uow: UnitOfWork) -> None:
+        """Load every table from the database"""
+        logger.info("Warming reservation interval index")
+        async with uow:
+            versions = await uow.tables.list_reservations_versions()
+            intervals = await uow.reservations.list_intervals(since=self.horizon)
+        by_table: dict[int, list[tuple]] = {table_id: [] for table_id in versions}
+        for row in intervals:
+            by_table.setdefault(row[1], []).append(row)
+        for table_id, version in versions.items():
+            self.load_table(table_id, version, by_table[table_id])
+        logger.info("Reservation interval index warmed: %s tables, %s intervals", len(versions), len(intervals))
+
+    async def reload_table(self, uow: UnitOfWork, table_id: int, version: int) -> None:
+        """Rebuild the entry of a table inside the caller's transaction"""
+        intervals = await uow.reservations.list_intervals(since=self.horizon, table_id=table_id)
+        self.load_table(table_id, version, intervals)
+
+    def advance_horizon(self, horizon: datetime) -> None:
+        """Move the horizon forward and forget the intervals that ended before it"""
+        horizon = _key(horizon)
+        if horizon <= self.horizon:
+            return
+        self.horizon = horizon
+        for entry in self._tables.values():
+            entry.prune(horizon)
+        logger.debug("Interval index horizon moved to %s", horizon)
+
+    def _maybe_prune(self) -> None:
+        if self.prune_interval and monotonic() - self._pruned_at >= self.prune_interval:
+            self._pruned_at = monotonic()
+            self.advance_horizon(datetime.now(UTC))
+
+    def covers(self, start: datetime) -> bool:
+        """Whether a slot starting at `start` can be answered by the index"""
+        return _key(start) >= self.horizon
+
+    def check(self, table_id: int, version: int, start: datetime, end: datetime) -> bool | None:
+        """Check conflict against an entry validated at `version`
+
+        :return: bool | None conflict flag, None if the index can not answer
+        """
+        self._maybe_prune()
+        entry = self._tables.get(table_id)
+        if entry is None or entry.version != version or not self.covers(start):
+            return None
+        entry.validated_at = monotonic()
+        return entry.overlaps(_key(start), _key(end))
+
+    def is_fresh_conflict(self, table_id: int, start: datetime, end: datetime) -> bool:
+        """Likely conflict, known without touching the database
+
+        True only if the entry was validated less than `ttl` seconds ago and
+        already contains an overlapping interval. The entry may still miss a
+        deletion committed by another process since, so confirm a positive
+        with `check` against the current version before refusing the booking.
+        """
+        entry = self._tables.get(table_id)
+        if entry is None or not self.covers(start) or monotonic() - entry.validated_at > self.ttl:
+            return False
+        return entry.overlaps(_key(start), _key(end))
+
+    def add(self, table_id: int, version: int, id: int, start: datetime, end: datetime) -> None:
+        """Record a committed reservation that moved the table to `version`"""
+        self.extend(table_id, version, [(id, table_id, start, end)])
+
+    def extend(self, table_id: int, version: int, intervals: list[tuple]) -> None:
+        """Record reservations committed together that moved the table to `version`"""
+        entry = self._tables.get(table_id)
+        if entry is None or entry.version != version - 1:
+            # another writer got in between, the next check reloads the table
+            self._tables.pop(table_id, None)
+            return
+        entry.version = version
+        for id, _, start, end in intervals:
+            if _key(end) > self.horizon:
+                entry.insert(id, _key(start), _key(end))
+
+    def remove(self, table_id: int, version: int, id: int) -> None:
+        """Forget a committed deletion that moved the table to `version`"""
+        entry = self._tables.get(table_id)
+        if entry is None or entry.version != version - 1:
+            self._tables.pop(table_id, None)
+            return
+        entry.version = version
+        entry.remove(id)
+
+    def drop_table(self, table_id: int) -> None:
+        self._tables.pop(table_id, None)
+
+
+# process-wide index, enabled with RESERVATION_INDEX=true
+reservation_index = ReservationIntervalIndex(
+    ttl=settings.RESERVATION_INDEX_TTL, prune_interval=settings.RESERVATION_INDEX_PRUNE_INTERVAL,
+) if settings.RESERVATION_INDEX else None
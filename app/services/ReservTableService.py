@@ -1,3 +1,4 @@
+import logging
 from app.schema import (
     TableCreate,
     TableGet,
@@ -9,97 +10,371 @@ from app.schema import (
     ReservationUpdate,
     ReservationBase,
     ReservationResponse,
+    FreeSlot,
+    reservation_rows,
 )
 from app.models import Tables, Reservations
+from app.models.Reservations import OVERLAP_CONSTRAINT
 from app.utils.patterns import IUnitOfWork, UnitOfWork
-from app.services.expt import TableNotFound, TableAlreadyReserv
-from datetime import datetime, timedelta
-from app.core import logger
+from app.services.expt import TableNotFound, TableAlreadyReserv, BatchTooLarge
+from app.services.IntervalIndex import ReservationIntervalIndex
+from app.utils.dt import as_utc_naive
+from app.utils.cursor import encode_cursor, decode_cursor
+from datetime import datetime, timedelta, UTC
+from time import perf_counter
+from typing import AsyncIterator
+from sqlalchemy.exc import IntegrityError
+from app.core import settings
+from app.core.metrics import CONFLICT_CHECK_DURATION
+from app.core.tracing import get_current_span, traced
+
+logger = logging.getLogger(__name__)
 
 
 class ReservTableService:
-    """Service for working with  Reservations of Tables"""
-    def __init__(self, uow: UnitOfWork):
+    """Service for working with  Reservations of Tables
+
+    When an interval index is given it answers conflict checks in-process and
+    is kept up to date on every successful booking and deletion.
+    """
+    def __init__(self, uow: UnitOfWork, index: ReservationIntervalIndex | None = None):
         self.uow = uow
+        self.index = index
 
-    async def _is_check_conflict(self, reserv_data: ReservationCreate) -> bool:
+    @traced()
+    async def _is_check_conflict(self, reserv_data: ReservationCreate, version: int | None = None) -> bool:
         """Check if reservation time is not conflict
 
         :param reserv_data: ReservationCreate
+        :param version: int | None reservations version of the table read in the current transaction
         :return: bool False if reservation time is not conflict, True otherwise
         """
-        logger.info(f" Checking reservation conflict for table {reserv_data.table_id}")
+        logger.info(" Checking reservation conflict for table %s", reserv_data.table_id)
         start_time = reserv_data.reservation_time
         end_time = start_time + timedelta(minutes=reserv_data.duration_minutes)
-        reservs = await self.uow.reservations.get_list_reservs_by_table_id(reserv_data=reserv_data)
-        for reserv in reservs:
-            if reserv.reservation_time < end_time and \
-                reserv.reservation_time + timedelta(minutes=reserv.duration_minutes) > start_time:
-                logger.warning(f" Conflict detected for reservation time {reserv_data.reservation_time}")
-                return True
+        is_conflict = None
+        started = perf_counter()
+        if self.index is not None and version is not None and self.index.covers(start_time):
+            is_conflict = self.index.check(reserv_data.table_id, version, start_time, end_time)
+            if is_conflict is None:
+                await self.index.reload_table(self.uow, reserv_data.table_id, version)
+                is_conflict = self.index.check(reserv_data.table_id, version, start_time, end_time)
+        if is_conflict is None:
+            is_conflict = await self.uow.reservations.is_check_conflict(reserv_data=reserv_data)
+            source = "database"
+        else:
+            source = "index"
+        CONFLICT_CHECK_DURATION.observe(perf_counter() - started, source=source)
+        get_current_span().set_attributes({"source": source, "conflict": is_conflict})
+        if is_conflict:
+            logger.warning(" Conflict detected for reservation time %s", reserv_data.reservation_time)
+            return True
         logger.info(" No conflict detected.")
         return False
 
 
 
+    @traced()
     async def add_reserv_for_table(self,reserv_data: ReservationCreate) -> ReservationResponse:
         """Add reservation table"""
-        logger.info(f" Adding reservation for table {reserv_data.table_id} by {reserv_data.customer_name}")
+        logger.info(" Adding reservation for table %s by %s", reserv_data.table_id, reserv_data.customer_name)
+        get_current_span().set_attribute("table_id", reserv_data.table_id)
+        end_time = reserv_data.reservation_time + timedelta(minutes=reserv_data.duration_minutes)
+
         async with self.uow:
 
-            table = await self.uow.tables.get_by_identifier(reserv_data.table_id)
-            if table is None:
-                logger.warning(f" Table with ID {reserv_data.table_id} not found.")
+            if self.index is not None and self.index.is_fresh_conflict(reserv_data.table_id, reserv_data.reservation_time, end_time):
+                # refuse without taking the lock, once the entry is known to be current
+                version = await self.uow.tables.get_reservations_version(reserv_data.table_id)
+                if self.index.check(reserv_data.table_id, version, reserv_data.reservation_time, end_time):
+                    logger.error(" Reservation conflict for table %s (interval index).", reserv_data.table_id)
+                    raise TableAlreadyReserv("Conflict with existing reservation")
+
+            await self.uow.lock_tables(reserv_data.table_id)
+            version = await self.uow.tables.get_reservations_version(reserv_data.table_id, for_update=True)
+            if version is None:
+                logger.warning(" Table with ID %s not found.", reserv_data.table_id)
                 raise TableNotFound("Table not found")
             
-            is_conflict = await self._is_check_conflict(reserv_data=reserv_data)
+            is_conflict = await self._is_check_conflict(reserv_data=reserv_data, version=version)
             if is_conflict:
-                logger.error(f" Reservation conflict for table {reserv_data.table_id}.")
+                logger.error(" Reservation conflict for table %s.", reserv_data.table_id)
                 raise TableAlreadyReserv("Conflict with existing reservation")
             
-            reserv_table = Reservations(
-                table_id=reserv_data.table_id,
-                customer_name=reserv_data.customer_name,
-                reservation_time=reserv_data.reservation_time,
-                duration_minutes=reserv_data.duration_minutes,
-                )
-            
-            res = await self.uow.reservations.add(reserv_table)
+            try:
+                res = await self.uow.reservations.insert_returning(reserv_data.model_dump())
+            except IntegrityError as e:
+                # Postgres exclusion constraint caught an overlap committed concurrently
+                if OVERLAP_CONSTRAINT in str(e.orig):
+                    logger.error(" Reservation conflict for table %s.", reserv_data.table_id)
+                    raise TableAlreadyReserv("Conflict with existing reservation") from e
+                raise
+            version = await self.uow.tables.bump_reservations_version(reserv_data.table_id)
             await self.uow.commit()
-            logger.info(f" Reservation added for table {reserv_data.table_id}")
+            if self.index is not None:
+                self.index.add(res.table_id, version, res.id, res.reservation_time, res.end_time)
+            logger.info(" Reservation added for table %s", reserv_data.table_id)
             return ReservationResponse.model_validate(res.to_dict())
         
+    @traced()
+    async def add_reservs_bulk(self, reservs_data: list[ReservationCreate]) -> list[ReservationResponse]:
+        """Add several reservations in one transaction
+
+        The batch is validated as a whole: table existence and existing
+        reservations are loaded with one query each, overlaps inside the batch
+        are found by sorting, and all rows go out in a single INSERT ... RETURNING.
+        Nothing is inserted if any reservation fails.
+        """
+        logger.info(" Adding %s reservations in bulk", len(reservs_data))
+        get_current_span().set_attribute("reservations", len(reservs_data))
+        if not reservs_data:
+            return []
+        if len(reservs_data) > settings.BULK_MAX_SIZE:
+            raise BatchTooLarge(f"Bulk size exceeds {settings.BULK_MAX_SIZE} reservations")
+
+        intervals = sorted(
+            (
+                (reserv.table_id, as_utc_naive(reserv.reservation_time),
+                 as_utc_naive(reserv.reservation_time + timedelta(minutes=reserv.duration_minutes)), position)
+                for position, reserv in enumerate(reservs_data)
+            ),
+        )
+        conflicts = set()
+        latest = None  # interval of the same table ending last so far
+        for cur in intervals:
+            if latest is not None and latest[0] == cur[0] and cur[1] < latest[2]:
+                conflicts.update((latest[3], cur[3]))
+            if latest is None or latest[0] != cur[0] or cur[2] > latest[2]:
+                latest = cur
+        if conflicts:
+            logger.error(" Reservations %s of the batch overlap each other.", sorted(conflicts))
+            raise TableAlreadyReserv(f"Conflict between reservations {sorted(conflicts)} of the batch")
+
+        table_ids = sorted({reserv.table_id for reserv in reservs_data})
+        async with self.uow:
+            await self.uow.lock_tables(*table_ids)
+            versions = await self.uow.tables.list_reservations_versions(table_ids, for_update=True)
+            missing = [table_id for table_id in table_ids if table_id not in versions]
+            if missing:
+                logger.warning(" Tables with ID %s not found.", missing)
+                raise TableNotFound(f"Tables {missing} not found")
+
+            existing = await self.uow.reservations.list_intervals(
+                since=min(start for _, start, _, _ in intervals).replace(tzinfo=UTC),
+                until=max(end for _, _, end, _ in intervals).replace(tzinfo=UTC),
+                table_ids=table_ids,
+            )
+            # both lists are ordered by (table_id, start), merge them in one pass
+            i = 0
+            for _, table_id, start, end in existing:
+                start, end = as_utc_naive(start), as_utc_naive(end)
+                while i < len(intervals) and (intervals[i][0], intervals[i][2]) <= (table_id, start):
+                    i += 1
+                j = i
+                while j < len(intervals) and intervals[j][0] == table_id and intervals[j][1] < end:
+                    conflicts.add(intervals[j][3])
+                    j += 1
+            if conflicts:
+                logger.error(" Reservations %s of the batch conflict with existing ones.", sorted(conflicts))
+                raise TableAlreadyReserv(f"Conflict with existing reservation for reservations {sorted(conflicts)} of the batch")
+
+            try:
+                reservs = await self.uow.reservations.add_many([reserv.model_dump() for reserv in reservs_data])
+            except IntegrityError as e:
+                if OVERLAP_CONSTRAINT in str(e.orig):
+                    raise TableAlreadyReserv("Conflict with existing reservation") from e
+                raise
+            versions = await self.uow.tables.bump_reservations_versions(table_ids)
+            await self.uow.commit()
+
+        if self.index is not None:
+            by_table: dict[int, list[tuple]] = {}
+            for reserv in reservs:
+                by_table.setdefault(reserv.table_id, []).append((reserv.id, reserv.table_id, reserv.reservation_time, reserv.end_time))
+            for table_id, rows in by_table.items():
+                self.index.extend(table_id, versions[table_id], rows)
+        logger.info(" Added %s reservations in bulk", len(reservs))
+        return [ReservationResponse.model_validate(reserv.to_dict()) for reserv in reservs]
+
+    @traced()
     async def delete_reserv(self,table_data: ReservationGet) -> ReservationResponse:
         """Delete reservation from table"""
-        logger.info(f" Deleting reservation with ID {table_data.id}")
+        logger.info(" Deleting reservation with ID %s", table_data.id)
         async with self.uow:
 
-            reserv = await self.uow.reservations.get_by_identifier(table_data.id)
+            reserv = await self.uow.reservations.delete_returning(table_data.id)
             if reserv is None:
-                logger.warning(f" Reservation with ID {table_data.id} not found.")
+                logger.warning(" Reservation with ID %s not found.", table_data.id)
                 raise TableNotFound("Reservation not found")
 
-            await self.uow.reservations.delete(table_data.id)
+            version = await self.uow.tables.bump_reservations_version(reserv.table_id)
             await self.uow.commit()
-            logger.info(f" Reservation with ID {table_data.id} deleted successfully.")
+            if self.index is not None:
+                self.index.remove(reserv.table_id, version, reserv.id)
+            logger.info(" Reservation with ID %s deleted successfully.", table_data.id)
             return ReservationResponse.model_validate(reserv.to_dict())
     
+    @traced()
+    async def get_free_slots(self, table_data: TableGet, start: datetime, end: datetime, duration_minutes: int | None = None) -> list[FreeSlot]:
+        """Get free windows of a table within [start, end)
+
+        Loads only the reservations overlapping the window, ordered by start,
+        and sweeps them once.
+
+        :param duration_minutes: int | None minimal length of returned windows
+        """
+        logger.info(" Retrieving free slots for table %s from %s to %s", table_data.id, start, end)
+        start, end = as_utc_naive(start), as_utc_naive(end)
+        if start >= end:
+            raise ValueError("Window start must be before its end")
+        min_length = timedelta(minutes=duration_minutes or 0)
+        async with self.uow.for_read() as uow:
+            version = await uow.tables.get_reservations_version(table_data.id)
+            if version is None:
+                logger.warning(" Table with ID %s not found.", table_data.id)
+                raise TableNotFound("Table not found")
+            intervals = await uow.reservations.list_intervals(
+                since=start.replace(tzinfo=UTC), table_id=table_data.id, until=end.replace(tzinfo=UTC),
+            )
+
+        slots = []
+        cursor = start
+        for _, _, reserv_start, reserv_end in intervals:
+            reserv_start, reserv_end = as_utc_naive(reserv_start), as_utc_naive(reserv_end)
+            if reserv_start > cursor and min(reserv_start, end) - cursor >= min_length:
+                slots.append(FreeSlot(start=cursor.replace(tzinfo=UTC), end=min(reserv_start, end).replace(tzinfo=UTC)))
+            cursor = max(cursor, reserv_end)
+        if cursor < end and end - cursor >= min_length:
+            slots.append(FreeSlot(start=cursor.replace(tzinfo=UTC), end=end.replace(tzinfo=UTC)))
+        logger.info(" Found %s free slots for table %s.", len(slots), table_data.id)
+        return slots
+
+    async def _get_reserv_page_rows(
+        self,
+        table_id: int | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        cursor: str | None = None,
+        limit: int | None = None,
+    ) -> tuple[list[dict], str | None]:
+        logger.info(" Retrieving reservations page: table_id=%s, from=%s, to=%s", table_id, start, end)
+        limit = min(limit or settings.PAGE_SIZE, settings.MAX_PAGE_SIZE)
+        after = decode_cursor(cursor, datetime, int) if cursor else None
+        async with self.uow.for_read() as uow:
+            # one extra row tells whether there is a next page
+            rows = await uow.reservations.list_page(limit + 1, table_id=table_id, start=start, end=end, after=after)
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["reservation_time"], rows[-1]["id"])
+        logger.info(" Retrieved %s reservations.", len(rows))
+        return rows, next_cursor
+
+    @traced()
+    async def get_reserv_page(
+        self,
+        table_id: int | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        cursor: str | None = None,
+        limit: int | None = None,
+    ) -> tuple[list[ReservationResponse], str | None]:
+        """Get one page of reservations
+
+        :param cursor: str | None cursor returned with the previous page
+        :param limit: int | None page size, capped by settings.MAX_PAGE_SIZE
+        :return: tuple[list[ReservationResponse], str | None] page and cursor of the next one, None on the last page
+        """
+        rows, next_cursor = await self._get_reserv_page_rows(table_id, start, end, cursor, limit)
+        return [ReservationResponse.model_validate(row) for row in rows], next_cursor
+
+    @traced()
+    async def get_reserv_page_json(
+        self,
+        table_id: int | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        cursor: str | None = None,
+        limit: int | None = None,
+    ) -> tuple[bytes, str | None]:
+        """Same as get_reserv_page, serialized straight from the rows to JSON bytes
+
+        Rows come from the database and are trusted, so no response models are built.
+        """
+        rows, next_cursor = await self._get_reserv_page_rows(table_id, start, end, cursor, limit)
+        return reservation_rows.dump_json(rows), next_cursor
+
+    @traced()
+    async def export_reserv(
+        self,
+        table_id: int | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        batch_size: int = 1000,
+    ) -> AsyncIterator[list[dict]]:
+        """Stream reservations in batches of plain dicts, with constant memory"""
+        logger.info(" Exporting reservations: table_id=%s, from=%s, to=%s", table_id, start, end)
+        count = 0
+        async with self.uow.for_read() as uow:
+            async for rows in uow.reservations.stream_rows(table_id=table_id, start=start, end=end, batch_size=batch_size):
+                count += len(rows)
+                yield rows
+        logger.info(" Exported %s reservations.", count)
+
+    @traced()
     async def get_all_reserv(self) -> list[ReservationResponse]:
         """Get all reservations"""
         logger.info(" Retrieving all reservations")
-        async with self.uow:
-            reservs = await self.uow.reservations.list()
-        logger.info(f" Retrieved {len(reservs)} reservations.")
+        async with self.uow.for_read() as uow:
+            reservs = await uow.reservations.list()
+        logger.info(" Retrieved %s reservations.", len(reservs))
         return [ReservationResponse.model_validate(reserv.to_dict()) for reserv in reservs]
     
-    async def delete_all_reserv(self) -> None:
-        """Delete all reservations"""
-        logger.info(" Deleting all reservations")
+    @traced()
+    async def delete_reservs(
+        self,
+        table_id: int | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        ended_before: datetime | None = None,
+    ) -> list[int]:
+        """Delete reservations matching the filters with one statement
+
+        Without filters every reservation is deleted. Only the tables that
+        have matching reservations are locked (in id order, like bookings)
+        and get their reservations version bumped; reservations of other
+        tables booked meanwhile are left alone.
+
+        :param table_id: int | None only reservations of this table
+        :param start: datetime | None only reservations starting at or after this time
+        :param end: datetime | None only reservations starting before this time
+        :param ended_before: datetime | None only reservations ending at or before this time
+        :return: list[int] ids of the deleted reservations
+        """
+        logger.info(" Deleting reservations: table_id=%s, from=%s, to=%s, ended_before=%s", table_id, start, end, ended_before)
+        versions: dict[int, int] = {}
+        ids: list[int] = []
         async with self.uow:
-            reservs = await self.uow.reservations.list()
-            for reserv in reservs:
-                await self.uow.reservations.delete(reserv.id)
+            table_ids = await self.uow.reservations.list_range_table_ids(table_id, start, end, ended_before)
+            if table_ids:
+                await self.uow.lock_tables(*table_ids)
+                await self.uow.tables.list_reservations_versions(table_ids, for_update=True)
+                deleted = await self.uow.reservations.delete_range(table_id, start, end, ended_before, table_ids=table_ids)
+                ids = [id for id, _ in deleted]
+                affected = sorted({deleted_table_id for _, deleted_table_id in deleted})
+                if affected:
+                    versions = await self.uow.tables.bump_reservations_versions(affected)
             await self.uow.commit()
-        logger.info(" All reservations deleted successfully.")
+        if self.index is not None:
+            # affected tables are reloaded by their next check
+            for version_table_id in versions:
+                self.index.drop_table(version_table_id)
+        logger.info(" Deleted %s reservations.", len(ids))
+        return ids
+
+    @traced()
+    async def delete_all_reserv(self) -> None:
+        """Delete all reservations"""
+        await self.delete_reservs()
 
 
@@ -1,92 +1,324 @@
+import logging
 from app.schema import (
     TableCreate,
     TableGet,
     TableUpdate,
     TableBase,
     TableResponse,
+    TablePatch,
     ReservationCreate,
     ReservationGet,
     ReservationUpdate,
     ReservationBase,
     ReservationResponse,
+    table_row,
+    table_rows,
 )
 from app.models import Tables, Reservations
 from app.utils.patterns import IUnitOfWork, UnitOfWork
 from app.services.expt import TableNotFound, TableAlreadyReserv
-from app.core import logger
+from app.services.IntervalIndex import ReservationIntervalIndex
+from app.utils.cursor import encode_cursor, decode_cursor
+from datetime import datetime
+from typing import AsyncIterable
+from pydantic import ValidationError
+from app.core import settings
+from app.core.tracing import traced
+
+logger = logging.getLogger(__name__)
 
 
 class TableService:
-    """Service for working with data of Tables and Reservations"""
-    def __init__(self, uow: UnitOfWork):
+    """Service for working with data of Tables and Reservations
+
+    When an interval index is given, deleted tables are dropped from it.
+    """
+    def __init__(self, uow: UnitOfWork, index: ReservationIntervalIndex | None = None):
         self.uow = uow
+        self.index = index
 
+    @traced()
     async def create_table(self, table_data: TableCreate) -> TableResponse:
         """Create new table"""
-        logger.info(f" Creating new table: {table_data.name}")
+        logger.info(" Creating new table: %s", table_data.name)
         async with self.uow:
-            new_table = Tables(
-                name=table_data.name,
-                seats=table_data.seats,
-                location=table_data.location,
-            )
-            await self.uow.tables.add(new_table)
+            new_table = await self.uow.tables.insert_returning(table_data.model_dump())
             await self.uow.commit()
-            logger.info(f" Table created successfully: {new_table.id} - {new_table.name}")
+            logger.info(" Table created successfully: %s - %s", new_table.id, new_table.name)
         return TableResponse.model_validate(new_table.to_dict())
 
-    async def update_table(self,table_data: TableUpdate) -> TableResponse:
-        """Update existing table"""
-        logger.info(f" Updating table with ID {table_data.id}")
+    async def _update_table(self, id: int, values: dict) -> TableResponse:
+        logger.info(" Updating table with ID %s", id)
         async with self.uow:
-            table = await self.uow.tables.get_by_identifier(table_data.id)
+            if values:
+                table = await self.uow.tables.update_returning(id, values)
+            else:
+                table = await self.uow.tables.get_by_identifier(id)
             if table is None:
-                logger.warning(f" Table with ID {table_data.id} not found.")
+                logger.warning(" Table with ID %s not found.", id)
                 raise TableNotFound("Table not found")
-            
-            for field, value in table_data.model_dump(exclude_unset=True).items():
-                setattr(table, field, value)
-
-            await self.uow.tables.update(table)
             await self.uow.commit()
-            logger.info(f" Table updated successfully: {table.id} - {table.name}")
+            logger.info(" Table updated successfully: %s - %s", table.id, table.name)
         return TableResponse.model_validate(table.to_dict())
-        
-    async def get_table(self, table_data: TableGet) -> TableResponse:
-        """Get table by ID"""
-        logger.info(f" Retrieving table with ID {table_data.id}")
+
+    @traced()
+    async def update_table(self,table_data: TableUpdate) -> TableResponse:
+        """Update existing table"""
+        return await self._update_table(table_data.id, table_data.model_dump(exclude_unset=True, exclude={"id"}))
+
+    @traced()
+    async def patch_table(self, id: int, table_data: TablePatch) -> TableResponse:
+        """Update only the fields of a table that are set"""
+        return await self._update_table(id, table_data.model_dump(exclude_unset=True))
+
+    @traced()
+    async def import_tables(self, rows: AsyncIterable[dict]) -> int:
+        """Create tables from a stream of rows in one transaction
+
+        Each row is validated as it arrives and rows are written in chunks of
+        IMPORT_CHUNK_SIZE, so memory use does not grow with the size of the
+        import. Nothing is imported if any row is invalid.
+
+        :param rows: AsyncIterable[dict] fields of TableCreate for each table
+        :return: int number of created tables
+        :raises ValueError: if a row is invalid
+        """
+        logger.info(" Importing tables")
+        imported = 0
+        chunk = []
         async with self.uow:
-            table = await self.uow.tables.get_by_identifier(table_data.id)
-            if table is None:
-                logger.warning(f" Table with ID {table_data.id} not found.")
+            async for row in rows:
+                try:
+                    chunk.append(TableCreate.model_validate(row).model_dump())
+                except ValidationError as e:
+                    raise ValueError(f"Row {imported + len(chunk) + 1}: {e.errors(include_url=False, include_context=False)}") from e
+                if len(chunk) >= settings.IMPORT_CHUNK_SIZE:
+                    imported += await self.uow.tables.insert_many(chunk)
+                    chunk = []
+            imported += await self.uow.tables.insert_many(chunk)
+            await self.uow.commit()
+        logger.info(" Imported %s tables", imported)
+        return imported
+        
+    async def _fill_reservations(
+        self,
+        uow: UnitOfWork,
+        rows: list[dict],
+        include_reservations: bool = False,
+        start: datetime | None = None,
+        end: datetime | None = None,
+    ) -> list[dict]:
+        """Set reserved_tables of table rows, loading reservations of all tables with one windowed query"""
+        if not include_reservations:
+            for row in rows:
+                row["reserved_tables"] = None
+            return rows
+        reservs = await uow.reservations.list_for_tables([row["id"] for row in rows], since=start, until=end)
+        by_table: dict[int, list[dict]] = {row["id"]: [] for row in rows}
+        for reserv in reservs:
+            by_table[reserv["table_id"]].append(reserv)
+        for row in rows:
+            row["reserved_tables"] = by_table[row["id"]]
+        return rows
+
+    async def _get_table_row(
+        self,
+        table_data: TableGet,
+        include_reservations: bool = False,
+        start: datetime | None = None,
+        end: datetime | None = None,
+    ) -> dict:
+        logger.info(" Retrieving table with ID %s", table_data.id)
+        async with self.uow.for_read() as uow:
+            row = await uow.tables.get_row(table_data.id)
+            if row is None:
+                logger.warning(" Table with ID %s not found.", table_data.id)
                 raise TableNotFound("Table not found")
-            logger.info(f" Table retrieved: {table.id} - {table.name}")
-        return TableResponse.model_validate(table.to_dict())
+            logger.info(" Table retrieved: %s - %s", row['id'], row['name'])
+            await self._fill_reservations(uow, [row], include_reservations, start, end)
+        return row
+
+    @traced()
+    async def get_table(
+        self,
+        table_data: TableGet,
+        include_reservations: bool = False,
+        start: datetime | None = None,
+        end: datetime | None = None,
+    ) -> TableResponse:
+        """Get table by ID
 
+        :param include_reservations: bool also return reservations overlapping [start, end)
+        """
+        row = await self._get_table_row(table_data, include_reservations, start, end)
+        return TableResponse.model_validate(row)
+
+    @traced()
+    async def get_table_json(
+        self,
+        table_data: TableGet,
+        include_reservations: bool = False,
+        start: datetime | None = None,
+        end: datetime | None = None,
+    ) -> bytes:
+        """Same as get_table, serialized straight from the row to JSON bytes"""
+        row = await self._get_table_row(table_data, include_reservations, start, end)
+        return table_row.dump_json(row)
+
+    async def _get_table_rows(
+        self,
+        ids: list[int],
+        include_reservations: bool = False,
+        start: datetime | None = None,
+        end: datetime | None = None,
+    ) -> list[dict]:
+        logger.info(" Retrieving tables with IDs %s", ids)
+        async with self.uow.for_read() as uow:
+            rows = await uow.tables.get_rows(ids)
+            await self._fill_reservations(uow, rows, include_reservations, start, end)
+        logger.info(" Retrieved %s tables.", len(rows))
+        return rows
+
+    @traced()
+    async def get_tables(
+        self,
+        ids: list[int],
+        include_reservations: bool = False,
+        start: datetime | None = None,
+        end: datetime | None = None,
+    ) -> list[TableResponse]:
+        """Get several tables by ID with one query
+
+        :param ids: list[int] table ids, tables not found are left out
+        :param include_reservations: bool also return reservations overlapping [start, end)
+        :return: list[TableResponse] tables in the order of ids
+        """
+        rows = await self._get_table_rows(ids, include_reservations, start, end)
+        return [TableResponse.model_validate(row) for row in rows]
+
+    @traced()
+    async def get_tables_json(
+        self,
+        ids: list[int],
+        include_reservations: bool = False,
+        start: datetime | None = None,
+        end: datetime | None = None,
+    ) -> bytes:
+        """Same as get_tables, serialized straight from the rows to JSON bytes"""
+        rows = await self._get_table_rows(ids, include_reservations, start, end)
+        return table_rows.dump_json(rows)
+
+    @traced()
     async def get_all_tables(self) -> list[TableResponse]:
         """Get all tables"""
         logger.info(" Retrieving all tables")
-        async with self.uow:
-            tables = await self.uow.tables.list()
-        logger.info(f" Retrieved {len(tables)} tables.")
+        async with self.uow.for_read() as uow:
+            tables = await uow.tables.list()
+        logger.info(" Retrieved %s tables.", len(tables))
         return [TableResponse.model_validate(table.to_dict()) for table in tables]
     
+    async def _get_table_page_rows(
+        self,
+        location: str | None = None,
+        min_seats: int | None = None,
+        cursor: str | None = None,
+        limit: int | None = None,
+        include_reservations: bool = False,
+        start: datetime | None = None,
+        end: datetime | None = None,
+    ) -> tuple[list[dict], str | None]:
+        logger.info(" Retrieving tables page: location=%s, min_seats=%s", location, min_seats)
+        limit = min(limit or settings.PAGE_SIZE, settings.MAX_PAGE_SIZE)
+        after = decode_cursor(cursor, int)[0] if cursor else None
+        async with self.uow.for_read() as uow:
+            # one extra row tells whether there is a next page
+            rows = await uow.tables.list_page(limit + 1, location=location, min_seats=min_seats, after=after)
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encode_cursor(rows[-1]["id"])
+            await self._fill_reservations(uow, rows, include_reservations, start, end)
+        logger.info(" Retrieved %s tables.", len(rows))
+        return rows, next_cursor
+
+    @traced()
+    async def get_table_page(
+        self,
+        location: str | None = None,
+        min_seats: int | None = None,
+        cursor: str | None = None,
+        limit: int | None = None,
+        include_reservations: bool = False,
+        start: datetime | None = None,
+        end: datetime | None = None,
+    ) -> tuple[list[TableResponse], str | None]:
+        """Get one page of tables
+
+        :param cursor: str | None cursor returned with the previous page
+        :param limit: int | None page size, capped by settings.MAX_PAGE_SIZE
+        :param include_reservations: bool also return reservations overlapping [start, end),
+            loaded for the whole page with one query
+        :return: tuple[list[TableResponse], str | None] page and cursor of the next one, None on the last page
+        """
+        rows, next_cursor = await self._get_table_page_rows(
+            location, min_seats, cursor, limit, include_reservations, start, end
+        )
+        return [TableResponse.model_validate(row) for row in rows], next_cursor
+
+    @traced()
+    async def get_table_page_json(
+        self,
+        location: str | None = None,
+        min_seats: int | None = None,
+        cursor: str | None = None,
+        limit: int | None = None,
+        include_reservations: bool = False,
+        start: datetime | None = None,
+        end: datetime | None = None,
+    ) -> tuple[bytes, str | None]:
+        """Same as get_table_page, serialized straight from the rows to JSON bytes
+
+        Rows come from the database and are trusted, so no response models are built.
+        """
+        rows, next_cursor = await self._get_table_page_rows(
+            location, min_seats, cursor, limit, include_reservations, start, end
+        )
+        return table_rows.dump_json(rows), next_cursor
+
+    @traced()
     async def delete_table(self, table_data: TableGet) -> None:
         """Delete table by ID"""
-        logger.info(f" Deleting table with ID {table_data.id}")
+        logger.info(" Deleting table with ID %s", table_data.id)
         async with self.uow:
             await self.uow.tables.delete(table_data.id)
             await self.uow.commit()
-            logger.info(f" Table with ID {table_data.id} deleted successfully.")
+            logger.info(" Table with ID %s deleted successfully.", table_data.id)
+        if self.index is not None:
+            self.index.drop_table(table_data.id)
 
-    async def delete_all_tables(self) -> None:
-        logger.info(" Deleting all tables")
-        """Delete all tables"""
+    @traced()
+    async def delete_tables(self, location: str | None = None) -> list[int]:
+        """Delete tables matching the filters, and their reservations, with one statement
+
+        Without filters every table is deleted.
+
+        :param location: str | None only tables at this location
+        :return: list[int] ids of the deleted tables
+        """
+        logger.info(" Deleting tables: location=%s", location)
+        filters = {"location": location} if location is not None else {}
         async with self.uow:
-            tabls = await self.uow.tables.list()
-            for t in tabls:
-                await self.uow.reservations.delete(t.id)
+            ids = await self.uow.tables.delete_where(**filters)
             await self.uow.commit()
-            logger.info(f" Deleted all tables and related reservations.")
+        if self.index is not None:
+            for id in ids:
+                self.index.drop_table(id)
+        logger.info(" Deleted %s tables and related reservations.", len(ids))
+        return ids
+
+    @traced()
+    async def delete_all_tables(self) -> None:
+        """Delete all tables"""
+        await self.delete_tables()
 
 
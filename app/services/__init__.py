@@ -3,10 +3,14 @@ __all__ = [
     "ReservTableService",
     "TableNotFound",
     "TableAlreadyReserv",
+    "BatchTooLarge",
+    "ReservationIntervalIndex",
+    "reservation_index",
 ]
 
 from .ReservTableService import ReservTableService
 from .TableService import TableService
-from .expt import TableNotFound, TableAlreadyReserv
+from .expt import TableNotFound, TableAlreadyReserv, BatchTooLarge
+from .IntervalIndex import ReservationIntervalIndex, reservation_index
 
 
@@ -10,3 +10,7 @@ class TableNotFound(ServiceException):
 class TableAlreadyReserv(ServiceException):
     '''Tavble already reserved'''
     pass
+
+class BatchTooLarge(ServiceException):
+    '''Batch exceeds the configured maximum size'''
+    pass
@@ -0,0 +1,12 @@
+from datetime import datetime, UTC
+
+
+def as_utc_naive(value: datetime) -> datetime:
+    """Normalize datetime to naive UTC
+
+    Postgres returns aware timestamps while SQLite returns naive ones, naive
+    values are treated as UTC so both can be compared.
+    """
+    if value.tzinfo is not None:
+        return value.astimezone(UTC).replace(tzinfo=None)
+    return value
@@ -1,12 +1,14 @@
 __all__ = [
     "BaseSqlAsyncRepository",
+    "BatchLoader",
     "TableRepository",
     "ReservationRepository",
     "IUnitOfWork",
     "UnitOfWork",
+    "ReplicaUnitOfWork",
 ]
 
 
-from .rep import TableRepository, ReservationRepository, BaseSqlAsyncRepository
-from .uow import UnitOfWork, IUnitOfWork
+from .rep import TableRepository, ReservationRepository, BaseSqlAsyncRepository, BatchLoader
+from .uow import UnitOfWork, IUnitOfWork, ReplicaUnitOfWork
 
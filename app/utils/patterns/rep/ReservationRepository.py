@@ -1,48 +1,286 @@
+import logging
 from .repository import BaseSqlAsyncRepository
+from app.core.cache import CacheBackend, cache as default_cache
+from typing import Optional
 from app.models import Reservations
-from app.schema import ReservationCreate, ReservationUpdate, ReservationBase, ReservationResponse
+from app.models.Reservations import reservation_end
+from app.schema import ReservationCreate, ReservationUpdate, ReservationResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, or_, and_
+from sqlalchemy import select, insert, delete, func, or_, and_, tuple_
 from datetime import datetime, timedelta
-from app.core import logger
+from typing import AsyncIterator
+from app.core.tracing import traced
+
+logger = logging.getLogger(__name__)
 
 class ReservationRepository(BaseSqlAsyncRepository[Reservations]):
-    def __init__(self, session: AsyncSession):
-        super().__init__(session,Reservations)
+    _row_columns = (
+        Reservations.id,
+        Reservations.table_id,
+        Reservations.customer_name,
+        Reservations.reservation_time,
+        Reservations.duration_minutes,
+    )
+
+    def __init__(self, session: AsyncSession, cache: Optional[CacheBackend] = default_cache):
+        super().__init__(session,Reservations,cache)
         logger.debug("Initialized Reservation repository")
 
 
-    async def get_list_reservs_by_table_id(self, reserv_data:ReservationCreate) -> list[ReservationBase]:
-        """get list reservation by table id
-        
-        :param reserv_data: ReservationCreate
-        :return: list[ReservationBase]
+    @traced()
+    async def list_intervals(
+        self,
+        since: datetime,
+        table_id: int | None = None,
+        until: datetime | None = None,
+        table_ids: list[int] | None = None,
+    ) -> list[tuple[int, int, datetime, datetime]]:
+        """get reservation intervals overlapping [since, until)
+
+        :param since: datetime lower bound for end_time
+        :param table_id: int | None restrict to one table
+        :param until: datetime | None upper bound for reservation_time
+        :param table_ids: list[int] | None restrict to several tables
+        :return: list[tuple[int, int, datetime, datetime]] (id, table_id, start, end) ordered by table and start
+        """
+        logger.info("List reservation intervals from %s to %s for table id: %s", since, until, table_id or table_ids)
+        stmt = select(
+            Reservations.id,
+            Reservations.table_id,
+            Reservations.reservation_time,
+            Reservations.end_time,
+        ).where(Reservations.end_time > since)
+        if table_id is not None:
+            stmt = stmt.where(Reservations.table_id == table_id)
+        if table_ids is not None:
+            stmt = stmt.where(Reservations.table_id.in_(table_ids))
+        if until is not None:
+            stmt = stmt.where(Reservations.reservation_time < until)
+        stmt = stmt.order_by(Reservations.table_id, Reservations.reservation_time)
+        result = await self._session.execute(stmt)
+        return [tuple(row) for row in result.all()]
+
+    @traced()
+    async def list_for_tables(
+        self,
+        table_ids: list[int],
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> list[dict]:
+        """get reservations of several tables overlapping [since, until) with one query
+
+        :param table_ids: list[int] table ids
+        :param since: datetime | None lower bound for end_time
+        :param until: datetime | None upper bound for reservation_time
+        :return: list[dict] row columns ordered by table and start
+        """
+        logger.info("List reservations of tables %s from %s to %s", table_ids, since, until)
+        if not table_ids:
+            return []
+        stmt = select(*self._row_columns).where(Reservations.table_id.in_(table_ids))
+        if since is not None:
+            stmt = stmt.where(Reservations.end_time > since)
+        if until is not None:
+            stmt = stmt.where(Reservations.reservation_time < until)
+        stmt = stmt.order_by(Reservations.table_id, Reservations.reservation_time)
+        result = await self._session.execute(stmt)
+        return [dict(row) for row in result.mappings()]
+
+    @traced()
+    async def list_page(
+        self,
+        limit: int,
+        table_id: int | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        after: tuple[datetime, int] | None = None,
+    ) -> list[dict]:
+        """get one page of reservations ordered by (reservation_time, id)
+
+        Uses keyset pagination served by the (reservation_time, id) index, so
+        the cost of a page does not depend on how deep it is.
+
+        :param limit: int maximum number of reservations
+        :param table_id: int | None restrict to one table
+        :param start: datetime | None reservations starting at or after
+        :param end: datetime | None reservations starting before
+        :param after: tuple[datetime, int] | None (reservation_time, id) of the last row of the previous page
+        :return: list[dict] row columns of the reservations
         """
-        logger.info(f"Get list reservation by table id: {reserv_data.table_id}")
-        stmt = select(Reservations).where(Reservations.table_id == reserv_data.table_id)
+        logger.info("List reservations page: table_id=%s, from=%s, to=%s, after=%s, limit=%s", table_id, start, end, after, limit)
+        stmt = select(*self._row_columns)
+        if table_id is not None:
+            stmt = stmt.where(Reservations.table_id == table_id)
+        if start is not None:
+            stmt = stmt.where(Reservations.reservation_time >= start)
+        if end is not None:
+            stmt = stmt.where(Reservations.reservation_time < end)
+        if after is not None:
+            stmt = stmt.where(tuple_(Reservations.reservation_time, Reservations.id) > tuple(after))
+        stmt = stmt.order_by(Reservations.reservation_time, Reservations.id).limit(limit)
         result = await self._session.execute(stmt)
-        reservations =  [ReservationBase.model_validate(i.to_dict()) for i in result.scalars().all()]
-        logger.info(f"Found {len(reservations)} reservations for table_id={reserv_data.table_id}")
-        return reservations
-
-    # async def is_check_conflict(self, reserv_data:ReservationCreate) -> bool:
-    #     """Check if reservation time is not conflict
-        
-    #     :param reserv_data: ReservationCreate
-    #     :return: bool False if reservation time is not conflict, True otherwise
-    #     """
-    #     start_time = reserv_data.reservation_time
-    #     end_time = start_time + timedelta(minutes=reserv_data.duration_minutes)
-        
-    #     stmt = select(Reservations).where(
-    #         Reservations.table_id == reserv_data.table_id,
-    #         Reservations.reservation_time < end_time,
-    #         Reservations.reservation_time +  func.make_interval(0, 0, 0, 0, reserv_data.duration_minutes) > start_time
-    #         #Reservations.reservation_time, f'+{reserv_data.duration_minutes} minutes') > start_time
-    #     )
-    #     result = await self._session.execute(stmt)
-    #     return result.scalar_one_or_none() is not None
-        
-
-        
+        return [dict(row) for row in result.mappings()]
+
+    @traced()
+    async def stream_rows(
+        self,
+        table_id: int | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        batch_size: int = 1000,
+    ) -> AsyncIterator[list[dict]]:
+        """stream reservations as plain rows through a server-side cursor
+
+        Rows are fetched `batch_size` at a time and never turned into ORM
+        objects, so memory use does not depend on the size of the result.
 
+        :return: AsyncIterator[list[dict]] batches of column mappings ordered by (reservation_time, id)
+        """
+        logger.info("Stream reservations: table_id=%s, from=%s, to=%s", table_id, start, end)
+        stmt = select(*self._row_columns)
+        if table_id is not None:
+            stmt = stmt.where(Reservations.table_id == table_id)
+        if start is not None:
+            stmt = stmt.where(Reservations.reservation_time >= start)
+        if end is not None:
+            stmt = stmt.where(Reservations.reservation_time < end)
+        stmt = stmt.order_by(Reservations.reservation_time, Reservations.id).execution_options(yield_per=batch_size)
+        result = await self._session.stream(stmt)
+        async for partition in result.mappings().partitions():
+            yield [dict(row) for row in partition]
+
+    def _range_criteria(
+        self,
+        table_id: int | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        ended_before: datetime | None = None,
+        table_ids: list[int] | None = None,
+    ) -> list:
+        criteria = []
+        if table_id is not None:
+            criteria.append(Reservations.table_id == table_id)
+        if table_ids is not None:
+            criteria.append(Reservations.table_id.in_(table_ids))
+        if start is not None:
+            criteria.append(Reservations.reservation_time >= start)
+        if end is not None:
+            criteria.append(Reservations.reservation_time < end)
+        if ended_before is not None:
+            criteria.append(Reservations.end_time <= ended_before)
+        return criteria
+
+    @traced()
+    async def list_range_table_ids(
+        self,
+        table_id: int | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        ended_before: datetime | None = None,
+    ) -> list[int]:
+        """ids of the tables having reservations in the range, as in delete_range
+
+        :return: list[int] distinct table ids in ascending order
+        """
+        stmt = (
+            select(Reservations.table_id)
+            .where(*self._range_criteria(table_id, start, end, ended_before))
+            .distinct()
+            .order_by(Reservations.table_id)
+        )
+        result = await self._session.execute(stmt)
+        return list(result.scalars().all())
+
+    @traced()
+    async def delete_range(
+        self,
+        table_id: int | None = None,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        ended_before: datetime | None = None,
+        table_ids: list[int] | None = None,
+    ) -> list[tuple[int, int]]:
+        """delete reservations in bulk with one statement
+
+        :param table_id: int | None only reservations of this table
+        :param start: datetime | None only reservations starting at or after this time
+        :param end: datetime | None only reservations starting before this time
+        :param ended_before: datetime | None only reservations ending at or before this time
+        :param table_ids: list[int] | None only reservations of these tables
+        :return: list[tuple[int, int]] id and table id of the deleted reservations
+        """
+        logger.info("Deleting reservations: table_id=%s, from=%s, to=%s, ended_before=%s", table_id, start, end, ended_before)
+        stmt = (
+            delete(Reservations)
+            .where(*self._range_criteria(table_id, start, end, ended_before, table_ids))
+            .returning(Reservations.id, Reservations.table_id)
+        )
+        result = await self._session.execute(stmt)
+        deleted = [(id, deleted_table_id) for id, deleted_table_id in result.all()]
+        if deleted:
+            self._touch()
+        return deleted
+
+    @traced()
+    async def update_returning(self, id: int, values: dict) -> Optional[Reservations]:
+        """update a reservation with one UPDATE ... RETURNING, keeping end_time in step
+
+        When only one of reservation_time and duration_minutes changes, the
+        other is read (and locked) first to compute the new end_time.
+
+        :param id: int reservation id
+        :param values: dict column values to set
+        :return: Optional[Reservations] the updated reservation, None if not found
+        """
+        if "end_time" not in values and values.keys() & {"reservation_time", "duration_minutes"}:
+            if not values.keys() >= {"reservation_time", "duration_minutes"}:
+                stmt = (
+                    select(Reservations.reservation_time, Reservations.duration_minutes)
+                    .where(Reservations.id == id)
+                    .with_for_update()
+                )
+                current = (await self._session.execute(stmt)).mappings().one_or_none()
+                if current is None:
+                    return None
+                values = {**current, **values}
+            values = {**values, "end_time": reservation_end(values["reservation_time"], values["duration_minutes"])}
+        return await super().update_returning(id, values)
+
+    @traced()
+    async def add_many(self, values: list[dict]) -> list[Reservations]:
+        """insert reservations with a single multi-row INSERT ... RETURNING
+
+        :param values: list[dict] column values of each reservation
+        :return: list[Reservations] inserted reservations in input order
+        """
+        logger.info("Adding %s reservations", len(values))
+        if not values:
+            return []
+        self._touch()
+        stmt = insert(Reservations).returning(Reservations, sort_by_parameter_order=True)
+        result = await self._session.scalars(stmt, values)
+        return list(result.all())
+
+    @traced()
+    async def is_check_conflict(self, reserv_data:ReservationCreate) -> bool:
+        """Check if reservation time is not conflict
+
+        Asks the database only whether any reservation of the table overlaps
+        the half-open interval [start, end). The lookup is served by the
+        (table_id, end_time) / (table_id, reservation_time) indexes, so its cost
+        does not grow with the table's reservation history.
+
+        :param reserv_data: ReservationCreate
+        :return: bool False if reservation time is not conflict, True otherwise
+        """
+        logger.info("Check reservation overlap for table id: %s", reserv_data.table_id)
+        start_time = reserv_data.reservation_time
+        end_time = start_time + timedelta(minutes=reserv_data.duration_minutes)
+
+        stmt = select(Reservations.id).where(
+            Reservations.table_id == reserv_data.table_id,
+            Reservations.end_time > start_time,
+            Reservations.reservation_time < end_time,
+        ).limit(1)
+        result = await self._session.execute(stmt)
+        return result.scalar_one_or_none() is not None
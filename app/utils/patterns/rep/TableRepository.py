@@ -1,18 +1,142 @@
+import logging
 from .repository import BaseSqlAsyncRepository
-from app.models import Tables
+from app.core.cache import CacheBackend, cache as default_cache
+from typing import Optional
+from app.models import Tables, Reservations
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.core import logger
+from sqlalchemy import select, update
+from sqlalchemy.orm import raiseload
+from app.core.tracing import traced
+
+logger = logging.getLogger(__name__)
 
 
 class TableRepository(BaseSqlAsyncRepository[Tables]):
+    # reservations of a table are only loaded on request, with a bounded query
+    _default_options = (raiseload(Tables.reserved_tables),)
+    _row_columns = (Tables.id, Tables.name, Tables.seats, Tables.location)
+    # tables change rarely, while clients poll them by id
+    _row_cached = True
 
-    def __init__(self, session: AsyncSession):
-        super().__init__(session,Tables)
+    def __init__(self, session: AsyncSession, cache: Optional[CacheBackend] = default_cache):
+        super().__init__(session,Tables,cache)
         logger.debug("Initialized Table repository")
 
+    @traced()
+    async def delete(self, id: int) -> None:
+        # reservations of the table go with it (ON DELETE CASCADE)
+        self._touch(Tables.__tablename__, Reservations.__tablename__)
+        await super().delete(id)
+
+    @traced()
+    async def delete_where(self, *criteria, **filters) -> list[int]:
+        ids = await super().delete_where(*criteria, **filters)
+        if ids:
+            self._touch(Tables.__tablename__, Reservations.__tablename__)
+        return ids
+
+    @traced()
+    async def list_page(
+        self,
+        limit: int,
+        location: str | None = None,
+        min_seats: int | None = None,
+        after: int | None = None,
+    ) -> list[dict]:
+        """Get one page of tables ordered by id
+
+        :param limit: int maximum number of tables
+        :param location: str | None only tables at this location
+        :param min_seats: int | None only tables with at least this many seats
+        :param after: int | None id of the last table of the previous page
+        :return: list[dict] row columns of the tables
+        """
+        logger.info("List tables page: location=%s, min_seats=%s, after=%s, limit=%s", location, min_seats, after, limit)
+        stmt = select(*self._row_columns)
+        if location is not None:
+            stmt = stmt.where(Tables.location == location)
+        if min_seats is not None:
+            stmt = stmt.where(Tables.seats >= min_seats)
+        if after is not None:
+            stmt = stmt.where(Tables.id > after)
+        stmt = stmt.order_by(Tables.id).limit(limit)
+        result = await self._session.execute(stmt)
+        return [dict(row) for row in result.mappings()]
+
+    @traced()
+    async def get_reservations_version(self, id: int, for_update: bool = False) -> int | None:
+        """Get reservations version of the table
+
+        Reads the column directly, bypassing the identity map, so the value is
+        always the one visible to the current transaction.
+
+        :param id: table id
+        :param for_update: bool lock the table row until the end of the transaction
+        :return: int | None version, None if table not found
+        """
+        logger.info("Get reservations version for table id: %s", id)
+        stmt = select(Tables.reservations_version).where(Tables.id == id)
+        if for_update:
+            stmt = stmt.with_for_update()
+        result = await self._session.execute(stmt)
+        return result.scalar_one_or_none()
+
+    @traced()
+    async def list_reservations_versions(self, ids: list[int] | None = None, for_update: bool = False) -> dict[int, int]:
+        """Get reservations version of tables
+
+        :param ids: list[int] | None table ids, None for every table
+        :param for_update: bool lock the table rows, in id order, until the end of the transaction
+        :return: dict[int, int] table id -> version, missing tables are absent
+        """
+        logger.info("List reservations versions of tables: %s", ids)
+        stmt = select(Tables.id, Tables.reservations_version).order_by(Tables.id)
+        if ids is not None:
+            stmt = stmt.where(Tables.id.in_(ids))
+        if for_update:
+            stmt = stmt.with_for_update()
+        result = await self._session.execute(stmt)
+        return {table_id: version for table_id, version in result.all()}
+
+    @traced()
+    async def bump_reservations_version(self, id: int) -> int:
+        """Increment reservations version of the table
+
+        :param id: table id
+        :return: int new version
+        """
+        logger.info("Bump reservations version for table id: %s", id)
+        stmt = (
+            update(Tables)
+            .where(Tables.id == id)
+            .values(reservations_version=Tables.reservations_version + 1)
+            .returning(Tables.reservations_version)
+            .execution_options(synchronize_session=False)
+        )
+        result = await self._session.execute(stmt)
+        return result.scalar_one()
+
+    @traced()
+    async def bump_reservations_versions(self, ids: list[int] | None = None) -> dict[int, int]:
+        """Increment reservations version of several tables
+
+        :param ids: list[int] | None table ids, None for every table
+        :return: dict[int, int] table id -> new version
+        """
+        logger.info("Bump reservations versions for table ids: %s", ids)
+        stmt = (
+            update(Tables)
+            .values(reservations_version=Tables.reservations_version + 1)
+            .returning(Tables.id, Tables.reservations_version)
+        )
+        if ids is not None:
+            stmt = stmt.where(Tables.id.in_(ids))
+        result = await self._session.execute(stmt.execution_options(synchronize_session=False))
+        return {table_id: version for table_id, version in result.all()}
+
 #    async def get_list_reservs(self, id):
 #        """Get list of reservs for table"""
 #        table = await self.get_by_identifier(id)
 #        if table:
 #            return table.reserved_tables
-#        return None
\ No newline at end of file
+#        return None
@@ -2,10 +2,12 @@ __all__ = [
     'TableRepository',
     'ReservationRepository',
     'BaseSqlAsyncRepository',
+    'BatchLoader',
 ]
 
 
 from .TableRepository import TableRepository
 from .ReservationRepository import ReservationRepository
 from .repository import BaseSqlAsyncRepository
+from .loader import BatchLoader
 
@@ -0,0 +1,71 @@
+import logging
+import asyncio
+from typing import Any, Awaitable, Callable, Generic, Optional, Sequence, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class BatchLoader(Generic[T]):
+    """
+    Coalesce point lookups into batched ones.
+
+    Every `load` call made in the same event loop iteration, e.g. by
+    coroutines run with `asyncio.gather`, is answered by one call of the
+    batch function once the iteration is over. Ids requested twice in a
+    batch are loaded once.
+
+    A loader belongs to one session, which runs a single statement at a
+    time, so it is meant to live as long as a request.
+
+    Attributes:
+        load_many (Callable): Coroutine function loading the records of several ids.
+    """
+
+    def __init__(self, load_many: Callable[[Sequence[int]], Awaitable[Sequence[Any]]]):
+        self.load_many = load_many
+        self._pending: dict[int, asyncio.Future] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    def load(self, id: int) -> Awaitable[Optional[T]]:
+        """
+        Request the record of an id.
+
+        Args:
+            id (int): The unique identifier.
+
+        Returns:
+            Awaitable[Optional[T]]: Resolves to the record, or None if not found.
+        """
+        future = self._pending.get(id)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            if not self._pending:
+                loop.call_soon(self._dispatch)
+            future = self._pending[id] = loop.create_future()
+        return future
+
+    def _dispatch(self) -> None:
+        batch, self._pending = self._pending, {}
+        # the loop only keeps weak references to tasks
+        task = asyncio.ensure_future(self._resolve(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _resolve(self, batch: dict[int, asyncio.Future]) -> None:
+        logger.debug("Loading batch of %s ids", len(batch))
+        try:
+            records = {record.id: record for record in await self.load_many(list(batch))}
+        except asyncio.CancelledError:
+            for future in batch.values():
+                future.cancel()
+            raise
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for id, future in batch.items():
+            if not future.done():
+                future.set_result(records.get(id))
@@ -1,17 +1,98 @@
+import logging
 from abc import ABC, abstractmethod
+import operator
+from functools import lru_cache
 from typing import Generic, TypeVar, Optional, List, Sequence, Type, Any, Union
 from pydantic import BaseModel
 from sqlalchemy.sql.expression import Select
-from sqlalchemy import select,and_
+from sqlalchemy import select,and_,delete,insert,update,bindparam,tuple_,Integer
+from sqlalchemy import inspect as sa_inspect
 from sqlalchemy.orm import Session
 from sqlalchemy.ext.asyncio import AsyncSession
 #from sqlalchemy.orm.unitofwork import UOWTransaction
 from uuid import UUID
+from pydantic import TypeAdapter
+from typing_extensions import TypedDict
 from app.models.Base import Base
-from app.core import logger
+from app.core import settings
+from app.core.cache import CacheBackend, cache as default_cache, cache_namespace, cache_tags
+from .loader import BatchLoader
+from app.core.tracing import traced
+
+logger = logging.getLogger(__name__)
 
 T = TypeVar("T", bound=Base)
 
+# JSON codecs of the `_row_columns` of each repository class
+_row_adapters: dict[type, TypeAdapter] = {}
+
+
+_OPERATORS = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "gt": operator.gt,
+    "lt": operator.lt,
+    "ge": operator.ge,
+    "le": operator.le,
+    "in": lambda column, values: column.in_(values),
+    "between": lambda column, bounds: column.between(*bounds),
+    "is": lambda column, value: column.is_(value),
+    "is_not": lambda column, value: column.is_not(value),
+}
+
+
+@lru_cache(maxsize=1024)
+def _filter_spec(model_cls: type, key: str) -> tuple[Any, str]:
+    """Mapped column and operator of a `column__op` filter, validated against the mapper"""
+    name, _, op = key.partition("__")
+    op = op or "eq"
+    if name not in sa_inspect(model_cls).column_attrs or op not in _OPERATORS or op in ("is", "is_not"):
+        logger.error("Invalid filter %s for %s", key, model_cls.__name__)
+        raise ValueError(f"Invalid filter {key}")
+    return getattr(model_cls, name), op
+
+
+def _bound_clause(column: Any, op: str, name: str) -> Any:
+    if op in ("is", "is_not"):
+        return _OPERATORS[op](column, None)
+    if op == "in":
+        return column.in_(bindparam(name, type_=column.type, expanding=True))
+    if op == "between":
+        return column.between(bindparam(f"{name}_lo", type_=column.type), bindparam(f"{name}_hi", type_=column.type))
+    return _OPERATORS[op](column, bindparam(name, type_=column.type))
+
+
+@lru_cache(maxsize=256)
+def _list_statement(repo_cls: type, model_cls: type, filters: tuple, order: tuple, paging: tuple) -> Select:
+    """List statement of one query shape, values are bound parameters named by `_construct_list_stmt`"""
+    has_limit, has_offset, has_after = paging
+    stmt = select(model_cls).options(*repo_cls._default_options)
+    clauses = [_bound_clause(_filter_spec(model_cls, key)[0], op, f"p{i}") for i, (key, op) in enumerate(filters)]
+    columns, descending = [], set()
+    for key in order:
+        desc = key.startswith("-")
+        column, op = _filter_spec(model_cls, key.lstrip("-"))
+        if op != "eq" or "__" in key:
+            raise ValueError(f"Invalid order column {key}")
+        columns.append(column.desc() if desc else column)
+        descending.add(desc)
+    if has_after:
+        if len(descending) > 1:
+            raise ValueError("Keyset paging needs every order column in the same direction")
+        keys = [_filter_spec(model_cls, key.lstrip("-"))[0] for key in order]
+        bounds = [bindparam(f"after{i}", type_=column.type) for i, column in enumerate(keys)]
+        left, right = (tuple_(*keys), tuple_(*bounds)) if len(keys) > 1 else (keys[0], bounds[0])
+        clauses.append(left < right if True in descending else left > right)
+    if clauses:
+        stmt = stmt.where(*clauses)
+    if columns:
+        stmt = stmt.order_by(*columns)
+    if has_limit:
+        stmt = stmt.limit(bindparam("limit", type_=Integer))
+    if has_offset:
+        stmt = stmt.offset(bindparam("offset", type_=Integer))
+    return stmt
+
 
 class BaseRepository(Generic[T], ABC):
     @abstractmethod
@@ -28,6 +109,19 @@ class BaseRepository(Generic[T], ABC):
                 
         raise NotImplementedError()
 
+    @abstractmethod
+    async def get_many(self, ids: Sequence[int]) -> List[T]:
+        """
+            Retrieve the records of several unique identifiers.
+
+            Args:
+                ids (Sequence[int]): The unique identifiers.
+
+            Returns:
+                List[T]: The records found, in the order of `ids`; missing ones are left out.
+        """
+        raise NotImplementedError()
+
     @abstractmethod
     async def list(self, **filters) -> List[T]:
         """
@@ -80,70 +174,391 @@ class BaseRepository(Generic[T], ABC):
 
 class BaseSqlAsyncRepository(BaseRepository[T], ABC):
     _model_cls: Type[T]
+    # loader options applied to every get/list statement, e.g. relationship loading strategies
+    _default_options: tuple = ()
+    # columns returned by the row level read paths, which skip building ORM objects
+    _row_columns: tuple = ()
+    # cache get_row results across transactions, for rarely changing models;
+    # any committed write to the table invalidates them
+    _row_cached: bool = False
 
-    def __init__(self, session: AsyncSession,model_cls:Type[T]) -> None:
+    def __init__(self, session: AsyncSession,model_cls:Type[T], cache: Optional[CacheBackend] = default_cache) -> None:
         """
         Initialize a new repository instance with a database session and model class.
     
         Args:
             session (AsyncSession): The asynchronous database session for performing database operations.
             model_cls (Type[T]): The model class representing the database table or entity.
+            cache (Optional[CacheBackend]): Backend of cached point reads, None disables them.
         """
         self._session = session
         self._model_cls = model_cls
-        logger.debug(f"Initialized {self._model_cls.__name__} repository")
+        self._cache = cache
+        self._loader: Optional[BatchLoader[T]] = None
+        logger.debug("Initialized %s repository", self._model_cls.__name__)
+
+    def enable_batch_loads(self) -> None:
+        """
+        Answer get_by_identifier calls made in the same event loop iteration with one get_many.
+
+        Meant for request scoped repositories, see BatchLoader.
+        """
+        self._loader = BatchLoader(self.get_many)
+
+    def _touch(self, *collections: str) -> None:
+        """
+        Remember collections written in the current transaction.
+
+        UnitOfWork invalidates their cache tags once the transaction is committed.
+
+        Args:
+            *collections (str): Table names, the repository's own table by default.
+        """
+        touched = self._session.info.setdefault("touched_collections", set())
+        touched.update(collections or (self._model_cls.__tablename__,))
+
+    @classmethod
+    def _row_adapter(cls) -> TypeAdapter:
+        adapter = _row_adapters.get(cls)
+        if adapter is None:
+            fields = {column.key: Optional[column.type.python_type] for column in cls._row_columns}
+            adapter = _row_adapters[cls] = TypeAdapter(TypedDict(f"{cls.__name__}Row", fields))
+        return adapter
+
+    def _cache_key(self, id: int) -> str:
+        namespace = cache_namespace(self._session.get_bind().engine)
+        return f"{namespace}:{self._model_cls.__tablename__}:{id}"
 
     def _construct_get_stmt(self, id: int) -> Any:
-        stmt = select(self._model_cls).where(getattr(self._model_cls, "id") == id)
-        logger.debug(f"Constructing get statement for {self._model_cls.__name__} with ID={id}")
+        stmt = select(self._model_cls).where(getattr(self._model_cls, "id") == id).options(*self._default_options)
+        logger.debug("Constructing get statement for %s with ID=%s", self._model_cls.__name__, id)
         return stmt
     
+    @traced()
     async def get_by_identifier(self, id: int) -> Optional[T]:
+        if self._loader is not None:
+            return await self._loader.load(id)
         stmt = self._construct_get_stmt(id)
-        logger.info(f"Fetching {self._model_cls.__name__} by identifier: {id}")
+        logger.info("Fetching %s by identifier: %s", self._model_cls.__name__, id)
         res = await self._session.execute(stmt)
         return res.scalar_one_or_none()
 
-    def _construct_list_stmt(self, **filters) -> Any:
-        stmt = select(self._model_cls)
-        where_clauses = []
-        for c, v in filters.items():
-            if not hasattr(self._model_cls, c):
-                logger.error(f"Invalid column name {c} for {self._model_cls.__name__}")
-                raise ValueError(f"Invalid column name {c}")
-            where_clauses.append(getattr(self._model_cls, c) == v)
-        if len(where_clauses) == 1:
-            stmt = stmt.where(where_clauses[0])
-        elif len(where_clauses) > 1:
-            stmt = stmt.where(and_(*where_clauses))
-        return stmt
+    @traced()
+    async def get_many(self, ids: Sequence[int]) -> List[T]:
+        model_id = getattr(self._model_cls, "id")
+        unique = list(dict.fromkeys(ids))
+        if not unique:
+            return []
+        stmt = select(self._model_cls).where(model_id.in_(unique)).options(*self._default_options)
+        logger.info("Fetching %s %s by identifiers", len(unique), self._model_cls.__name__)
+        res = await self._session.execute(stmt)
+        records = {record.id: record for record in res.scalars()}
+        return [records[id] for id in unique if id in records]
 
-    async def list(self, **filters) -> List[T]:
-        logger.info(f"Listing {self._model_cls.__name__} with filters: {filters}")
-        stmt = self._construct_list_stmt(**filters)
+    @traced()
+    async def get_rows(self, ids: Sequence[int]) -> List[dict]:
+        """
+        Retrieve the row columns of several records, without building ORM objects.
+
+        Args:
+            ids (Sequence[int]): The unique identifiers.
+
+        Returns:
+            List[dict]: Column values of the records found, in the order of `ids`.
+        """
+        unique = list(dict.fromkeys(ids))
+        if not unique:
+            return []
+        stmt = select(*self._row_columns).where(getattr(self._model_cls, "id").in_(unique))
+        logger.info("Fetching %s %s rows by identifiers", len(unique), self._model_cls.__name__)
         res = await self._session.execute(stmt)
+        rows = {row["id"]: dict(row) for row in res.mappings()}
+        return [rows[id] for id in unique if id in rows]
+
+    @traced()
+    async def get_row(self, id: int) -> Optional[dict]:
+        """
+        Retrieve the row columns of a record by its unique identifier, without building an ORM object.
+
+        For `_row_cached` repositories the row is served from the cache, and
+        stored there once the reading transaction ends. Write paths load ORM
+        objects with get_by_identifier, which always reads the database.
+
+        Args:
+            id (int): The unique identifier.
+
+        Returns:
+            Optional[dict]: Column values of the record, or None if not found.
+        """
+        cache = self._cache if self._row_cached else None
+        if cache is not None:
+            key, tags = self._cache_key(id), cache_tags(self._session.get_bind().engine, self._model_cls.__tablename__)
+            raw, stamp = await cache.get_stamped(key, tags)
+            if raw is not None:
+                logger.debug("%s %s found in cache", self._model_cls.__name__, id)
+                return dict(self._row_adapter().validate_json(raw))
+        stmt = select(*self._row_columns).where(getattr(self._model_cls, "id") == id)
+        logger.info("Fetching %s row by identifier: %s", self._model_cls.__name__, id)
+        res = await self._session.execute(stmt)
+        row = res.mappings().one_or_none()
+        if row is None:
+            return None
+        if cache is not None and stamp is not None:
+            # stored by UnitOfWork once the transaction ends; the stamp taken
+            # before the read keeps rows changed by concurrent transactions from being served
+            self._session.info.setdefault("cache_pending", []).append(
+                (cache, key, self._row_adapter().dump_json(dict(row)), tags, stamp, settings.IDENTITY_CACHE_TTL)
+            )
+        return dict(row)
+
+    def _where_clauses(self, **filters) -> list:
+        where_clauses = []
+        for key, value in filters.items():
+            column, op = _filter_spec(self._model_cls, key)
+            if op in ("eq", "ne") and value is None:
+                op = "is" if op == "eq" else "is_not"
+            where_clauses.append(_OPERATORS[op](column, value))
+        return where_clauses
+
+    def _construct_list_stmt(
+        self,
+        order_by: Union[str, Sequence[str], None] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        after: Any = None,
+        **filters,
+    ) -> tuple[Select, dict]:
+        """
+        Build the list statement for the given filters and its parameters.
+
+        Statements only depend on the shape of the query: the filtered columns
+        and operators, the order and which of limit, offset and after are
+        given. They are built once per shape with bound parameters and reused,
+        so repeated queries skip building the SQL expression and share the
+        compiled statement.
+
+        Returns:
+            tuple[Select, dict]: The statement and the values of its parameters.
+        """
+        shape, params = [], {}
+        for i, (key, value) in enumerate(filters.items()):
+            column, op = _filter_spec(self._model_cls, key)
+            if op in ("eq", "ne") and value is None:
+                shape.append((key, "is" if op == "eq" else "is_not"))
+                continue
+            name = f"p{i}"
+            if op == "between":
+                params[f"{name}_lo"], params[f"{name}_hi"] = value
+            elif op == "in":
+                params[name] = list(value)
+            else:
+                params[name] = value
+            shape.append((key, op))
+        if isinstance(order_by, str):
+            order_by = (order_by,)
+        order = tuple(order_by or ())
+        if after is not None:
+            if not order:
+                order = ("id",)
+            values = after if isinstance(after, (tuple, list)) else (after,)
+            if len(values) != len(order):
+                raise ValueError(f"after needs one value per order column {order}")
+            params.update({f"after{i}": value for i, value in enumerate(values)})
+        if limit is not None:
+            params["limit"] = limit
+        if offset is not None:
+            params["offset"] = offset
+        stmt = _list_statement(
+            type(self), self._model_cls, tuple(shape), order,
+            (limit is not None, offset is not None, after is not None),
+        )
+        return stmt, params
+
+    @traced()
+    async def list(
+        self,
+        order_by: Union[str, Sequence[str], None] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        after: Any = None,
+        **filters,
+    ) -> List[T]:
+        """
+        Retrieve records matching the filters.
+
+        Filters are `column=value` for equality or `column__op=value` with op one of
+        `eq`, `ne`, `gt`, `lt`, `ge`, `le`, `in` (a sequence) and `between`
+        (a pair, both ends included). `None` compares with IS (NOT) NULL.
+
+        Args:
+            order_by (Union[str, Sequence[str], None]): Columns to order by, `-column` for descending order.
+            limit (Optional[int]): Maximum number of records.
+            offset (Optional[int]): Number of records to skip.
+            after (Any): Keyset paging, values of the order columns of the last record of
+                the previous page (a tuple for several columns); ordered by id if no order is given.
+                The order columns must be unique together and share one direction.
+            **filters: Filter conditions.
+
+        Returns:
+            List[T]: Records matching the filters.
+
+        Raises:
+            ValueError: If a column or an operator is unknown.
+        """
+        logger.info("Listing %s with filters: %s", self._model_cls.__name__, filters)
+        stmt, params = self._construct_list_stmt(order_by, limit, offset, after, **filters)
+        res = await self._session.execute(stmt, params)
         return list(res.scalars().all())
 
+    @traced()
     async def add(self, record: T) -> T:
-        logger.info(f"Adding new {self._model_cls.__name__}: {record}")
+        logger.info("Adding new %s: %s", self._model_cls.__name__, record)
         self._session.add(record)
+        self._touch()
         await self._session.flush()
         await self._session.refresh(record)
-        logger.info(f"Added {self._model_cls.__name__}: {record}")
+        logger.info("Added %s: %s", self._model_cls.__name__, record)
         return record
 
+    @traced()
     async def update(self, record: T) -> T:
-        logger.info(f"Updating {self._model_cls.__name__}: {record}")
+        logger.info("Updating %s: %s", self._model_cls.__name__, record)
         self._session.add(record)
+        self._touch()
         await self._session.flush()
         await self._session.refresh(record)
-        logger.info(f"Updated {self._model_cls.__name__}: {record}")
+        logger.info("Updated %s: %s", self._model_cls.__name__, record)
         return record
 
+    @traced()
     async def delete(self, id: int) -> None:
-        logger.info(f"Deleting {self._model_cls.__name__} with ID={id}")
+        logger.info("Deleting %s with ID=%s", self._model_cls.__name__, id)
         record = await self.get_by_identifier(id)
         if record is not None:
+            self._touch()
             await self._session.delete(record)
             await self._session.flush()
 
+    @traced()
+    async def insert_returning(self, values: dict) -> T:
+        """
+        Insert a record with a single INSERT ... RETURNING statement.
+
+        Args:
+            values (dict): Column values of the new record.
+
+        Returns:
+            T: The inserted record, with database generated values loaded.
+        """
+        logger.info("Inserting %s: %s", self._model_cls.__name__, values)
+        stmt = insert(self._model_cls).values(**values).returning(self._model_cls)
+        record = await self._session.scalar(stmt)
+        self._touch()
+        logger.info("Inserted %s: %s", self._model_cls.__name__, record)
+        return record
+
+    @traced()
+    async def insert_many(self, values: List[dict]) -> int:
+        """
+        Insert many records without loading them back.
+
+        On PostgreSQL over asyncpg the rows are sent with COPY, elsewhere with
+        multi-row INSERT statements. Columns left out get their server defaults,
+        so every dict must have the same keys.
+
+        Args:
+            values (List[dict]): Column values of the new records.
+
+        Returns:
+            int: Number of inserted records.
+        """
+        logger.info("Inserting %s %s records", len(values), self._model_cls.__name__)
+        if not values:
+            return 0
+        connection = await self._session.connection()
+        if connection.dialect.name == "postgresql" and connection.dialect.driver == "asyncpg":
+            # COPY skips the Python side column defaults, send scalar ones explicitly
+            defaults = {
+                column.key: column.default.arg
+                for column in self._model_cls.__table__.columns
+                if column.default is not None and column.default.is_scalar and column.key not in values[0]
+            }
+            columns = list(values[0]) + list(defaults)
+            # the dialect begins the driver transaction lazily on the first
+            # statement; run one so that COPY is part of the ORM transaction
+            await connection.exec_driver_sql("SELECT 1")
+            raw = await connection.get_raw_connection()
+            await raw.driver_connection.copy_records_to_table(
+                self._model_cls.__tablename__,
+                records=[tuple({**defaults, **row}[column] for column in columns) for row in values],
+                columns=columns,
+            )
+        else:
+            await self._session.execute(insert(self._model_cls), values)
+        self._touch()
+        return len(values)
+
+    @traced()
+    async def update_returning(self, id: int, values: dict) -> Optional[T]:
+        """
+        Update columns of a record with a single UPDATE ... RETURNING statement.
+
+        Relationships are neither loaded nor touched.
+
+        Args:
+            id (int): The unique identifier.
+            values (dict): Column values to set.
+
+        Returns:
+            Optional[T]: The updated record, or None if not found.
+        """
+        logger.info("Updating %s with ID=%s: %s", self._model_cls.__name__, id, values)
+        model_id = getattr(self._model_cls, "id")
+        stmt = update(self._model_cls).where(model_id == id).values(**values).returning(self._model_cls)
+        record = await self._session.scalar(stmt)
+        if record is not None:
+            self._touch()
+        return record
+
+    @traced()
+    async def delete_returning(self, id: int) -> Optional[T]:
+        """
+        Delete a record with a single DELETE ... RETURNING statement.
+
+        Args:
+            id (int): The unique identifier.
+
+        Returns:
+            Optional[T]: The deleted record, or None if not found.
+        """
+        logger.info("Deleting %s with ID=%s", self._model_cls.__name__, id)
+        model_id = getattr(self._model_cls, "id")
+        stmt = delete(self._model_cls).where(model_id == id).returning(self._model_cls)
+        record = await self._session.scalar(stmt)
+        if record is not None:
+            self._touch()
+        return record
+
+    @traced()
+    async def delete_where(self, *criteria: Any, **filters) -> List[int]:
+        """
+        Delete every record matching the criteria with a single DELETE ... RETURNING statement.
+
+        Without criteria and filters every record is deleted.
+
+        Args:
+            *criteria: SQLAlchemy boolean expressions on the model columns.
+            **filters: Column equality filters, as in `list`.
+
+        Returns:
+            List[int]: Identifiers of the deleted records.
+        """
+        logger.info("Deleting %s where %s %s", self._model_cls.__name__, criteria, filters)
+        model_id = getattr(self._model_cls, "id")
+        stmt = delete(self._model_cls).where(*criteria, *self._where_clauses(**filters)).returning(model_id)
+        res = await self._session.execute(stmt)
+        ids = list(res.scalars().all())
+        if ids:
+            self._touch()
+        logger.info("Deleted %s %s", len(ids), self._model_cls.__name__)
+        return ids
@@ -1,9 +1,16 @@
+import logging
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Callable
 from abc import ABC, abstractmethod
 from typing import Protocol
+from contextlib import AsyncExitStack
 from app.utils.patterns.rep import TableRepository, ReservationRepository
-from app.core import logger
+from app.core.locks import LockStripes, table_locks
+from app.core.cache import CacheBackend, cache as default_cache, cache_tags
+from app.core.tracing import traced
+from app.database.replicas import ReplicaSet, note_replica_read
+
+logger = logging.getLogger(__name__)
 
 class IUnitOfWork(ABC):
     """Интерфейс Unit of Work для управления транзакциями"""
@@ -35,33 +42,167 @@ class IUnitOfWork(ABC):
 class UnitOfWork(IUnitOfWork):
     """Unit of Work для управления транзакциями """
 
-    def __init__(self, session: AsyncSession):
+    def __init__(
+        self,
+        session: AsyncSession,
+        locks: LockStripes = table_locks,
+        cache: CacheBackend | None = default_cache,
+        batch_loads: bool = False,
+        replicas: ReplicaSet | None = None,
+        read_only: bool = False,
+    ):
         logger.debug("UnitOfWork initialized")
         super().__init__(session)
-        self.tables = TableRepository(session)  # Подключаем репозиторий столов
-        self.reservations = ReservationRepository(session)  # Подключаем репозиторий брони
+        self.read_only = read_only
+        self._locks = locks
+        self._cache = cache
+        self._batch_loads = batch_loads
+        # по умолчанию реплики фабрики сессий (async_sessionmaker(info={"replicas": ...}))
+        self._replicas = replicas if replicas is not None else session.info.get("replicas")
+        self._held_locks = AsyncExitStack()
+        self._bind(session)
+
+    def _bind(self, session: AsyncSession) -> None:
+        """Подключение репозиториев к сессии"""
+        self.session = session
+        self.tables = TableRepository(session, self._cache)  # Подключаем репозиторий столов
+        self.reservations = ReservationRepository(session, self._cache)  # Подключаем репозиторий брони
+        if self._batch_loads:
+            # get_by_identifier одного тика цикла событий выполняется одним запросом
+            self.tables.enable_batch_loads()
+            self.reservations.enable_batch_loads()
+
+    def for_read(self) -> "UnitOfWork":
+        """Unit of Work только для чтения
 
+        При заданных репликах читает с одной из них (по кругу, отстающие
+        пропускаются), иначе с основной базы в транзакции READ ONLY.
+        """
+        if self._replicas is not None:
+            return ReplicaUnitOfWork(self)
+        return UnitOfWork(
+            self.session, self._locks, self._cache, batch_loads=self._batch_loads, replicas=None, read_only=True,
+        )
+
+    @traced()
     async def __aenter__(self):
         """Начинаем транзакцию"""
         logger.info("Starting transaction")
+        if self.read_only:
+            await self._begin_read_only()
         return self
 
+    @traced()
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """Коммитим или откатываем транзакцию в зависимости от наличия ошибок"""
-        if exc_type:
-            logger.warning(f"Exception occurred: {exc_type} - {exc_val}, performing rollback")
-            await self.rollback()
-        else:
-            logger.info("No exception, committing transaction")
-            await self.commit()
+        try:
+            if self.read_only:
+                await self._end_read_only(exc_type is None)
+            elif exc_type:
+                logger.warning("Exception occurred: %s - %s, performing rollback", exc_type, exc_val)
+                await self.rollback()
+            else:
+                logger.info("No exception, committing transaction")
+                await self.commit()
+        finally:
+            await self._held_locks.aclose()
+
+    async def _begin_read_only(self) -> None:
+        """Начало чтения без записи
+
+        Если сессия уже в транзакции, чтение идёт в ней и она остаётся
+        владельцу. Иначе на Postgres открывается транзакция READ ONLY
+        DEFERRABLE, а на выходе сессия закрывается: соединение сразу
+        возвращается в пул без COMMIT и сброса изменений.
+        """
+        self._owns_transaction = not self.session.in_transaction()
+        self._autoflush = self.session.sync_session.autoflush
+        self.session.sync_session.autoflush = False
+        if self._owns_transaction and self.session.get_bind().dialect.name == "postgresql":
+            await self.session.connection(
+                execution_options={"postgresql_readonly": True, "postgresql_deferrable": True},
+            )
+
+    async def _end_read_only(self, fill_cache: bool) -> None:
+        """Завершение чтения, прочитанные строки сохраняются в кэше"""
+        self.session.sync_session.autoflush = self._autoflush
+        if not self._owns_transaction:
+            return
+        logger.info("Releasing read-only transaction")
+        # строки уже загружены, close() отсоединяет их, не помечая устаревшими
+        await self.session.close()
+        pending = self.session.info.pop("cache_pending", ())
+        self.session.info.pop("touched_collections", None)
+        if fill_cache:
+            for cache, key, value, tags, stamp, ttl in pending:
+                await cache.set(key, value, stamp=stamp, tags=tags, ttl=ttl)
+
+    @traced()
+    async def lock_tables(self, *ids: int) -> None:
+        """Сериализация записи броней по столам до конца транзакции
 
+        Postgres блокирует сами строки столов (SELECT ... FOR UPDATE),
+        для остальных БД используются внутрипроцессные блокировки-полосы.
+        Записи по разным столам не ждут друг друга.
+        """
+        if self.session.get_bind().dialect.name == "postgresql":
+            return
+        logger.debug("Acquiring table locks: %s", ids)
+        await self._held_locks.enter_async_context(self._locks.hold(*ids))
+
+    @traced()
     async def commit(self):
-        """Фиксация транзакции"""
+        """Фиксация транзакции
+
+        После фиксации сбрасывает в кэше теги изменённых коллекций
+        (закэшированные строки и ответы списков) и сохраняет строки,
+        прочитанные в транзакции.
+        """
+        if self.read_only:
+            raise RuntimeError("Read-only Unit of Work can not commit")
         logger.info("Committing transaction")
         await self.session.commit()
+        touched = self.session.info.pop("touched_collections", None)
+        pending = self.session.info.pop("cache_pending", ())
+        if touched and self._cache is not None:
+            logger.debug("Invalidating cache tags: %s", sorted(touched))
+            await self._cache.invalidate_tags(*cache_tags(self.session.get_bind().engine, *touched))
+        for cache, key, value, tags, stamp, ttl in pending:
+            await cache.set(key, value, stamp=stamp, tags=tags, ttl=ttl)
 
+    @traced()
     async def rollback(self):
         """Откат транзакции"""
         logger.info("Rolling back transaction")
         await self.session.rollback()
-        
\ No newline at end of file
+        for key in ("touched_collections", "cache_pending"):
+            self.session.info.pop(key, None)
+        
+
+class ReplicaUnitOfWork(UnitOfWork):
+    """Unit of Work чтения с реплики
+
+    Реплика выбирается при входе в контекст; если подходящей нет, чтение
+    идёт с основной базы, как у for_read() без реплик. Прочитанные с
+    реплики строки в кэш не попадают: реплика может отставать от основной базы.
+    """
+
+    def __init__(self, primary: UnitOfWork):
+        super().__init__(
+            primary.session, primary._locks, primary._cache, batch_loads=primary._batch_loads, replicas=None, read_only=True,
+        )
+        self._primary_replicas = primary._replicas
+        self._replica = None
+
+    @traced()
+    async def __aenter__(self):
+        """Выбор реплики"""
+        self._replica = await self._primary_replicas.pick()
+        if self._replica is not None:
+            logger.debug("Reading from replica %s", self._replica.name)
+            note_replica_read(self._replica)
+            self._bind(self._replica.session_maker())
+        return await super().__aenter__()
+
+    async def _end_read_only(self, fill_cache: bool) -> None:
+        await super()._end_read_only(fill_cache and self._replica is None)
@@ -1,4 +1,3 @@
-__all__ = ["IUnitOfWork", "UnitOfWork"]
-
-from .UnitOfWork import IUnitOfWork, UnitOfWork
+__all__ = ["IUnitOfWork", "UnitOfWork", "ReplicaUnitOfWork"]
 
+from .UnitOfWork import IUnitOfWork, UnitOfWork, ReplicaUnitOfWork
@@ -0,0 +1,116 @@
+import codecs
+import csv
+import json
+from typing import Any, AsyncIterable, AsyncIterator
+
+
+_decoder = json.JSONDecoder()
+
+
+async def _text(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    # a multi-byte character may be split between chunks
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    async for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
+async def iter_json_array(chunks: AsyncIterable[bytes]) -> AsyncIterator[Any]:
+    """Yield the items of a JSON array body as soon as each one is received
+
+    :raises ValueError: if the body is not a JSON array
+    """
+    text = _text(chunks)
+    buffer, pos = "", 0
+
+    async def more() -> bool:
+        nonlocal buffer, pos
+        try:
+            chunk = await anext(text)
+        except StopAsyncIteration:
+            return False
+        buffer, pos = buffer[pos:] + chunk, 0
+        return True
+
+    async def peek() -> str:
+        # next non-whitespace character, "" at the end of the body
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            if not await more():
+                return ""
+
+    if await peek() != "[":
+        raise ValueError("Expected a JSON array")
+    pos += 1
+    if await peek() == "]":
+        pos += 1
+    else:
+        while True:
+            while True:
+                try:
+                    item, end = _decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError as e:
+                    if not await more():
+                        raise ValueError(f"Invalid JSON: {e.msg}") from e
+                    continue
+                # a number may go on in the next chunk, wait for the delimiter
+                if buffer[end:].lstrip()[:1] in (",", "]") or not await more():
+                    break
+            yield item
+            pos = end
+            char = await peek()
+            if char == "]":
+                pos += 1
+                break
+            if char != ",":
+                raise ValueError("Expected ',' or ']' after an array item")
+            pos += 1
+            await peek()
+    if await peek():
+        raise ValueError("Extra data after the JSON array")
+
+
+async def _records(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    # complete CSV records, a quoted field may span several lines
+    pending, buffer = "", ""
+    async for text in _text(chunks):
+        buffer += text
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            pending += line + "\n"
+            if pending.count('"') % 2 == 0:
+                yield pending
+                pending = ""
+    pending += buffer
+    if pending.count('"') % 2:
+        raise ValueError("Unterminated quoted field")
+    if pending:
+        yield pending
+
+
+async def iter_csv(chunks: AsyncIterable[bytes]) -> AsyncIterator[dict[str, str]]:
+    """Yield the records of a CSV body with a header line as dicts
+
+    Records are parsed one by one as they arrive.
+
+    :raises ValueError: if a record does not match the header
+    """
+    header = None
+    async for record in _records(chunks):
+        if not record.strip():
+            continue
+        values = next(csv.reader([record]))
+        if header is None:
+            header = [value.strip() for value in values]
+        elif len(values) != len(header):
+            raise ValueError(f"Record {values} has {len(values)} fields, the header has {len(header)}")
+        else:
+            yield dict(zip(header, values))
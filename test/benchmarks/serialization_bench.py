@@ -0,0 +1,76 @@
+"""
+Compare the model based and the row based JSON serialization of list responses.
+
+The model path is what a route returning response models costs: ORM object ->
+to_dict() -> model_validate() -> FastAPI re-validation of response_model ->
+json.dumps. The row path dumps the plain rows read by the repositories with
+TypeAdapter.dump_json.
+
+Run from the project root:
+
+    PYTHONPATH=. python test/benchmarks/serialization_bench.py [rows]
+"""
+import json
+import sys
+from datetime import datetime, timedelta
+from time import perf_counter
+from typing import List
+from pydantic import TypeAdapter
+from app.models import Reservations, Tables
+from app.schema import ReservationResponse, TableResponse, reservation_rows, table_rows
+
+
+def _reservations(n: int) -> tuple[list[Reservations], list[dict]]:
+    start = datetime(2025, 1, 1)
+    rows = [
+        {
+            "id": i,
+            "table_id": i % 50,
+            "customer_name": f"customer {i}",
+            "reservation_time": start + timedelta(hours=i),
+            "duration_minutes": 60,
+        }
+        for i in range(n)
+    ]
+    return [Reservations(**row) for row in rows], rows
+
+
+def _tables(n: int) -> tuple[list[Tables], list[dict]]:
+    rows = [{"id": i, "name": f"table {i}", "seats": i % 8, "location": "hall"} for i in range(n)]
+    return [Tables(**row) for row in rows], [{**row, "reserved_tables": None} for row in rows]
+
+
+def _model_path(objects: list, model: type, adapter: TypeAdapter) -> bytes:
+    models = [model.model_validate(obj.to_dict()) for obj in objects]
+    # what FastAPI does with a response_model: validate again, dump, json.dumps
+    content = adapter.dump_python(adapter.validate_python(models), mode="json")
+    return json.dumps(content).encode()
+
+
+def _best(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t = perf_counter()
+        fn()
+        best = min(best, perf_counter() - t)
+    return best
+
+
+def main(n: int = 10_000) -> None:
+    reserv_objects, reserv_rows = _reservations(n)
+    table_objects, table_list = _tables(n)
+    cases = [
+        ("ReservationResponse", reserv_objects, ReservationResponse, reserv_rows, reservation_rows),
+        ("TableResponse", table_objects, TableResponse, table_list, table_rows),
+    ]
+    print(f"{n} rows, best of 5")
+    for name, objects, model, rows, rows_adapter in cases:
+        adapter = TypeAdapter(List[model])
+        assert json.loads(_model_path(objects, model, adapter)) == json.loads(rows_adapter.dump_json(rows))
+        slow = _best(lambda: _model_path(objects, model, adapter))
+        fast = _best(lambda: rows_adapter.dump_json(rows))
+        print(f"{name:20} models: {slow * 1000:8.1f} ms  rows: {fast * 1000:8.1f} ms  x{slow / fast:.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
@@ -0,0 +1,6 @@
+import os
+import tempfile
+
+# logs of the test run go to a temporary directory instead of the repository;
+# set before app.core is imported, which configures logging at import
+os.environ["LOG_FILE"] = os.path.join(tempfile.mkdtemp(prefix="tablereserv-logs-"), "app.log")
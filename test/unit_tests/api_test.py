@@ -0,0 +1,99 @@
+import httpx
+import pytest
+import pytest_asyncio
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine, AsyncSession
+from app.core.config import settings
+from app.database.db import get_async_session
+from app.main.app import app
+from app.models.Base import Base
+
+
+@pytest_asyncio.fixture(scope="function")
+async def client(tmp_path):
+    """Клиент приложения с отдельной базой SQLite"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'api.sqlite'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)
+
+    async def session():
+        async with session_maker() as db_session:
+            yield db_session
+
+    app.dependency_overrides[get_async_session] = session
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            client.statements = []
+            event.listen(engine.sync_engine, "before_cursor_execute", lambda conn, cursor, statement, *args: client.statements.append(statement))
+            yield client
+    finally:
+        app.dependency_overrides.pop(get_async_session, None)
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_tables_conditional_get(client):
+    """Опрос столов: 304 по ETag без обращения к базе, новый ETag после записи"""
+    table = (await client.post("/api/v1/tables/", json={"name": "T1", "seats": 4, "location": "Hall"})).json()
+    headers = {"Accept-Encoding": "identity"}
+
+    response = await client.get("/api/v1/tables/", headers=headers)
+    assert response.status_code == 200 and [t["name"] for t in response.json()] == ["T1"]
+    etag = response.headers["etag"]
+
+    client.statements.clear()
+    response = await client.get("/api/v1/tables/", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304 and response.headers["etag"] == etag
+    assert client.statements == []  # тело из кэша ответов
+
+    await client.post("/api/v1/tables/", json={"name": "T2", "seats": 2, "location": "Hall"})
+    response = await client.get("/api/v1/tables/", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200 and [t["name"] for t in response.json()] == ["T1", "T2"]
+    assert response.headers["etag"] != etag
+    etag = response.headers["etag"]
+
+    assert (await client.delete(f"/api/v1/tables/{table['id']}")).status_code == 200
+    response = await client.get("/api/v1/tables/", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200 and [t["name"] for t in response.json()] == ["T2"]
+
+
+@pytest.mark.asyncio
+async def test_reservations_conditional_get(client):
+    """Опрос броней: ETag меняется после создания и удаления брони"""
+    table = (await client.post("/api/v1/tables/", json={"name": "T1", "seats": 4, "location": "Hall"})).json()
+    response = await client.get("/api/v1/reservations/")
+    assert response.status_code == 200 and response.json() == []
+    empty_etag = response.headers["etag"]
+    assert (await client.get("/api/v1/reservations/", headers={"If-None-Match": empty_etag})).status_code == 304
+
+    reservation = (await client.post("/api/v1/reservations/", json={
+        "table_id": table["id"], "customer_name": "Ann", "reservation_time": "2025-04-10T19:00:00", "duration_minutes": 60,
+    })).json()
+    response = await client.get("/api/v1/reservations/", headers={"If-None-Match": empty_etag})
+    assert response.status_code == 200 and [r["id"] for r in response.json()] == [reservation["id"]]
+    etag = response.headers["etag"]
+
+    assert (await client.delete(f"/api/v1/reservations/{reservation['id']}")).status_code == 200
+    response = await client.get("/api/v1/reservations/", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.json() == []
+    assert response.headers["etag"] == empty_etag
+
+
+@pytest.mark.asyncio
+async def test_conditional_get_gzip(client, monkeypatch):
+    """Клиенты с gzip получают сжатое тело под отдельным ETag"""
+    monkeypatch.setattr(settings, "GZIP_MIN_SIZE", 1)
+    await client.post("/api/v1/tables/", json={"name": "T1", "seats": 4, "location": "Hall"})
+
+    plain = await client.get("/api/v1/tables/", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    response = await client.get("/api/v1/tables/", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip" and "Accept-Encoding" in response.headers["vary"]
+    assert response.headers["etag"] == plain.headers["etag"][:-1] + '-gzip"'
+    assert response.json() == plain.json()
+
+    # either tag of the body answers 304
+    for etag in (plain.headers["etag"], response.headers["etag"]):
+        response = await client.get("/api/v1/tables/", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+        assert response.status_code == 304
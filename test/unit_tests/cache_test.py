@@ -0,0 +1,164 @@
+import pytest
+import pytest_asyncio
+import asyncio
+from time import monotonic
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.core.cache import MemoryCache, RedisCache, cache_tags, create_cache
+from app.core.cache.redis import encode_command, read_reply
+
+
+class StandInRedis:
+    """Minimal in-process server speaking the subset of RESP used by RedisCache"""
+
+    def __init__(self):
+        self.data: dict[bytes, tuple[float | None, bytes]] = {}
+        self.commands: list[bytes] = []
+
+    def _get(self, key: bytes) -> bytes | None:
+        entry = self.data.get(key)
+        if entry is None or (entry[0] is not None and monotonic() > entry[0]):
+            self.data.pop(key, None)
+            return None
+        return entry[1]
+
+    def _reply(self, value) -> bytes:
+        if value is None:
+            return b"$-1\r\n"
+        if isinstance(value, int):
+            return b":%d\r\n" % value
+        if isinstance(value, list):
+            return b"*%d\r\n" % len(value) + b"".join(self._reply(v) for v in value)
+        if isinstance(value, str):
+            return f"+{value}\r\n".encode()
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def _execute(self, name: bytes, *args: bytes):
+        self.commands.append(name)
+        if name == b"GET":
+            return self._get(args[0])
+        if name == b"MGET":
+            return [self._get(key) for key in args]
+        if name == b"SET":
+            expires_at = monotonic() + int(args[3]) / 1000 if len(args) > 2 else None
+            self.data[args[0]] = (expires_at, args[1])
+            return "OK"
+        if name == b"DEL":
+            return sum(self.data.pop(key, None) is not None for key in args)
+        if name == b"INCR":
+            value = int(self._get(args[0]) or 0) + 1
+            self.data[args[0]] = (None, str(value).encode())
+            return value
+        return "OK"
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                command = await read_reply(reader)
+                writer.write(self._reply(self._execute(command[0].upper(), *command[1:])))
+                await writer.drain()
+        except Exception:
+            writer.close()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def redis_server():
+    stand_in = StandInRedis()
+    server = await asyncio.start_server(stand_in.handle, "127.0.0.1", 0)
+    stand_in.port = server.sockets[0].getsockname()[1]
+    yield stand_in
+    server.close()
+
+
+@pytest_asyncio.fixture(scope="function", params=["memory", "redis"])
+async def backend(request, redis_server):
+    if request.param == "memory":
+        yield MemoryCache()
+    else:
+        cache = RedisCache(port=redis_server.port)
+        yield cache
+        await cache.close()
+
+
+def test_encode_command():
+    assert encode_command("SET", "k", b"v", 10) == b"*4\r\n$3\r\nSET\r\n$1\r\nk\r\n$1\r\nv\r\n$2\r\n10\r\n"
+
+
+@pytest.mark.asyncio
+async def test_cache_tags(backend):
+    """Entries are served until one of their tags is invalidated"""
+    value, stamp = await backend.get_stamped("a", ("tables",))
+    assert value is None
+    await backend.set("a", b"[1]", stamp=stamp, tags=("tables",))
+    await backend.set("b", b"[2]", stamp=(await backend.get_stamped("b", ("reservations",)))[1], tags=("reservations",))
+    assert await backend.get("a", ("tables",)) == b"[1]"
+
+    await backend.invalidate_tags("tables")
+    assert await backend.get("a", ("tables",)) is None
+    assert await backend.get("b", ("reservations",)) == b"[2]"
+
+    # a value computed before the invalidation is never served
+    await backend.set("a", b"[old]", stamp=stamp, tags=("tables",))
+    assert await backend.get("a", ("tables",)) is None
+
+    await backend.delete("b")
+    assert await backend.get("b", ("reservations",)) is None
+    assert backend.stats()["hits"] == 2
+
+
+@pytest.mark.asyncio
+async def test_cache_ttl(backend):
+    _, stamp = await backend.get_stamped("a")
+    await backend.set("a", b"1", stamp=stamp, ttl=0.05)
+    assert await backend.get("a") == b"1"
+    await asyncio.sleep(0.1)
+    assert await backend.get("a") is None
+
+
+@pytest.mark.asyncio
+async def test_redis_cache_shared_between_workers(redis_server):
+    """An invalidation made by one worker is seen by the others"""
+    worker_1, worker_2 = RedisCache(port=redis_server.port), RedisCache(port=redis_server.port)
+    _, stamp = await worker_1.get_stamped("a", ("tables",))
+    await worker_1.set("a", b"[1]", stamp=stamp, tags=("tables",))
+    assert await worker_2.get("a", ("tables",)) == b"[1]"
+    await worker_2.invalidate_tags("tables")
+    assert await worker_1.get("a", ("tables",)) is None
+    # reads are pipelined: GET and MGET of the tags in one round trip
+    assert redis_server.commands[:3] == [b"GET", b"MGET", b"SET"]
+    await worker_1.close()
+    await worker_2.close()
+
+
+@pytest.mark.asyncio
+async def test_redis_cache_unavailable():
+    """An unreachable server turns reads into misses and drops writes"""
+    server = await asyncio.start_server(lambda r, w: None, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    server.close()
+    await server.wait_closed()
+    cache = RedisCache(port=port, timeout=0.5)
+    assert await cache.get_stamped("a", ("tables",)) == (None, None)
+    await cache.set("a", b"1", stamp=(0,), tags=("tables",))
+    await cache.invalidate_tags("tables")
+    assert cache.stats()["misses"] == 1
+
+
+def test_create_cache():
+    assert create_cache("none") is None
+    assert isinstance(create_cache("memory://", size=10), MemoryCache)
+    # other workers would never see the invalidations of the memory backend
+    assert create_cache("memory://", workers=4) is None
+    cache = create_cache("redis://:secret@cache:6380/2")
+    assert (cache.host, cache.port, cache.db, cache._password) == ("cache", 6380, 2, "secret")
+    with pytest.raises(ValueError):
+        create_cache("memcached://cache")
+
+
+def test_cache_tags_namespaced_by_database(tmp_path):
+    first = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'a.sqlite'}").sync_engine
+    same = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'a.sqlite'}").sync_engine
+    other = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'b.sqlite'}").sync_engine
+    # workers of one database share tags, databases sharing a backend do not
+    assert cache_tags(first, "tables") == cache_tags(same, "tables")
+    assert cache_tags(first, "tables") != cache_tags(other, "tables")
+    assert cache_tags(first, "tables")[0].endswith(":tables")
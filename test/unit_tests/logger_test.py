@@ -0,0 +1,55 @@
+import pytest
+import asyncio
+import json
+import logging
+from app.core.logger import JsonFormatter, SamplingFilter, parse_levels, setup_logging, stop_logging
+
+
+def test_json_formatter():
+    record = logging.makeLogRecord({
+        "name": "app.test", "levelno": logging.INFO, "levelname": "INFO",
+        "msg": " Table %s created", "args": (7,), "table_id": 7,
+    })
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "Table 7 created"
+    assert (entry["level"], entry["logger"], entry["table_id"]) == ("INFO", "app.test", 7)
+
+
+def test_parse_levels():
+    assert parse_levels("app.services=warning, sqlalchemy.engine=ERROR,") == {"app.services": "WARNING", "sqlalchemy.engine": "ERROR"}
+    with pytest.raises(ValueError):
+        parse_levels("app.services")
+
+
+@pytest.mark.asyncio
+async def test_sampling_filter():
+    """Строки одного запроса (задачи) сохраняются или отбрасываются вместе"""
+    sampling = SamplingFilter(0.5)
+
+    def record(level=logging.INFO):
+        return logging.makeLogRecord({"levelno": level})
+
+    async def request():
+        decisions = {sampling.filter(record()) for _ in range(5)}
+        assert len(decisions) == 1
+        assert sampling.filter(record(logging.ERROR))
+        return decisions.pop()
+
+    kept = await asyncio.gather(*(request() for _ in range(200)))
+    assert 0 < sum(kept) < 200
+
+
+def test_setup_logging(tmp_path):
+    """Записи пишутся фоновым потоком в файл в формате JSON"""
+    setup_logging(levels="app.quiet=WARNING", fmt="json", file=str(tmp_path / "app.log"), stdout=False)
+    try:
+        logging.getLogger("app.loud").info("Reserved table %s", 3, extra={"table_id": 3})
+        logging.getLogger("app.quiet").info("Dropped")
+        logging.getLogger("app.quiet").warning("Kept")
+        stop_logging()
+        entries = [json.loads(line) for line in (tmp_path / "app.log").read_text().splitlines()]
+        assert [(e["logger"], e["message"]) for e in entries] == [("app.loud", "Reserved table 3"), ("app.quiet", "Kept")]
+        assert entries[0]["table_id"] == 3
+    finally:
+        logging.getLogger("app.quiet").setLevel(logging.NOTSET)
+        setup_logging()
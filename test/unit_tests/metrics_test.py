@@ -0,0 +1,123 @@
+import pytest
+import logging
+import re
+import httpx
+from unittest.mock import patch
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from app.core.config import settings
+from app.core.metrics import MetricsRegistry, SQL_DURATION, POOL_CHECKOUT_WAIT, registry
+from app.database.instrumentation import (
+    MeasuredQueuePool, QueryBudgetExceeded, instrument_engine, statement_operation, track_queries,
+)
+from app.main.middleware import QueryBudgetMiddleware
+
+
+def test_registry_render():
+    metrics = MetricsRegistry()
+    bookings = metrics.counter("bookings", "Bookings by outcome", ("outcome",))
+    latency = metrics.histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1))
+    in_use = metrics.gauge("in_use", "Connections in use", callback=lambda: {(): 3})
+    bookings.inc(outcome="created")
+    bookings.inc(2, outcome='a "quoted"\nvalue')
+    latency.observe(0.05, route="/t")
+    latency.observe(0.5, route="/t")
+    latency.observe(5, route="/t")
+
+    assert metrics.render().splitlines() == [
+        "# HELP bookings Bookings by outcome",
+        "# TYPE bookings counter",
+        'bookings_total{outcome="created"} 1',
+        'bookings_total{outcome="a \\"quoted\\"\\nvalue"} 2',
+        "# HELP latency_seconds Latency",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{route="/t",le="0.1"} 1',
+        'latency_seconds_bucket{route="/t",le="1"} 2',
+        'latency_seconds_bucket{route="/t",le="+Inf"} 3',
+        'latency_seconds_sum{route="/t"} 5.55',
+        'latency_seconds_count{route="/t"} 3',
+        "# HELP in_use Connections in use",
+        "# TYPE in_use gauge",
+        "in_use 3",
+    ]
+    with pytest.raises(ValueError):
+        bookings.inc(status="201")
+    with pytest.raises(ValueError):
+        metrics.counter("bookings", "Again")
+
+
+def test_statement_operation():
+    assert statement_operation("  select 1") == "SELECT"
+    assert statement_operation("CREATE TABLE t (id int)") == "OTHER"
+
+
+@pytest.mark.asyncio
+async def test_instrument_engine(tmp_path):
+    """Время запросов и состояние пула попадают в метрики"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'metrics.sqlite'}", poolclass=MeasuredQueuePool, pool_size=2)
+    replica = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'replica.sqlite'}", poolclass=MeasuredQueuePool, pool_size=3)
+    instrument_engine(engine, pool="metrics_test")
+    instrument_engine(replica, pool="metrics_test_replica")
+    selects, waits = SQL_DURATION.count(operation="SELECT"), POOL_CHECKOUT_WAIT.count()
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            rendered = registry.render()
+            assert 'db_pool_connections{pool="metrics_test",state="in_use"} 1' in rendered
+            # every pool keeps its own series
+            assert 'db_pool_connections{pool="metrics_test_replica",state="size"} 3' in rendered
+    finally:
+        await engine.dispose()
+        await replica.dispose()
+    assert SQL_DURATION.count(operation="SELECT") == selects + 1
+    assert POOL_CHECKOUT_WAIT.count() == waits + 1
+
+
+@pytest.mark.asyncio
+async def test_track_queries(tmp_path):
+    """Повторяющиеся запросы сверх бюджета останавливают тест в строгом режиме"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'budget.sqlite'}")
+    instrument_engine(engine, pool="metrics_test")
+    instrument_engine(engine, pool="metrics_test")
+    try:
+        async with engine.connect() as conn:
+            with track_queries(max_count=2, strict=True) as stats:
+                await conn.execute(text("SELECT 1"))
+            assert stats.count == 1 and stats.duration > 0
+            with pytest.raises(QueryBudgetExceeded, match="N\\+1"):
+                with track_queries(max_count=0, max_repeats=2, strict=True):
+                    for _ in range(3):
+                        await conn.execute(text("SELECT 2"))
+    finally:
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_query_budget_middleware(tmp_path, caplog):
+    """Число запросов и время в базе отдаются в Server-Timing, превышение бюджета пишется в лог"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'budget.sqlite'}")
+    instrument_engine(engine, pool="metrics_test")
+
+    async def endpoint(request):
+        async with engine.connect() as conn:
+            for _ in range(int(request.query_params["n"])):
+                await conn.execute(text("SELECT 1"))
+        return PlainTextResponse("ok")
+
+    app = QueryBudgetMiddleware(Starlette(routes=[Route("/", endpoint)]))
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.get("/", params={"n": 2})
+            assert re.fullmatch(r'db;dur=[\d.]+;desc="2 queries"', response.headers["server-timing"])
+            assert "Query budget exceeded" not in caplog.text
+            with caplog.at_level(logging.WARNING, logger="app.database.instrumentation"):
+                await client.get("/", params={"n": settings.QUERY_REPEAT_LIMIT + 1})
+            assert "Query budget exceeded by GET /" in caplog.text and "SELECT 1" in caplog.text
+            with patch.object(settings, "QUERY_BUDGET_STRICT", True):
+                with pytest.raises(QueryBudgetExceeded):
+                    await client.get("/", params={"n": settings.QUERY_REPEAT_LIMIT + 1})
+    finally:
+        await engine.dispose()
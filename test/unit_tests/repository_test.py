@@ -22,7 +22,10 @@ from typing import Sequence
 import datetime
 import uuid
 import asyncio
+import os
 from sqlalchemy import event
+from app.utils.patterns import UnitOfWork
+from app.core.cache import MemoryCache
 
 def _fk_pragma_on_connect(dbapi_con, con_record):
     dbapi_con.execute('pragma foreign_keys=ON')
@@ -117,3 +120,177 @@ async def test_get_all_table_repos(db_session):
     assert len(tables) == n
 
 
+
+
+@pytest.mark.asyncio
+async def test_end_time_follows_updates_repos(db_session):
+    """end_time пересчитывается при изменении начала или длительности брони"""
+    table = await TableRepository(db_session).add(Tables(name="table 1", seats=5, location="terrace"))
+    rep = ReservationRepository(db_session, cache=None)
+    start = datetime.datetime(2025, 4, 10, 19, 0)
+    reserv = await rep.add(Reservations(table_id=table.id, customer_name="John", reservation_time=start, duration_minutes=60))
+
+    reserv.duration_minutes = 90
+    reserv = await rep.update(reserv)
+    assert reserv.end_time == start + datetime.timedelta(minutes=90)
+
+    updated = await rep.update_returning(reserv.id, {"reservation_time": start + datetime.timedelta(hours=1)})
+    assert updated.end_time == start + datetime.timedelta(minutes=150)
+    updated = await rep.update_returning(reserv.id, {"duration_minutes": 30})
+    assert updated.end_time == start + datetime.timedelta(minutes=90)
+    updated = await rep.update_returning(reserv.id, {"reservation_time": start, "duration_minutes": 45})
+    assert updated.end_time == start + datetime.timedelta(minutes=45)
+    assert await rep.update_returning(reserv.id + 100, {"duration_minutes": 30}) is None
+
+
+@pytest.mark.asyncio
+async def test_is_check_conflict_repos(db_session):
+    rep_table = TableRepository(db_session)
+    rep = ReservationRepository(db_session)
+    table = await rep_table.add(Tables(name="table 1", seats=5, location="terrace"))
+    start = datetime.datetime(2025, 4, 10, 19, 0)
+    reserv = await rep.add(Reservations(table_id=table.id, customer_name="John", reservation_time=start, duration_minutes=60))
+    assert reserv.end_time == start + datetime.timedelta(minutes=60)
+
+    def reserv_data(minutes, duration):
+        return ReservationCreate(table_id=table.id, customer_name="Jane",
+                                 reservation_time=start + datetime.timedelta(minutes=minutes), duration_minutes=duration)
+
+    assert await rep.is_check_conflict(reserv_data(30, 60)) is True
+    assert await rep.is_check_conflict(reserv_data(-30, 60)) is True
+    assert await rep.is_check_conflict(reserv_data(-10, 120)) is True
+    # touching intervals do not overlap
+    assert await rep.is_check_conflict(reserv_data(60, 30)) is False
+    assert await rep.is_check_conflict(reserv_data(-60, 60)) is False
+
+
+@pytest.mark.asyncio
+async def test_row_cache_table_repos(db_session):
+    """Тест кэша чтений строк столов по идентификатору"""
+    cache = MemoryCache()
+    async with UnitOfWork(db_session, cache=cache) as uow:
+        table = await uow.tables.add(Tables(name="Table 1", seats=4, location="Hall"))
+    table_id = table.id
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db_session.bind.sync_engine, "before_cursor_execute", listener)
+    try:
+        # populated only once the reading transaction commits
+        with pytest.raises(RuntimeError):
+            async with UnitOfWork(db_session, cache=cache) as uow:
+                await uow.tables.get_row(table_id)
+                raise RuntimeError()
+        assert len(cache) == 0
+        async with UnitOfWork(db_session, cache=cache) as uow:
+            await uow.tables.get_row(table_id)
+        selects = sum(statement.startswith("SELECT") for statement in statements)
+        async with UnitOfWork(db_session, cache=cache) as uow:
+            cached = await uow.tables.get_row(table_id)
+        assert sum(statement.startswith("SELECT") for statement in statements) == selects
+        # write paths load the table from the database
+        async with UnitOfWork(db_session, cache=cache) as uow:
+            table = await uow.tables.get_by_identifier(table_id)
+        assert sum(statement.startswith("SELECT") for statement in statements) == selects + 1
+    finally:
+        event.remove(db_session.bind.sync_engine, "before_cursor_execute", listener)
+    assert cached == {"id": table_id, "name": "Table 1", "seats": 4, "location": "Hall"}
+    assert cache.hits == 1
+
+    # updates invalidate the table tag
+    async with UnitOfWork(db_session, cache=cache) as uow:
+        table.name = "Table 2"
+        await uow.tables.update(table)
+    async with UnitOfWork(db_session, cache=cache) as uow:
+        assert (await uow.tables.get_row(table_id))["name"] == "Table 2"
+    assert cache.hits == 1
+    async with UnitOfWork(db_session, cache=cache) as uow:
+        await uow.tables.delete(table_id)
+    async with UnitOfWork(db_session, cache=cache) as uow:
+        assert await uow.tables.get_row(table_id) is None
+
+
+@pytest.mark.asyncio
+async def test_list_filters_table_repos(db_session):
+    rep = TableRepository(db_session, cache=None)
+    await rep.insert_many([{"name": f"table {i}", "seats": i, "location": "bar" if i % 2 else "hall"} for i in range(10)])
+
+    assert [t.seats for t in await rep.list(seats__gt=6)] == [7, 8, 9]
+    assert [t.seats for t in await rep.list(seats__le=1, location="hall")] == [0]
+    assert [t.seats for t in await rep.list(seats__in=[2, 3, 42], order_by="-seats")] == [3, 2]
+    assert [t.seats for t in await rep.list(seats__between=(3, 5), location__ne="bar")] == [4]
+    assert [t.seats for t in await rep.list(order_by=("location", "-seats"), limit=3, offset=1)] == [7, 5, 3]
+    assert len(await rep.list(location=None)) == 0
+
+    # keyset paging
+    seats, after = [], None
+    while page := await rep.list(order_by="-seats", limit=4, after=after):
+        seats += [t.seats for t in page]
+        after = page[-1].seats
+    assert seats == list(range(9, -1, -1))
+    page = await rep.list(order_by=("location", "id"), limit=2, after=("bar", 8))
+    assert [(t.location, t.id) for t in page] == [("bar", 10), ("hall", 1)]
+
+    for filters in ({"colour": "red"}, {"seats__like": 1}, {"order_by": "colour"}, {"order_by": ("seats", "-id"), "after": (1, 1)}):
+        with pytest.raises(ValueError):
+            await rep.list(**filters)
+
+
+@pytest.mark.asyncio
+async def test_list_statement_cache_table_repos(db_session):
+    rep = TableRepository(db_session, cache=None)
+    first, params = rep._construct_list_stmt(limit=5, seats__gt=2, location="bar")
+    second, other = rep._construct_list_stmt(limit=10, seats__gt=4, location="hall")
+    assert first is second
+    assert params == {"p0": 2, "p1": "bar", "limit": 5} and other == {"p0": 4, "p1": "hall", "limit": 10}
+    # another shape is another statement
+    assert rep._construct_list_stmt(seats__gt=2, location="bar")[0] is not first
+
+
+@pytest.mark.asyncio
+async def test_get_many_table_repos(db_session):
+    rep = TableRepository(db_session, cache=None)
+    await rep.insert_many([{"name": f"table {i}", "seats": i, "location": "hall"} for i in range(5)])
+    assert [t.id for t in await rep.get_many([4, 42, 2, 4])] == [4, 2]
+    assert [row["name"] for row in await rep.get_rows([3, 1])] == ["table 2", "table 0"]
+    assert await rep.get_many([]) == []
+
+
+@pytest.mark.asyncio
+async def test_batch_loads_table_repos(db_session):
+    uow = UnitOfWork(db_session, cache=None, batch_loads=True)
+    await uow.tables.insert_many([{"name": f"table {i}", "seats": i, "location": "hall"} for i in range(5)])
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db_session.bind.sync_engine, "before_cursor_execute", listener)
+    try:
+        tables = await asyncio.gather(*(uow.tables.get_by_identifier(id) for id in (5, 1, 42, 1)))
+        table = await uow.tables.get_by_identifier(3)
+    finally:
+        event.remove(db_session.bind.sync_engine, "before_cursor_execute", listener)
+    assert [t.id if t else None for t in tables] == [5, 1, None, 1]
+    assert tables[1] is tables[3]
+    assert table.id == 3
+    assert len(statements) == 2
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not os.environ.get("TEST_PG_URL"), reason="TEST_PG_URL (postgresql+asyncpg) is not set")
+async def test_insert_many_copy_postgres():
+    """COPY на Postgres входит в транзакцию сессии: откат убирает вставленные строки"""
+    engine = create_async_engine(os.environ["TEST_PG_URL"])
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        maker = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+        async with maker() as session:
+            before = len(await TableRepository(session, None).list())
+            assert await TableRepository(session, None).insert_many([{"name": "copied", "seats": 2, "location": "hall"}] * 3) == 3
+            rows = await TableRepository(session, None).list(name="copied")
+            assert len(rows) == 3
+            await session.rollback()
+        async with maker() as session:
+            assert len(await TableRepository(session, None).list()) == before
+    finally:
+        await engine.dispose()
@@ -10,6 +10,7 @@ from app.schema import (
     TableBase,
     TableCreate,
     TableUpdate,
+    TablePatch,
     TableGet,
     TableResponse,
     ReservationBase,
@@ -19,12 +20,17 @@ from app.schema import (
     ReservationResponse
 )
 from typing import Sequence
+from pydantic import TypeAdapter
+import json
 import datetime
 import uuid
 import asyncio
 from sqlalchemy import event
 from datetime import datetime, timedelta, UTC
-from app.services import ReservTableService,TableService,TableAlreadyReserv,TableNotFound
+from app.services import ReservTableService,TableService,TableAlreadyReserv,TableNotFound,BatchTooLarge,ReservationIntervalIndex
+from app.utils.records import iter_json_array, iter_csv
+from app.core import settings
+from app.core.locks import LockStripes
 
 
 def _fk_pragma_on_connect(dbapi_con, con_record):
@@ -262,3 +268,436 @@ async def test_delete_all_reservations(db_session, reservation_create_data):
     assert len(reservations) == 0
 
 
+
+
+@pytest.mark.asyncio
+async def test_delete_reservs_filtered(db_session):
+    """Тест на удаление броней по фильтрам одним запросом"""
+    index = ReservationIntervalIndex(horizon=datetime(2025, 1, 1))
+    service = ReservTableService(UnitOfWork(db_session), index=index)
+    service_table = TableService(UnitOfWork(db_session))
+    tables = [await service_table.create_table(TableCreate(name=f"Table {i}", seats=4, location="Room" if i else "Bar")) for i in range(2)]
+    idle = await service_table.create_table(TableCreate(name="Idle", seats=2, location="Room"))
+    await service.add_reservs_bulk([
+        ReservationCreate(table_id=table.id, customer_name=f"{table.id}-{day}", reservation_time=datetime(2025, 4, day, 19), duration_minutes=60)
+        for table in tables for day in (10, 11, 12, 13)
+    ])
+    async with UnitOfWork(db_session) as uow:
+        versions = await uow.tables.list_reservations_versions()
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db_session.bind.sync_engine, "before_cursor_execute", listener)
+    try:
+        ids = await service.delete_reservs(table_id=tables[0].id, start=datetime(2025, 4, 11), end=datetime(2025, 4, 13))
+    finally:
+        event.remove(db_session.bind.sync_engine, "before_cursor_execute", listener)
+    assert len(ids) == 2
+    assert sum(statement.startswith("DELETE") for statement in statements) == 1
+    assert tables[0].id not in index
+
+    ids = await service.delete_reservs(ended_before=datetime(2025, 4, 11, 20))
+    assert len(ids) == 3
+    page, _ = await service.get_reserv_page()
+    assert sorted(r.customer_name for r in page) == [f"{tables[0].id}-13", f"{tables[1].id}-12", f"{tables[1].id}-13"]
+    async with UnitOfWork(db_session) as uow:
+        # tables without deleted reservations keep their version
+        assert await uow.tables.list_reservations_versions() == {
+            tables[0].id: versions[tables[0].id] + 2, tables[1].id: versions[tables[1].id] + 1, idle.id: versions[idle.id],
+        }
+
+    # tables go with their reservations
+    assert await service_table.delete_tables(location="Bar") == [tables[0].id]
+    page, _ = await service.get_reserv_page()
+    assert [r.customer_name for r in page] == [f"{tables[1].id}-12", f"{tables[1].id}-13"]
+    await service_table.delete_all_tables()
+    assert await service_table.get_all_tables() == []
+    assert await service.get_all_reserv() == []
+
+
+#test interval index
+
+@pytest.mark.asyncio
+async def test_reservation_interval_index(db_session, reservation_create_data):
+    """Тест на проверку конфликтов через индекс интервалов"""
+    index = ReservationIntervalIndex(horizon=datetime(2025, 1, 1), ttl=60)
+    service = ReservTableService(UnitOfWork(db_session), index=index)
+    service_table = TableService(UnitOfWork(db_session))
+    table = await service_table.create_table(TableCreate(name="Table 1", seats=4, location="Room 1"))
+    await index.warm(UnitOfWork(db_session))
+    assert table.id in index
+
+    reservation_create_data.table_id = table.id
+    reservation = await service.add_reserv_for_table(reservation_create_data)
+    assert index.check(table.id, 1, reservation_create_data.reservation_time, reservation_create_data.reservation_time + timedelta(minutes=1)) is True
+
+    # rejected in-process
+    assert index.is_fresh_conflict(table.id, reservation_create_data.reservation_time, reservation_create_data.reservation_time + timedelta(minutes=30))
+    with pytest.raises(TableAlreadyReserv):
+        await service.add_reserv_for_table(reservation_create_data)
+
+    # slot is free again after deletion
+    await service.delete_reserv(ReservationGet(id=reservation.id))
+    assert not index.is_fresh_conflict(table.id, reservation_create_data.reservation_time, reservation_create_data.reservation_time + timedelta(minutes=30))
+    await service.add_reserv_for_table(reservation_create_data)
+
+
+@pytest.mark.asyncio
+async def test_reservation_interval_index_stale(db_session, reservation_create_data):
+    """Тест на перезагрузку устаревшего индекса"""
+    index = ReservationIntervalIndex(horizon=datetime(2025, 1, 1))
+    service_table = TableService(UnitOfWork(db_session))
+    table = await service_table.create_table(TableCreate(name="Table 1", seats=4, location="Room 1"))
+    await index.warm(UnitOfWork(db_session))
+
+    # another worker books the slot without updating this index
+    reservation_create_data.table_id = table.id
+    await ReservTableService(UnitOfWork(db_session)).add_reserv_for_table(reservation_create_data)
+    assert index.check(table.id, 1, reservation_create_data.reservation_time, reservation_create_data.reservation_time + timedelta(minutes=1)) is None
+
+    service = ReservTableService(UnitOfWork(db_session), index=index)
+    with pytest.raises(TableAlreadyReserv):
+        await service.add_reserv_for_table(reservation_create_data)
+    assert index.check(table.id, 1, reservation_create_data.reservation_time, reservation_create_data.reservation_time + timedelta(minutes=1)) is True
+
+
+@pytest.mark.asyncio
+async def test_reservation_interval_index_fresh_conflict_confirmed(db_session, reservation_create_data):
+    """Тест: свежая запись индекса не отклоняет бронь, если другой процесс уже удалил конфликт"""
+    index = ReservationIntervalIndex(horizon=datetime(2025, 1, 1), ttl=60)
+    service = ReservTableService(UnitOfWork(db_session), index=index)
+    table = await TableService(UnitOfWork(db_session)).create_table(TableCreate(name="Table 1", seats=4, location="Room 1"))
+    await index.warm(UnitOfWork(db_session))
+    reservation_create_data.table_id = table.id
+    reservation = await service.add_reserv_for_table(reservation_create_data)
+
+    # another worker deletes the reservation without updating this index
+    await ReservTableService(UnitOfWork(db_session)).delete_reserv(ReservationGet(id=reservation.id))
+    assert index.is_fresh_conflict(table.id, reservation_create_data.reservation_time, reservation_create_data.reservation_time + timedelta(minutes=30))
+    await service.add_reserv_for_table(reservation_create_data)
+
+
+@pytest.mark.asyncio
+async def test_interval_index_forgets_deleted_tables(db_session):
+    """Тест: удалённые столы убираются из индекса"""
+    index = ReservationIntervalIndex(horizon=datetime(2025, 1, 1))
+    service_table = TableService(UnitOfWork(db_session), index=index)
+    tables = [await service_table.create_table(TableCreate(name=f"Table {i}", seats=4, location="Bar" if i == 1 else "Hall")) for i in range(3)]
+    await index.warm(UnitOfWork(db_session))
+    assert all(table.id in index for table in tables)
+
+    await service_table.delete_table(TableGet(id=tables[0].id))
+    await service_table.delete_tables(location="Bar")
+    assert [table.id in index for table in tables] == [False, False, True]
+
+
+def test_interval_index_horizon():
+    """Тест: горизонт индекса сдвигается, завершённые брони забываются"""
+    index = ReservationIntervalIndex(horizon=datetime(2025, 1, 1), prune_interval=60)
+    index.load_table(1, 0, [(1, 1, datetime(2025, 4, 10, 10), datetime(2025, 4, 10, 14)), (2, 1, datetime(2025, 4, 10, 11), datetime(2025, 4, 10, 12))])
+    index.advance_horizon(datetime(2025, 4, 10, 12))
+    assert index._tables[1].ids == [1]
+    assert not index.covers(datetime(2025, 4, 10, 11))
+    assert index.check(1, 0, datetime(2025, 4, 10, 13), datetime(2025, 4, 10, 13, 30)) is True
+
+    # the horizon follows the clock once the prune interval has passed
+    index._pruned_at -= 60
+    index.check(1, 0, datetime(2025, 4, 10, 13), datetime(2025, 4, 10, 13, 30))
+    assert index.horizon > datetime(2026, 1, 1) and index._tables[1].ids == []
+
+
+def test_interval_index_overlapping_intervals():
+    """Тест: индекс находит конфликт за вложенным интервалом, даже если интервалы пересекаются"""
+    index = ReservationIntervalIndex(horizon=datetime(2025, 1, 1))
+    # 10:00-14:00 contains 11:00-12:00, ends are not sorted like starts
+    index.load_table(1, 0, [(1, 1, datetime(2025, 4, 10, 10), datetime(2025, 4, 10, 14)), (2, 1, datetime(2025, 4, 10, 11), datetime(2025, 4, 10, 12))])
+    assert index.check(1, 0, datetime(2025, 4, 10, 13), datetime(2025, 4, 10, 13, 30)) is True
+    assert index.check(1, 0, datetime(2025, 4, 10, 14), datetime(2025, 4, 10, 15)) is False
+    index.remove(1, 1, 1)
+    assert index.check(1, 1, datetime(2025, 4, 10, 13), datetime(2025, 4, 10, 13, 30)) is False
+    assert index.check(1, 1, datetime(2025, 4, 10, 11, 30), datetime(2025, 4, 10, 13)) is True
+
+
+@pytest.mark.asyncio
+async def test_get_free_slots(db_session, reservation_create_data):
+    """Тест на поиск свободных окон"""
+    service = ReservTableService(UnitOfWork(db_session))
+    service_table = TableService(UnitOfWork(db_session))
+    table = await service_table.create_table(TableCreate(name="Table 1", seats=4, location="Room 1"))
+
+    # 19:30-20:30 and 21:00-22:00
+    reservation_create_data.table_id = table.id
+    await service.add_reserv_for_table(reservation_create_data)
+    await service.add_reserv_for_table(ReservationCreate(
+        table_id=table.id, customer_name="Alice", reservation_time=datetime(2025, 4, 10, 21, 0), duration_minutes=60
+    ))
+
+    slots = await service.get_free_slots(TableGet(id=table.id), datetime(2025, 4, 10, 18, 0), datetime(2025, 4, 10, 23, 0))
+    assert [(s.start.hour, s.start.minute, s.end.hour, s.end.minute) for s in slots] == [
+        (18, 0, 19, 30), (20, 30, 21, 0), (22, 0, 23, 0),
+    ]
+
+    slots = await service.get_free_slots(TableGet(id=table.id), datetime(2025, 4, 10, 18, 0), datetime(2025, 4, 10, 23, 0), 60)
+    assert len(slots) == 2
+
+    with pytest.raises(TableNotFound):
+        await service.get_free_slots(TableGet(id=table.id + 1), datetime(2025, 4, 10, 18, 0), datetime(2025, 4, 10, 23, 0))
+
+
+@pytest.mark.asyncio
+async def test_add_reservs_bulk(db_session, reservation_create_data):
+    """Тест на пакетное создание броней"""
+    service = ReservTableService(UnitOfWork(db_session))
+    service_table = TableService(UnitOfWork(db_session))
+    table_1 = await service_table.create_table(TableCreate(name="Table 1", seats=4, location="Room 1"))
+    table_2 = await service_table.create_table(TableCreate(name="Table 2", seats=4, location="Room 1"))
+    reservation_create_data.table_id = table_1.id
+    await service.add_reserv_for_table(reservation_create_data)
+
+    def reserv(table_id, hour, duration=60):
+        return ReservationCreate(table_id=table_id, customer_name="Bulk", reservation_time=datetime(2025, 4, 10, hour, 0), duration_minutes=duration)
+
+    created = await service.add_reservs_bulk([reserv(table_1.id, 21), reserv(table_2.id, 19), reserv(table_1.id, 18), reserv(table_2.id, 20)])
+    assert [r.table_id for r in created] == [table_1.id, table_2.id, table_1.id, table_2.id]
+    assert len(await service.get_all_reserv()) == 5
+
+    # overlap inside the batch
+    with pytest.raises(TableAlreadyReserv, match=r"\[0, 2\]"):
+        await service.add_reservs_bulk([reserv(table_2.id, 10, 180), reserv(table_2.id, 14), reserv(table_2.id, 12)])
+    # overlap with an existing reservation (19:30-20:30)
+    with pytest.raises(TableAlreadyReserv, match=r"\[1\]"):
+        await service.add_reservs_bulk([reserv(table_2.id, 8), reserv(table_1.id, 20)])
+    with pytest.raises(TableNotFound):
+        await service.add_reservs_bulk([reserv(table_2.id + 1, 8)])
+    with pytest.raises(BatchTooLarge):
+        await service.add_reservs_bulk([reserv(table_2.id, 8)] * (settings.BULK_MAX_SIZE + 1))
+    assert len(await service.get_all_reserv()) == 5
+
+
+@pytest.mark.asyncio
+async def test_concurrent_reservations(tmp_path, reservation_create_data):
+    """Тест на параллельное бронирование одного стола"""
+    engine = create_async_engine(url=f"sqlite+aiosqlite:///{tmp_path / 'locks.sqlite'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async_session = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    async with async_session() as session:
+        table = await TableService(UnitOfWork(session)).create_table(TableCreate(name="Table 1", seats=4, location="Room 1"))
+    reservation_create_data.table_id = table.id
+
+    async def book():
+        async with async_session() as session:
+            return await ReservTableService(UnitOfWork(session)).add_reserv_for_table(reservation_create_data)
+
+    results = await asyncio.gather(*(book() for _ in range(5)), return_exceptions=True)
+    await engine.dispose()
+    assert sum(isinstance(r, ReservationResponse) for r in results) == 1
+    assert sum(isinstance(r, TableAlreadyReserv) for r in results) == 4
+
+
+@pytest.mark.asyncio
+async def test_delete_reservs_waits_for_bookings(db_session, reservation_create_data):
+    """Тест: удаление броней ждёт блокировку стола, как и бронирование"""
+    locks = LockStripes(8)
+    table = await TableService(UnitOfWork(db_session)).create_table(TableCreate(name="Table 1", seats=4, location="Room 1"))
+    reservation_create_data.table_id = table.id
+    await ReservTableService(UnitOfWork(db_session)).add_reserv_for_table(reservation_create_data)
+
+    async with locks.hold(table.id):
+        purge = asyncio.create_task(ReservTableService(UnitOfWork(db_session, locks=locks)).delete_reservs(table_id=table.id))
+        await asyncio.sleep(0.05)
+        assert not purge.done()
+    assert len(await purge) == 1
+
+
+@pytest.mark.asyncio
+async def test_get_reserv_page(db_session):
+    """Тест на постраничное получение броней"""
+    service = ReservTableService(UnitOfWork(db_session))
+    service_table = TableService(UnitOfWork(db_session))
+    table_1 = await service_table.create_table(TableCreate(name="Table 1", seats=4, location="Room 1"))
+    table_2 = await service_table.create_table(TableCreate(name="Table 2", seats=4, location="Room 1"))
+    await service.add_reservs_bulk([
+        ReservationCreate(table_id=table_id, customer_name=f"{table_id}-{hour}", reservation_time=datetime(2025, 4, 10, hour), duration_minutes=60)
+        for hour in range(10, 20) for table_id in (table_1.id, table_2.id)
+    ])
+
+    names, cursor = [], None
+    while True:
+        page, cursor = await service.get_reserv_page(cursor=cursor, limit=3)
+        names += [r.customer_name for r in page]
+        if cursor is None:
+            break
+    assert len(names) == 20
+    assert names[:2] == [f"{table_1.id}-10", f"{table_2.id}-10"]
+
+    page, cursor = await service.get_reserv_page(table_id=table_2.id, start=datetime(2025, 4, 10, 12), end=datetime(2025, 4, 10, 15))
+    assert [r.customer_name for r in page] == [f"{table_2.id}-{hour}" for hour in (12, 13, 14)]
+    assert cursor is None
+
+    with pytest.raises(ValueError):
+        await service.get_reserv_page(cursor="broken")
+
+
+@pytest.mark.asyncio
+async def test_get_table_page(db_session, reservation_create_data):
+    """Тест на постраничное получение столов без загрузки броней"""
+    service_table = TableService(UnitOfWork(db_session))
+    for i in range(7):
+        await service_table.create_table(TableCreate(name=f"Table {i}", seats=i, location="Bar" if i % 2 else "Room"))
+    reservation_create_data.table_id = 1
+    await ReservTableService(UnitOfWork(db_session)).add_reserv_for_table(reservation_create_data)
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db_session.bind.sync_engine, "before_cursor_execute", listener)
+    try:
+        names, cursor = [], None
+        while True:
+            page, cursor = await service_table.get_table_page(cursor=cursor, limit=3)
+            names += [t.name for t in page]
+            if cursor is None:
+                break
+    finally:
+        event.remove(db_session.bind.sync_engine, "before_cursor_execute", listener)
+    assert names == [f"Table {i}" for i in range(7)]
+    assert not any("FROM reservations" in statement for statement in statements)
+
+    page, cursor = await service_table.get_table_page(location="Bar", min_seats=3)
+    assert [t.name for t in page] == ["Table 3", "Table 5"]
+    assert cursor is None
+
+
+@pytest.mark.asyncio
+async def test_get_tables_with_reservations(db_session):
+    """Тест на загрузку броней столов по запросу"""
+    service = ReservTableService(UnitOfWork(db_session))
+    service_table = TableService(UnitOfWork(db_session))
+    tables = [await service_table.create_table(TableCreate(name=f"Table {i}", seats=4, location="Room")) for i in range(3)]
+    await service.add_reservs_bulk([
+        ReservationCreate(table_id=table.id, customer_name=f"{table.id}-{day}", reservation_time=datetime(2025, 4, day, 19), duration_minutes=60)
+        for table in tables[:2] for day in (10, 11, 12)
+    ])
+
+    page, _ = await service_table.get_table_page()
+    assert all(table.reserved_tables is None for table in page)
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db_session.bind.sync_engine, "before_cursor_execute", listener)
+    try:
+        page, _ = await service_table.get_table_page(include_reservations=True, start=datetime(2025, 4, 11), end=datetime(2025, 4, 12))
+    finally:
+        event.remove(db_session.bind.sync_engine, "before_cursor_execute", listener)
+    assert sum("FROM reservations" in statement for statement in statements) == 1
+    assert [[r.customer_name for r in table.reserved_tables] for table in page] == [
+        [f"{tables[0].id}-11"], [f"{tables[1].id}-11"], [],
+    ]
+
+    table = await service_table.get_table(TableGet(id=tables[0].id), include_reservations=True)
+    assert len(table.reserved_tables) == 3
+
+
+@pytest.mark.asyncio
+async def test_json_pages_match_models(db_session):
+    """Тест на сериализацию страниц в JSON напрямую из строк"""
+    service = ReservTableService(UnitOfWork(db_session))
+    service_table = TableService(UnitOfWork(db_session))
+    tables = [await service_table.create_table(TableCreate(name=f"Table {i}", seats=4, location="Room")) for i in range(3)]
+    await service.add_reservs_bulk([
+        ReservationCreate(table_id=table.id, customer_name=f"{table.id}-{hour}", reservation_time=datetime(2025, 4, 10, hour), duration_minutes=60)
+        for table in tables for hour in (12, 14)
+    ])
+    adapter = TypeAdapter(list[ReservationResponse])
+    page, cursor = await service.get_reserv_page(limit=4)
+    body, json_cursor = await service.get_reserv_page_json(limit=4)
+    assert json.loads(body) == json.loads(adapter.dump_json(page))
+    assert json_cursor == cursor
+
+    adapter = TypeAdapter(list[TableResponse])
+    for include in (False, True):
+        page, cursor = await service_table.get_table_page(limit=2, include_reservations=include)
+        body, json_cursor = await service_table.get_table_page_json(limit=2, include_reservations=include)
+        assert json.loads(body) == json.loads(adapter.dump_json(page))
+        assert json_cursor == cursor
+
+    table = await service_table.get_table(TableGet(id=tables[0].id), include_reservations=True)
+    body = await service_table.get_table_json(TableGet(id=tables[0].id), include_reservations=True)
+    assert json.loads(body) == json.loads(table.model_dump_json())
+    with pytest.raises(TableNotFound):
+        await service_table.get_table_json(TableGet(id=999))
+
+
+@pytest.mark.asyncio
+async def test_export_reserv(db_session):
+    """Тест на потоковую выгрузку броней"""
+    service = ReservTableService(UnitOfWork(db_session))
+    table = await TableService(UnitOfWork(db_session)).create_table(TableCreate(name="Table 1", seats=4, location="Room"))
+    await service.add_reservs_bulk([
+        ReservationCreate(table_id=table.id, customer_name=str(hour), reservation_time=datetime(2025, 4, 10, hour), duration_minutes=60)
+        for hour in range(8, 20)
+    ])
+
+    batches = [rows async for rows in service.export_reserv(batch_size=5)]
+    assert [len(rows) for rows in batches] == [5, 5, 2]
+    assert [row["customer_name"] for rows in batches for row in rows] == [str(hour) for hour in range(8, 20)]
+
+    rows = [row async for rows in service.export_reserv(start=datetime(2025, 4, 10, 18)) for row in rows]
+    assert set(rows[0]) == {"id", "table_id", "customer_name", "reservation_time", "duration_minutes"}
+    assert len(rows) == 2
+
+
+@pytest.mark.asyncio
+async def test_patch_table(db_session):
+    """Тест на частичное обновление стола одним запросом"""
+    service_table = TableService(UnitOfWork(db_session))
+    table = await service_table.create_table(TableCreate(name="Table 1", seats=4, location="Room"))
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db_session.bind.sync_engine, "before_cursor_execute", listener)
+    try:
+        patched = await service_table.patch_table(table.id, TablePatch(seats=6))
+    finally:
+        event.remove(db_session.bind.sync_engine, "before_cursor_execute", listener)
+    assert (patched.name, patched.seats, patched.location) == ("Table 1", 6, "Room")
+    assert len(statements) == 1 and statements[0].startswith("UPDATE") and "RETURNING" in statements[0]
+
+    assert (await service_table.patch_table(table.id, TablePatch())).seats == 6
+    assert (await service_table.get_table(TableGet(id=table.id))).seats == 6
+    with pytest.raises(TableNotFound):
+        await service_table.patch_table(table.id + 1, TablePatch(name="Table 2"))
+
+
+@pytest.mark.asyncio
+async def test_import_tables(db_session, monkeypatch):
+    """Тест на импорт столов из JSON и CSV частями"""
+    monkeypatch.setattr(settings, "IMPORT_CHUNK_SIZE", 4)
+    service_table = TableService(UnitOfWork(db_session))
+
+    async def chunks(body: bytes, size: int = 7):
+        for i in range(0, len(body), size):
+            yield body[i:i + size]
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(db_session.bind.sync_engine, "before_cursor_execute", listener)
+    try:
+        rows = [{"name": f"Table {i}", "seats": i, "location": "Bar"} for i in range(10)]
+        assert await service_table.import_tables(iter_json_array(chunks(json.dumps(rows).encode()))) == 10
+    finally:
+        event.remove(db_session.bind.sync_engine, "before_cursor_execute", listener)
+    assert sum(statement.startswith("INSERT") for statement in statements) == 3
+
+    body = 'name,seats,location\n"Table, 10",4,Terrace\n"Table\n11",2,Terrace\n'.encode()
+    assert await service_table.import_tables(iter_csv(chunks(body))) == 2
+    tables = await service_table.get_all_tables()
+    assert [t.name for t in tables][-2:] == ["Table, 10", "Table\n11"]
+
+    # nothing is imported when a row is invalid
+    body = json.dumps(rows[:5] + [{"name": "Broken", "seats": -1, "location": "Bar"}]).encode()
+    with pytest.raises(ValueError, match="Row 6"):
+        await service_table.import_tables(iter_json_array(chunks(body)))
+    with pytest.raises(ValueError):
+        await service_table.import_tables(iter_csv(chunks(b"name,seats\nTable,1,Bar\n")))
+    assert len(await service_table.get_all_tables()) == 12
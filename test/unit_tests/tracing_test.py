@@ -0,0 +1,117 @@
+import pytest
+import pytest_asyncio
+import json
+from datetime import datetime
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine, AsyncSession
+from app.core.tracing import (
+    InMemorySpanExporter,
+    JsonFileSpanExporter,
+    StatusCode,
+    TracerProvider,
+    get_current_span,
+    get_tracer,
+    get_tracer_provider,
+    set_tracer_provider,
+    traced,
+)
+from app.models.Base import Base
+from app.schema import ReservationCreate, TableCreate
+from app.services import ReservTableService, TableService
+from app.utils.patterns import UnitOfWork
+
+
+@pytest.fixture
+def spans():
+    exporter = InMemorySpanExporter()
+    previous = get_tracer_provider()
+    set_tracer_provider(TracerProvider([exporter]))
+    yield exporter
+    set_tracer_provider(previous)
+
+
+@pytest_asyncio.fixture(scope="function")
+async def db_session():
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)() as session:
+        yield session
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_nested_spans(spans):
+    """Вложенные вызовы образуют дерево одного трейса, исключения записываются в спан"""
+
+    @traced("inner")
+    async def inner():
+        get_current_span().set_attribute("rows", 3)
+        raise ValueError("boom")
+
+    @traced("outer", kind="test")
+    async def outer():
+        with pytest.raises(ValueError):
+            await inner()
+
+    await outer()
+    inner_span, outer_span = spans.get_finished_spans()
+    assert outer_span.name == "outer" and outer_span.parent_id is None
+    assert outer_span.attributes == {"kind": "test"}
+    assert inner_span.name == "inner"
+    assert (inner_span.trace_id, inner_span.parent_id) == (outer_span.trace_id, outer_span.span_id)
+    assert inner_span.attributes == {"rows": 3}
+    assert inner_span.status is StatusCode.ERROR
+    assert inner_span.events[0]["attributes"]["exception.type"] == "ValueError"
+    assert get_current_span().is_recording() is False
+
+
+@pytest.mark.asyncio
+async def test_disabled_tracing():
+    """Без экспортёров спаны не создаются"""
+    previous = get_tracer_provider()
+    set_tracer_provider(TracerProvider())
+    try:
+        with get_tracer(__name__).start_as_current_span("noop") as span:
+            assert span.is_recording() is False
+            assert get_current_span() is span
+    finally:
+        set_tracer_provider(previous)
+
+
+@pytest.mark.asyncio
+async def test_booking_spans(spans, db_session):
+    """Время брони раскладывается на поиск стола, проверку конфликта, вставку и фиксацию"""
+    table = await TableService(UnitOfWork(db_session)).create_table(TableCreate(name="T", seats=2, location="Hall"))
+    spans.clear()
+    await ReservTableService(UnitOfWork(db_session)).add_reserv_for_table(
+        ReservationCreate(table_id=table.id, customer_name="Ann", reservation_time=datetime(2025, 4, 10, 19), duration_minutes=60)
+    )
+    finished = spans.get_finished_spans()
+    by_name = {span.name: span for span in finished}
+    root = by_name["ReservTableService.add_reserv_for_table"]
+    assert root.parent_id is None and root.attributes["table_id"] == table.id
+    for name in (
+        "UnitOfWork.__aenter__",
+        "TableRepository.get_reservations_version",
+        "ReservTableService._is_check_conflict",
+        "BaseSqlAsyncRepository.insert_returning",
+        "UnitOfWork.commit",
+        "UnitOfWork.__aexit__",
+    ):
+        assert by_name[name].trace_id == root.trace_id
+    assert by_name["ReservTableService._is_check_conflict"].parent_id == root.span_id
+    assert by_name["ReservationRepository.is_check_conflict"].parent_id == by_name["ReservTableService._is_check_conflict"].span_id
+    assert by_name["ReservTableService._is_check_conflict"].attributes == {"source": "database", "conflict": False}
+
+
+def test_json_file_exporter(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    exporter = JsonFileSpanExporter(str(path))
+    provider = TracerProvider([exporter])
+    with provider.get_tracer(__name__).start_as_current_span("parent"):
+        with provider.get_tracer(__name__).start_as_current_span("child", attributes={"id": 1}):
+            pass
+    provider.shutdown()
+    child, parent = [json.loads(line) for line in path.read_text().splitlines()]
+    assert (child["name"], child["parent_id"], child["attributes"]) == ("child", parent["span_id"], {"id": 1})
+    assert child["duration_ms"] <= parent["duration_ms"]
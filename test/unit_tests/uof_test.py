@@ -11,6 +11,10 @@ from typing import Sequence
 from sqlalchemy import event
 from datetime import datetime, UTC
 from app.utils.patterns.uow import UnitOfWork
+from app.core.cache import MemoryCache, cache_tags
+from app.database.replicas import ReplicaSet, track_replica_reads
+from app.services import TableService
+from app.schema import TableCreate
 
 
 def _fk_pragma_on_connect(dbapi_con, con_record):
@@ -90,3 +94,134 @@ async def test_rollback_transaction(db_session):
 
     # Check table 
     assert table_added is  None
+
+
+@pytest.mark.asyncio
+async def test_commit_invalidates_collection_tags(db_session):
+    """Test commit invalidates cache tags of written collections only"""
+    cache = MemoryCache()
+
+    async def stamp():
+        return (await cache.get_stamped("any", cache_tags(db_session.get_bind(), "tables", "reservations")))[1]
+
+    async with UnitOfWork(db_session, cache=cache) as uow:
+        table = await uow.tables.add(Tables(name="table 1", seats=5, location="terrace"))
+    table_id = table.id
+    assert await stamp() == (1, 0)
+
+    with pytest.raises(IntegrityError):
+        async with UnitOfWork(db_session, cache=cache) as uow:
+            await uow.reservations.add(Reservations(table_id=table_id + 100, customer_name="A", reservation_time=datetime(2025, 4, 10, 12)))
+    assert await stamp() == (1, 0)
+
+    async with UnitOfWork(db_session, cache=cache) as uow:
+        await uow.reservations.add(Reservations(table_id=table_id, customer_name="A", reservation_time=datetime(2025, 4, 10, 12)))
+    assert await stamp() == (1, 1)
+
+    # deleting a table cascades to its reservations
+    async with UnitOfWork(db_session, cache=cache) as uow:
+        await uow.tables.delete(table_id)
+    assert await stamp() == (2, 2)
+
+
+@pytest_asyncio.fixture(scope="function")
+async def primary_and_replicas(tmp_path):
+    """Основная база и две реплики в отдельных файлах SQLite"""
+    makers = []
+    for name in ("primary", "replica1", "replica2"):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / name}.sqlite")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        maker = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+        async with maker() as session:
+            session.add(Tables(name=name, seats=2, location="Hall"))
+            await session.commit()
+        makers.append(maker)
+    yield makers
+    for maker in makers:
+        await maker.kw["bind"].dispose()
+
+
+@pytest.mark.asyncio
+async def test_reads_routed_to_replicas(primary_and_replicas):
+    """Чтения идут на реплики по кругу, записи на основную базу, отстающие реплики пропускаются"""
+    primary, *replica_makers = primary_and_replicas
+    lags = {"replica1": 0.0, "replica2": 0.0}
+
+    async def probe(session):
+        name = (await session.execute(Tables.__table__.select())).first().name
+        if lags[name] is None:
+            raise ConnectionError("replica down")
+        return lags[name]
+
+    replicas = ReplicaSet(replica_makers, max_lag=1.0, check_interval=0, lag_probe=probe, names=["replica1", "replica2"])
+
+    async def read_names():
+        async with primary() as session:
+            tables = await TableService(UnitOfWork(session, cache=None, replicas=replicas)).get_all_tables()
+        return [table.name for table in tables]
+
+    with track_replica_reads() as reads:
+        assert [await read_names() for _ in range(3)] == [["replica1"], ["replica2"], ["replica1"]]
+    assert reads == ["replica1", "replica2", "replica1"]
+
+    lags["replica1"] = 5.0
+    assert [await read_names() for _ in range(2)] == [["replica2"], ["replica2"]]
+    lags["replica2"] = None
+    assert await read_names() == ["primary"]
+    lags.update(replica1=0.0, replica2=0.0)
+    assert await read_names() in (["replica1"], ["replica2"])
+
+    # replicas of the session factory reach UnitOfWork without being passed
+    with_replicas = async_sessionmaker(primary.kw["bind"], info={"replicas": replicas})
+    async with with_replicas() as session:
+        with track_replica_reads() as reads:
+            await TableService(UnitOfWork(session, cache=None)).get_all_tables()
+    assert len(reads) == 1
+
+    async with primary() as session:
+        await TableService(UnitOfWork(session, cache=None, replicas=replicas)).create_table(TableCreate(name="new", seats=4, location="Hall"))
+    async with primary() as session:
+        assert [table.name for table in await TableRepository(session, None).list()] == ["primary", "new"]
+
+
+@pytest.mark.asyncio
+async def test_read_only_unit_of_work(tmp_path):
+    """Чтение не фиксирует транзакцию и сразу освобождает соединение, строки попадают в кэш"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'read.sqlite'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    maker = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    statements, commits = [], []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement))
+    event.listen(engine.sync_engine, "commit", lambda conn: commits.append(conn))
+    cache = MemoryCache(16)
+    try:
+        async with maker() as session:
+            uow = UnitOfWork(session, cache=cache, replicas=None)
+            async with uow:
+                table = await uow.tables.add(Tables(name="T", seats=2, location="Hall"))
+            statements.clear()
+            commits.clear()
+
+            async with uow.for_read() as read_uow:
+                assert read_uow.read_only and read_uow.session is session
+                assert (await read_uow.tables.get_row(table.id))["name"] == "T"
+                with pytest.raises(RuntimeError):
+                    await read_uow.commit()
+            assert not session.in_transaction()
+            assert engine.pool.checkedout() == 0
+            assert commits == [] and statements
+
+            statements.clear()
+            async with uow.for_read() as read_uow:
+                assert (await read_uow.tables.get_row(table.id))["name"] == "T"
+            assert statements == []  # строка из кэша
+
+            await session.begin()
+            async with uow.for_read() as read_uow:
+                await read_uow.tables.list()
+            assert session.in_transaction()  # чужая транзакция остаётся владельцу
+            await session.rollback()
+    finally:
+        await engine.dispose()